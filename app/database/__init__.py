@@ -1,2 +1,2 @@
 from .connection import Database
-from .utils import execute_query, execute_non_query
+from .utils import execute_query, execute_non_query, stream_query, copy_insert
@@ -1,51 +1,104 @@
-import psycopg2
+from psycopg_pool import AsyncConnectionPool
+from pgvector.psycopg import register_vector_async
+from contextlib import asynccontextmanager
+from typing import Dict
+import psycopg
+import asyncio
 import os
 
 class Database:
-    _connection = None
+    """
+    Process-wide pool of asynchronous PostgreSQL connections.
+
+    Each request checks a connection out with ``Database.transaction()``, which
+    runs the request in its own transaction and hands the connection back to
+    the pool afterwards, so concurrent requests never share a socket and a
+    failed statement only affects the request that issued it. Waiting for a
+    connection or a query never blocks the event loop.
+    """
+    _pool: AsyncConnectionPool = None
+    _lock = asyncio.Lock()
+
+    MIN_SIZE = int(os.getenv("PG_POOL_MIN_SIZE", "1"))
+    MAX_SIZE = int(os.getenv("PG_POOL_MAX_SIZE", "10"))
+    CHECKOUT_TIMEOUT = float(os.getenv("PG_POOL_TIMEOUT", "30"))
+
+    @staticmethod
+    async def _configure(conn):
+        """
+        Register pgvector types on each new connection so NumPy embeddings are
+        exchanged in binary. Databases without pgvector are left as they are.
+        """
+        try:
+            await register_vector_async(conn)
+        except psycopg.ProgrammingError:
+            pass
+        await conn.rollback()
 
     @staticmethod
-    def connect():
-        """
-        Establish a connection to the PostgreSQL database using environment variables.
-        """
-        if Database._connection is None:
-            try:
-                Database._connection = psycopg2.connect(
-                    user=os.getenv("PG_USER"),
-                    password=os.getenv("PG_PASSWORD"),
-                    host=os.getenv("PG_HOST"),
-                    port=os.getenv("PG_PORT"),
-                    database=os.getenv("PG_DATABASE")
-                )
-                Database._connection.autocommit = False  # Disable autocommit for transaction control
-                print("✅ Connected to PostgreSQL")
-            except Exception as e:
-                print(f"❌ PostgreSQL connection failed: {e}")
-                raise
-        return Database._connection
+    async def connect() -> AsyncConnectionPool:
+        """
+        Open the connection pool using environment variables (idempotent).
+        """
+        async with Database._lock:
+            if Database._pool is None:
+                try:
+                    connection_pool = AsyncConnectionPool(
+                        kwargs={
+                            "user": os.getenv("PG_USER"),
+                            "password": os.getenv("PG_PASSWORD"),
+                            "host": os.getenv("PG_HOST"),
+                            "port": os.getenv("PG_PORT"),
+                            "dbname": os.getenv("PG_DATABASE"),
+                        },
+                        min_size=Database.MIN_SIZE,
+                        max_size=Database.MAX_SIZE,
+                        timeout=Database.CHECKOUT_TIMEOUT,
+                        # Health check on checkout; broken connections are replaced
+                        check=AsyncConnectionPool.check_connection,
+                        configure=Database._configure,
+                        open=False
+                    )
+                    await connection_pool.open(wait=True)
+                    Database._pool = connection_pool
+                    print(f"✅ Connected to PostgreSQL (pool size {Database.MIN_SIZE}-{Database.MAX_SIZE})")
+                except Exception as e:
+                    print(f"❌ PostgreSQL connection failed: {e}")
+                    raise
+        return Database._pool
+
+    @staticmethod
+    @asynccontextmanager
+    async def transaction():
+        """
+        Scope a unit of work to one pooled connection and one transaction.
+        Commits on success, rolls back on error and always releases the connection.
+        Raises ``psycopg_pool.PoolTimeout`` if no connection frees up within
+        ``PG_POOL_TIMEOUT`` seconds.
+        """
+        connection_pool = Database._pool or await Database.connect()
+        async with connection_pool.connection() as conn:
+            yield conn
 
     @staticmethod
-    def rollback():
+    def stats() -> Dict[str, int]:
         """
-        Rollback the current transaction.
+        Pool counters from psycopg_pool (size, available, waiting...); empty
+        before the pool is opened.
         """
-        if Database._connection:
-            try:
-                Database._connection.rollback()
-                print("🔄 Transaction rolled back")
-            except Exception as e:
-                print(f"❌ Failed to rollback transaction: {e}")
+        return Database._pool.get_stats() if Database._pool is not None else {}
 
     @staticmethod
-    def close():
+    async def close():
         """
-        Close the database connection.
+        Close every connection in the pool.
         """
-        if Database._connection:
-            try:
-                Database._connection.close()
-                Database._connection = None
-                print("🔒 PostgreSQL connection closed.")
-            except Exception as e:
-                print(f"❌ Failed to close connection: {e}")
+        async with Database._lock:
+            if Database._pool:
+                try:
+                    await Database._pool.close()
+                    print("🔒 PostgreSQL connection pool closed.")
+                except Exception as e:
+                    print(f"❌ Failed to close connection pool: {e}")
+                finally:
+                    Database._pool = None
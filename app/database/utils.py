@@ -1,36 +1,56 @@
-from typing import List, Any
-import psycopg2
+from typing import AsyncIterator, Awaitable, Callable, List, Any, Optional, Sequence
 from app.database.connection import Database
+from app.services.metrics import Metrics
+import os
 
+# Rows fetched per round trip by stream_query
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
 
-def execute_query(query: str, params: List[Any] = None) -> List[tuple]:
+
+# Hook run on the checked-out connection before a query executes, given the
+# query and its parameters; returns the query to run instead
+# (e.g. QueryGuard.prepare for generated SQL)
+GuardHook = Callable[[Any, str, Optional[List[Any]]], Awaitable[str]]
+
+
+async def execute_query(query: str, params: List[Any] = None, guard: Optional[GuardHook] = None,
+                        prepare: Optional[bool] = None, with_columns: bool = False):
     """
     Execute a SQL query with optional parameters and fetch results.
+    Runs in its own pooled connection and transaction, committed on success.
     Args:
         query (str): The SQL query to execute.
         params (list): Optional list of parameters for the query.
+        guard (callable): Optional hook run in the same transaction first.
+        prepare (bool): True to run as a server-side prepared statement, False
+            never to; None leaves it to psycopg (prepared after 5 executions).
+        with_columns (bool): Also return the result's column names.
     Returns:
-        list: Query results as a list of tuples.
+        list: Query results as a list of tuples, or (column names, results)
+            with with_columns.
     """
     try:
-        conn = Database.connect()
-        cursor = conn.cursor()
-
-        # Execute query
-        if params:
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
-
-        # Fetch results
-        results = cursor.fetchall()
-        cursor.close()
+        async with Database.transaction() as conn:
+            if guard:
+                query = await guard(conn, query, params)
+            async with conn.cursor() as cursor:
+                with Metrics.span("db_execution"):
+                    # Execute query (an empty list still marks the query as parameterized)
+                    if params is not None:
+                        await cursor.execute(query, params, prepare=prepare)
+                    else:
+                        await cursor.execute(query, prepare=prepare)
+
+                    # Fetch results
+                    results = await cursor.fetchall()
+                if with_columns:
+                    return [column.name for column in cursor.description or ()], results
         return results
     except Exception as e:
-        raise Exception(f"Failed to execute query: {str(e)}")
+        raise Exception(f"Failed to execute query: {str(e)}") from e
 
 
-def execute_non_query(query: str, params: List[Any] = None):
+async def execute_non_query(query: str, params: List[Any] = None):
     """
     Execute a SQL query that does not return results (e.g., INSERT, UPDATE).
     Args:
@@ -38,17 +58,80 @@ def execute_non_query(query: str, params: List[Any] = None):
         params (list): Optional list of parameters for the query.
     """
     try:
-        conn = Database.connect()
-        cursor = conn.cursor()
-
-        # Execute query
-        if params:
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
-
-        # Commit transaction
-        conn.commit()
-        cursor.close()
+        # Transaction is committed when the block exits without error
+        async with Database.transaction() as conn:
+            async with conn.cursor() as cursor:
+                # Execute query
+                if params:
+                    await cursor.execute(query, params)
+                else:
+                    await cursor.execute(query)
     except Exception as e:
         raise Exception(f"Failed to execute non-query: {str(e)}")
+
+
+async def stream_query(query: str, params: List[Any] = None, batch_size: int = STREAM_BATCH_SIZE,
+                       guard: Optional[GuardHook] = None, with_columns: bool = False) -> AsyncIterator:
+    """
+    Execute a SQL query through a server-side (named) cursor and yield its
+    rows in batches, so only one batch is in memory at a time and the first
+    rows are available before the query has produced the rest.
+    The pooled connection and its transaction stay open until the generator
+    is exhausted or closed.
+    Args:
+        query (str): The SQL query to execute (must be a SELECT).
+        params (list): Optional list of parameters for the query.
+        batch_size (int): Rows per fetch.
+        guard (callable): Optional hook run in the same transaction first.
+        with_columns (bool): Yield (column names, rows) pairs instead.
+    Yields:
+        list: Up to batch_size rows, as tuples.
+    """
+    try:
+        async with Database.transaction() as conn:
+            if guard:
+                query = await guard(conn, query, params)
+            async with conn.cursor(name="stream_query") as cursor:
+                with Metrics.span("db_execution"):
+                    await cursor.execute(query, params)
+                while True:
+                    # Timed per batch; the time the consumer holds each batch is not counted
+                    with Metrics.span("db_execution"):
+                        rows = await cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield ([column.name for column in cursor.description], rows) if with_columns else rows
+    except Exception as e:
+        raise Exception(f"Failed to stream query: {str(e)}") from e
+
+
+async def copy_insert(table: str, columns: List[str], rows: List[Sequence[Any]], id_column: str = "id") -> List[int]:
+    """
+    Insert rows with COPY in one transaction and return their new ids.
+    COPY cannot return generated values, so one id per row is first taken
+    from the id column's sequence and copied in with the row.
+    Args:
+        table (str): Target table (trusted identifier).
+        columns (list): Columns of each row, without the id column.
+        rows (list): Row values, in column order.
+        id_column (str): Serial column to fill from its sequence.
+    Returns:
+        list: The id given to each row, in row order.
+    """
+    if not rows:
+        return []
+    try:
+        async with Database.transaction() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    "SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s) ORDER BY 1",
+                    [table, id_column, len(rows)]
+                )
+                ids = [row[0] for row in await cursor.fetchall()]
+                copy_columns = ", ".join([id_column, *columns])
+                async with cursor.copy(f"COPY {table} ({copy_columns}) FROM STDIN") as copy:
+                    for row_id, row in zip(ids, rows):
+                        await copy.write_row((row_id, *row))
+        return ids
+    except Exception as e:
+        raise Exception(f"Failed to copy rows into {table}: {str(e)}") from e
@@ -1,7 +1,21 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from app.database import Database
+from app.routes.metrics import DebugTimingMiddleware, router as metrics_router
 from app.routes.tasks import router as tasks_router
+from app.services.embedding_queue import EmbeddingQueue
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    EmbeddingQueue.start()
+    yield
+    await EmbeddingQueue.stop()
+    # Release pooled database connections on shutdown
+    await Database.close()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(DebugTimingMiddleware)
 
 # Add routes
 app.include_router(tasks_router, prefix="/tasks", tags=["tasks"])
+app.include_router(metrics_router, tags=["metrics"])
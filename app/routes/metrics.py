@@ -0,0 +1,65 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.database import Database
+from app.services.metrics import METRICS_ENABLED, Metrics
+from app.services.query_builder import QueryBuilder
+from app.services.query_guard import QueryGuard
+from app.services.sql_shape import SQLShapes
+from app.services.task_service import TaskService
+import os
+import time
+
+router = APIRouter()
+
+# Clients may ask for their request's stage timings with an X-Debug-Timing header
+METRICS_DEBUG_HEADER = os.getenv("METRICS_DEBUG_HEADER", "true").lower() not in ("0", "false", "no")
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Stage latency histograms and the query guard, SQL cache, SQL shape,
+    request coalescing and connection pool counters, in the Prometheus text format.
+    """
+    counters = {
+        "query_guard": QueryGuard.stats(),
+        "sql_cache": QueryBuilder.sql_cache.stats(),
+        "sql_shapes": SQLShapes.stats(),
+        "query_single_flight": TaskService.in_flight.stats(),
+        "sql_generation_single_flight": QueryBuilder.in_flight.stats(),
+    }
+    pool_stats = Database.stats()
+    if pool_stats:
+        counters["db_pool"] = pool_stats
+    return PlainTextResponse(
+        Metrics.exposition(counters), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+class DebugTimingMiddleware:
+    """
+    ASGI middleware adding a Server-Timing header (per-stage milliseconds and
+    the total) to responses of requests sent with ``X-Debug-Timing: 1``.
+    Other requests pass straight through. For streamed responses the header
+    only covers the stages finished before the first byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not (METRICS_ENABLED and METRICS_DEBUG_HEADER)
+            or not any(name == b"x-debug-timing" for name, _ in scope["headers"])
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        with Metrics.trace() as stages:
+            async def send_with_timing(message):
+                if message["type"] == "http.response.start":
+                    timing = Metrics.server_timing({**stages, "total": time.perf_counter() - start})
+                    message = {**message, "headers": [*message.get("headers", []), (b"server-timing", timing.encode())]}
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
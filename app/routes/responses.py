@@ -0,0 +1,38 @@
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+from app.services.metrics import Metrics
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(value: Any) -> Any:
+    """Types orjson does not handle, encoded as FastAPI's jsonable_encoder would."""
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).decode(errors="replace")
+    return str(value)
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize to JSON bytes with orjson (datetimes, tuples and NumPy arrays included)."""
+    with Metrics.span("serialization"):
+        return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson. Return it directly from a route:
+    a plain dict return value is first copied by ``jsonable_encoder``, which
+    costs more than the serialization itself for large results.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,35 +1,137 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.routes.responses import FastJSONResponse, dumps
 from app.services.task_service import TaskService
 from app.schemas.task import TaskCreate, TaskQuery
-from typing import Dict, Any
+from typing import AsyncIterator, Dict, Any, List, Literal, Optional, Tuple
+import orjson
 
 router = APIRouter()
 
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+def _encode_event(event: Dict[str, Any], stream: str) -> bytes:
+    """
+    Encode a streamed event as one NDJSON line, or as a server-sent event
+    named after its "event" key.
+    """
+    if stream == "sse":
+        data = {key: value for key, value in event.items() if key != "event"}
+        return b"event: " + event["event"].encode() + b"\ndata: " + dumps(data) + b"\n\n"
+    return dumps(event) + b"\n"
+
+async def _encode_events(events: AsyncIterator[Dict[str, Any]], stream: str) -> AsyncIterator[bytes]:
+    async for event in events:
+        yield _encode_event(event, stream)
+
+def _parse_bulk_body(body: bytes, content_type: str) -> Tuple[List[Tuple[int, Any]], int, List[Dict[str, Any]]]:
+    """
+    Parse a bulk request body: a JSON array, or NDJSON (one task per line)
+    when the content type says so. Returns (index, item) pairs, the number
+    of items and errors for NDJSON lines that are not JSON.
+    """
+    if "ndjson" in content_type or "jsonl" in content_type:
+        items, failures = [], []
+        lines = [line for line in body.splitlines() if line.strip()]
+        for index, line in enumerate(lines):
+            try:
+                items.append((index, orjson.loads(line)))
+            except ValueError as e:
+                failures.append({"index": index, "errors": [f"item: invalid JSON: {e}"]})
+        return items, len(lines), failures
+
+    try:
+        items = orjson.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of tasks")
+    return list(enumerate(items)), len(items), []
+
+@router.post("/bulk")
+async def add_tasks_bulk(request: Request, all_or_nothing: bool = False, embed: bool = False):
+    """
+    Add many tasks at once, sent as a JSON array or as NDJSON
+    (Content-Type: application/x-ndjson). All valid tasks are written in one
+    COPY and transaction; invalid ones are reported by index. With
+    ?all_or_nothing=true nothing is written if any task is invalid.
+    With ?embed=true the new tasks are embedded (in batches) before responding.
+    """
+    try:
+        items, total, failures = _parse_bulk_body(await request.body(), request.headers.get("content-type", ""))
+        if total > TaskService.BULK_MAX_TASKS:
+            raise HTTPException(status_code=413, detail=f"At most {TaskService.BULK_MAX_TASKS} tasks per request")
+
+        results = await TaskService.add_tasks(items, total, failures, all_or_nothing=all_or_nothing, embed=embed)
+        if not results["inserted"] and results["errors"]:
+            return JSONResponse(status_code=422, content={"message": "No tasks added", **results})
+        return FastJSONResponse({"message": f"{results['inserted']} tasks added", **results})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/query")
-async def query_tasks(task_query: TaskQuery) -> Dict[str, Any]:
+async def query_tasks(task_query: TaskQuery, stream: Optional[Literal["ndjson", "sse"]] = None):
     """
     Handle a natural language query for tasks.
+    Results come one page at a time; send the returned next_cursor (without a
+    question) to get the next page.
+    With ?stream=ndjson or ?stream=sse all rows are sent as they are read from
+    the database (in batches, via a server-side cursor) instead of in one body.
+    With "compact": true rows are lists of values, named once under "columns".
     """
     try:
-        if not task_query.question:
+        if not task_query.question and not (task_query.cursor and not stream):
             raise HTTPException(status_code=400, detail="Question is required")
+
+        if stream:
+            events = await TaskService.stream_query_tasks(task_query.question, compact=task_query.compact)
+            return StreamingResponse(
+                _encode_events(events, stream),
+                media_type=STREAM_MEDIA_TYPES[stream],
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
         
-        results = await TaskService.query_tasks(task_query.question)
+        try:
+            results = await TaskService.query_tasks(task_query.question, task_query.limit, task_query.cursor,
+                                                    compact=task_query.compact)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        if results.get("rejected"):
+            # Generated SQL was too expensive to run, or timed out
+            return JSONResponse(status_code=422, content={
+                "message": "Query rejected",
+                "query": results["query"],
+                "response": results["response"],
+                "rejected": results["rejected"]
+            })
         
+        compact = {"columns": results.get("columns", [])} if task_query.compact else {}
         if not results["results"]:
-            return {
+            return FastJSONResponse({
                 "message": "No tasks found matching your query.",
                 "query": results["query"],
-                "results": []
-            }
+                **compact,
+                "results": [],
+                "next_cursor": None,
+                "shape": results.get("shape")
+            })
             
-        return {
+        # Returned as a response so the rows skip jsonable_encoder
+        return FastJSONResponse({
             "message": "Query executed successfully",
             "query": results["query"],
             "response": results["response"],
+            **compact,
             "results": results["results"],
-            "count": results["count"]
-        }
+            "count": results["count"],
+            "next_cursor": results["next_cursor"],
+            "shape": results["shape"]
+        })
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
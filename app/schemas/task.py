@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import Optional
 
 class TaskCreate(BaseModel):
     title: str
@@ -7,4 +8,9 @@ class TaskCreate(BaseModel):
     category: str
 
 class TaskQuery(BaseModel):
-    question: str
+    question: Optional[str] = None
+    # Page size (default QUERY_PAGE_SIZE) and the next_cursor of a previous page
+    limit: Optional[int] = Field(None, ge=1)
+    cursor: Optional[str] = None
+    # Rows as lists of values (named once under "columns") instead of objects
+    compact: bool = False
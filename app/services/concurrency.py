@@ -0,0 +1,68 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+# Upper bound on blocking calls (schema reflection, sync clients) running in
+# worker threads at once, so a burst of requests cannot exhaust the thread pool.
+MAX_BLOCKING_CALLS = int(os.getenv("MAX_BLOCKING_CALLS", "16"))
+# Let concurrent identical requests share one run (see SingleFlight)
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "true").lower() not in ("0", "false", "no")
+
+_semaphore: asyncio.Semaphore = None
+
+T = TypeVar("T")
+
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run a blocking callable in a worker thread without stalling the event loop.
+    At most ``MAX_BLOCKING_CALLS`` such calls run concurrently; the rest wait.
+    """
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(MAX_BLOCKING_CALLS)
+    async with _semaphore:
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller starts the
+    work as a task and callers arriving before it finishes await that task
+    instead of starting their own, so all of them get the same result or
+    exception. Nothing is kept once the task is done; later calls run again.
+
+    The task is shielded from its callers: a caller that goes away (client
+    disconnect) does not cancel the work the others are waiting for.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self.runs = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """Await ``func()``, or the run of it already in flight for ``key``."""
+        if not SINGLE_FLIGHT:
+            return await func()
+
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self.runs += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Mark the exception as retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """Runs started, calls that joined a run in flight, and runs in flight now."""
+        return {"runs": self.runs, "coalesced": self.coalesced, "in_flight": len(self._tasks)}
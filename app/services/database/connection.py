@@ -1,7 +1,43 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from pgvector.psycopg import register_vector
 import os
 
+_engine = None
+
+def get_database_url(driver: str = "postgresql") -> str:
+    """Build the database URL from environment variables."""
+    return f"{driver}://{os.getenv('PG_USER')}:{os.getenv('PG_PASSWORD')}@{os.getenv('PG_HOST')}:{os.getenv('PG_PORT')}/{os.getenv('PG_DATABASE')}"
+
 def get_db_engine():
-    """Create and return a SQLAlchemy database engine."""
-    connection_string = f"postgresql://{os.getenv('PG_USER')}:{os.getenv('PG_PASSWORD')}@{os.getenv('PG_HOST')}:{os.getenv('PG_PORT')}/{os.getenv('PG_DATABASE')}"
-    return create_engine(connection_string)
\ No newline at end of file
+    """Return the process-wide SQLAlchemy database engine, creating it on first use."""
+    global _engine
+    if _engine is None:
+        _engine = create_engine(get_database_url(), pool_pre_ping=True)
+    return _engine
+
+def create_vector_engine(**kwargs):
+    """
+    Create a SQLAlchemy engine on psycopg 3 whose connections know the pgvector
+    types. Float32 NumPy arrays bound as parameters are sent in pgvector's
+    binary format instead of being formatted as text.
+    """
+    engine = create_engine(get_database_url("postgresql+psycopg"), **kwargs)
+
+    @event.listens_for(engine, "connect")
+    def register_vector_type(dbapi_connection, connection_record):
+        register_vector(dbapi_connection)
+
+    return engine
+
+def column_type_oids(cursor, table: str, columns: list) -> list:
+    """
+    The type OIDs of ``columns`` of ``table``, in that order, for a binary
+    COPY. Binary COPY needs the exact server types, so they follow the table
+    definition (a bigint id, timestamptz...) instead of being assumed.
+    """
+    cursor.execute("""
+        SELECT attname, atttypid FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+    """, [table])
+    types = dict(cursor.fetchall())
+    return [types[column] for column in columns]
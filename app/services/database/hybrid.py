@@ -0,0 +1,134 @@
+"""
+Hybrid retrieval: full-text search and pgvector similarity in one statement,
+merged with reciprocal rank fusion (RRF).
+
+Each leg ranks its own candidates (``ts_rank_cd`` over a GIN-indexed
+``tsvector`` expression, cosine distance over the embedding index) and a
+row's fused score is ``sum(weight / (HYBRID_RRF_K + rank))`` over the legs
+that found it. Rows found by only one leg still score, so keyword-only
+matches (exact names, error messages) are not lost to the vector leg.
+
+The keyword leg needs no embedding. When the question still has to be
+embedded, callers can run ``keyword_sql`` while the embeddings request is in
+flight and bind its ranked ids to the fused statement
+(``hybrid_sql(..., keyword_ids=True)``), which then runs the vector leg and
+the fusion in one round trip.
+"""
+
+import os
+import re
+from typing import Optional, Sequence
+
+from app.services.database.vector import nearest_sql
+
+# Text search configuration; part of the indexed expression, so changing it
+# needs the GIN indexes rebuilt (manage_vector_indexes.py --method gin)
+TEXT_SEARCH_CONFIG = os.getenv("TEXT_SEARCH_CONFIG", "english")
+# RRF constant: larger values flatten the difference between top ranks
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+# Candidates each leg contributes before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+
+# Columns whose text is searched, per table
+TEXT_SEARCH_COLUMNS = {
+    "tasks": ("title", "description"),
+    "pdf_documents": ("content",),
+}
+
+if not re.fullmatch(r"[a-z_]+", TEXT_SEARCH_CONFIG):
+    raise ValueError(f"Invalid TEXT_SEARCH_CONFIG {TEXT_SEARCH_CONFIG!r}")
+
+
+def text_document(table: str) -> str:
+    """
+    The ``tsvector`` expression for ``table``. Queries must use exactly the
+    expression the GIN index was built on for the planner to use the index.
+    """
+    joined = " || ' ' || ".join(f"coalesce({column}, '')" for column in TEXT_SEARCH_COLUMNS[table])
+    return f"to_tsvector('{TEXT_SEARCH_CONFIG}', {joined})"
+
+
+def keyword_sql(text_table: str, id_column: str = "id") -> str:
+    """
+    SQL for the keyword leg: the ``id`` and ``text_rank`` of the
+    ``:leg_limit`` best full-text matches of ``:question`` (parsed with
+    ``websearch_to_tsquery``), best first.
+    """
+    document = text_document(text_table)
+    return f"""
+                SELECT {id_column} AS id, ts_rank_cd({document}, query) AS text_rank
+                FROM {text_table}, websearch_to_tsquery('{TEXT_SEARCH_CONFIG}', :question) query
+                WHERE {document} @@ query
+                ORDER BY text_rank DESC, {id_column}
+                LIMIT :leg_limit"""
+
+
+def hybrid_sql(text_table: str, columns: Sequence[str], vector_table: str, vector_id: str = "id",
+               id_column: str = "id", vector_column: str = "embedding", quantization: str = "none",
+               dimensions: int = 1536, semantic: bool = True, keyword: bool = True,
+               keyword_ids: bool = False) -> str:
+    """
+    SQL for the ``:top_k`` rows of ``text_table`` with the best fused score,
+    selecting ``id``, ``columns``, ``score``, each leg's rank (NULL when the
+    leg did not return the row) and the cosine ``similarity``.
+
+    Bind parameters: ``:question`` (parsed with ``websearch_to_tsquery``),
+    ``:embedding``, ``:leg_limit`` (candidates per leg), ``:candidates`` (see
+    ``rerank_candidates``), ``:semantic_weight``, ``:keyword_weight``,
+    ``:rrf_k`` and ``:top_k``. ``vector_table.vector_id`` references
+    ``text_table.id_column``. A leg turned off with ``semantic`` /
+    ``keyword`` is left out of the statement rather than weighted to zero.
+    With ``keyword_ids`` the keyword leg is not run: its result, from
+    ``keyword_sql``, is bound as ``:keyword_ids`` instead of ``:question``.
+    """
+    if semantic:
+        nearest = nearest_sql(vector_table, [vector_id], ":embedding", ":leg_limit",
+                              vector_column=vector_column, quantization=quantization, dimensions=dimensions)
+        semantic_leg = f"""
+            SELECT {vector_id} AS id, distance, row_number() OVER (ORDER BY distance, {vector_id}) AS rank
+            FROM ({nearest}
+            ) nearest"""
+    else:
+        semantic_leg = "SELECT NULL::bigint AS id, NULL::float8 AS distance, NULL::bigint AS rank WHERE false"
+
+    if keyword and keyword_ids:
+        keyword_leg = """
+            SELECT id, rank
+            FROM unnest(CAST(:keyword_ids AS bigint[])) WITH ORDINALITY AS matches(id, rank)"""
+    elif keyword:
+        keyword_leg = f"""
+            SELECT id, row_number() OVER (ORDER BY text_rank DESC, id) AS rank
+            FROM ({keyword_sql(text_table, id_column)}
+            ) matches"""
+    else:
+        keyword_leg = "SELECT NULL::bigint AS id, NULL::bigint AS rank WHERE false"
+
+    selected = ", ".join(f"t.{column}" for column in columns)
+    return f"""
+        WITH semantic AS ({semantic_leg}
+        ),
+        keyword AS ({keyword_leg}
+        )
+        SELECT
+            t.{id_column} AS id, {selected},
+            coalesce(CAST(:semantic_weight AS float8) / (CAST(:rrf_k AS int) + s.rank), 0)
+              + coalesce(CAST(:keyword_weight AS float8) / (CAST(:rrf_k AS int) + k.rank), 0) AS score,
+            s.rank AS semantic_rank,
+            k.rank AS keyword_rank,
+            1 - s.distance AS similarity
+        FROM semantic s
+        FULL JOIN keyword k ON k.id = s.id
+        JOIN {text_table} t ON t.{id_column} = coalesce(s.id, k.id)
+        ORDER BY score DESC, t.{id_column}
+        LIMIT :top_k"""
+
+
+def hybrid_params(question: str, embedding, top_k: int, semantic_weight: float, keyword_weight: float,
+                  candidates: int, leg_limit: int, keyword_ids: Optional[Sequence[int]] = None) -> dict:
+    """Bind parameters for ``hybrid_sql`` (``keyword_ids`` for ``keyword_ids=True``)."""
+    return {
+        "question": question, "embedding": embedding, "top_k": top_k,
+        "semantic_weight": semantic_weight, "keyword_weight": keyword_weight,
+        "rrf_k": HYBRID_RRF_K, "leg_limit": leg_limit, "candidates": candidates,
+        "keyword_ids": None if keyword_ids is None else list(keyword_ids),
+    }
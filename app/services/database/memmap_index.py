@@ -0,0 +1,256 @@
+"""
+Exact cosine search over embeddings exported to memory-mapped files.
+
+An alternative to querying pgvector for small and medium tables: the
+embedding column is exported once to a float32 matrix on disk (rows
+L2-normalised, so cosine similarity is a dot product) plus an id array,
+and searches run in-process with NumPy. Results are the same as an exact
+(non-index) pgvector ``<=>`` search, up to float32 rounding.
+
+Refreshes are incremental: each row's ``xmin`` (the id of the transaction
+that last wrote it) is stored with it, so a refresh reads only ids and
+``xmin`` values, then fetches vectors for rows that are new or changed and
+drops rows that were deleted.
+"""
+
+import os
+import threading
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from app.services.database.vector import fetch_binary, to_numpy
+
+# "pgvector" (default) or "memmap"; selects the backend of the search scripts
+VECTOR_SEARCH_BACKEND = os.getenv("VECTOR_SEARCH_BACKEND", "pgvector")
+VECTOR_INDEX_DIR = os.getenv(
+    "VECTOR_INDEX_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "prime", "vector_index")
+)
+# Seconds between checks for changed rows
+VECTOR_INDEX_REFRESH_INTERVAL = float(os.getenv("VECTOR_INDEX_REFRESH_INTERVAL", "60"))
+
+
+class MemmapVectorIndex:
+    """
+    In-process exact top-k cosine search over one table's embedding column.
+
+    Files live in ``directory`` (``get_index`` uses
+    ``VECTOR_INDEX_DIR/<database>/<schema>/<table>``): ``index.npz`` holds the ids, their ``xmin`` values and the name of the
+    vector file, and is replaced atomically, so a crashed refresh leaves the
+    previous state readable.
+    """
+
+    # Rows scored per matrix product; bounds temporary memory per search
+    BLOCK_ROWS = 65_536
+    # Ids per fetch while refreshing
+    FETCH_SIZE = 5_000
+
+    def __init__(self, table: str, directory: str, id_column: str = "id", vector_column: str = "embedding",
+                 dimensions: int = 1536):
+        self.table = table
+        self.id_column = id_column
+        self.vector_column = vector_column
+        self.dimensions = dimensions
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._refreshed_at = None
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self):
+        try:
+            with np.load(self._path("index.npz")) as index:
+                ids, xmins = index["ids"], index["xmins"]
+                vector_file, generation = str(index["vector_file"]), int(index["generation"])
+        except FileNotFoundError:
+            ids, xmins = np.empty(0, np.int64), np.empty(0, np.int64)
+            vector_file, generation = None, 0
+        self._generation = generation
+        self._vector_file = vector_file
+        self._open(ids, xmins)
+
+    def _open(self, ids: np.ndarray, xmins: np.ndarray):
+        if len(ids):
+            vectors = np.memmap(self._path(self._vector_file), dtype=np.float32, mode="r",
+                                shape=(len(ids), self.dimensions))
+        else:
+            vectors = np.empty((0, self.dimensions), np.float32)
+        # Searches read one consistent snapshot without taking the lock
+        self._ids, self._xmins, self._vectors = ids, xmins, vectors
+
+    def _commit(self, ids: np.ndarray, xmins: np.ndarray):
+        temp_path = self._path("index.tmp.npz")
+        np.savez(temp_path, ids=ids, xmins=xmins,
+                 vector_file=np.array(self._vector_file), generation=np.array(self._generation))
+        os.replace(temp_path, self._path("index.npz"))
+        self._open(ids, xmins)
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _fetch(self, connection, ids: List[int]):
+        """Yield (ids, xmins, normalised vectors) for the given ids, FETCH_SIZE at a time."""
+        query = (
+            f"SELECT {self.id_column}, xmin::text::bigint, {self.vector_column} "
+            f"FROM {self.table} WHERE {self.id_column} = ANY(%s) AND {self.vector_column} IS NOT NULL"
+        )
+        for start in range(0, len(ids), self.FETCH_SIZE):
+            rows = fetch_binary(connection, query, [ids[start:start + self.FETCH_SIZE]])
+            if rows:
+                yield (
+                    np.array([row[0] for row in rows], np.int64),
+                    np.array([row[1] for row in rows], np.int64),
+                    self._normalize(np.stack([to_numpy(row[2]) for row in rows])),
+                )
+
+    def refresh(self, connection) -> dict:
+        """
+        Bring the files up to date with the table, fetching only new and
+        changed vectors. Returns counts of kept, fetched and removed rows.
+        """
+        with self._lock:
+            current = connection.execute(text(
+                f"SELECT {self.id_column}, xmin::text::bigint FROM {self.table} "
+                f"WHERE {self.vector_column} IS NOT NULL"
+            )).fetchall()
+            current_xmins = dict(current)
+
+            ids, xmins = self._ids, self._xmins
+            keep = np.fromiter(
+                (current_xmins.get(row_id) == xmin for row_id, xmin in zip(ids.tolist(), xmins.tolist())),
+                dtype=bool, count=len(ids)
+            )
+            kept = set(ids[keep].tolist())
+            missing = [row_id for row_id in current_xmins if row_id not in kept]
+            stats = {"kept": int(keep.sum()), "fetched": 0, "removed": int(len(ids) - keep.sum())}
+
+            if missing or not keep.all():
+                new_ids, new_xmins = [ids[keep]], [xmins[keep]]
+                if keep.all() and self._vector_file:
+                    # Append only: extend the current vector file in place
+                    handle = open(self._path(self._vector_file), "r+b")
+                    handle.truncate(len(ids) * self.dimensions * 4)
+                    handle.seek(0, os.SEEK_END)
+                    old_file = None
+                else:
+                    # Rows changed or went away: write a new generation of the vector file
+                    old_file = self._vector_file
+                    self._generation += 1
+                    self._vector_file = f"vectors-{self._generation}.f32"
+                    handle = open(self._path(self._vector_file), "wb")
+                    for start in range(0, len(ids), self.BLOCK_ROWS):
+                        block_keep = keep[start:start + self.BLOCK_ROWS]
+                        handle.write(np.ascontiguousarray(self._vectors[start:start + self.BLOCK_ROWS][block_keep]).tobytes())
+                with handle:
+                    for fetched_ids, fetched_xmins, vectors in self._fetch(connection, missing):
+                        handle.write(vectors.astype(np.float32).tobytes())
+                        new_ids.append(fetched_ids)
+                        new_xmins.append(fetched_xmins)
+                        stats["fetched"] += len(fetched_ids)
+
+                self._commit(np.concatenate(new_ids), np.concatenate(new_xmins))
+                if old_file:
+                    os.remove(self._path(old_file))
+
+            self._refreshed_at = time.monotonic()
+            return stats
+
+    def refresh_if_stale(self, connection, max_age: float = VECTOR_INDEX_REFRESH_INTERVAL):
+        """Refresh if the last refresh in this process is older than ``max_age`` seconds."""
+        if self._refreshed_at is None or time.monotonic() - self._refreshed_at >= max_age:
+            self.refresh(connection)
+
+    def search(self, queries: Sequence[np.ndarray], top_k: int = 5,
+               min_similarity: Optional[float] = None) -> List[List[Tuple[int, float]]]:
+        """
+        Exact top-k by cosine similarity for each query vector, best first.
+        Returns one list of (id, similarity) per query; rows below
+        ``min_similarity`` are dropped after the top-k is taken, as in the SQL path.
+        """
+        ids, vectors = self._ids, self._vectors
+        queries = self._normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        if len(ids) == 0 or top_k <= 0:
+            return [[] for _ in range(len(queries))]
+        k = min(top_k, len(ids))
+
+        best_scores = np.empty((len(queries), 0), np.float32)
+        best_rows = np.empty((len(queries), 0), np.int64)
+        for start in range(0, len(ids), self.BLOCK_ROWS):
+            scores = queries @ vectors[start:start + self.BLOCK_ROWS].T
+            block_k = min(k, scores.shape[1])
+            top = np.argpartition(scores, -block_k, axis=1)[:, -block_k:]
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            best_rows = np.concatenate([best_rows, top + start], axis=1)
+            if best_scores.shape[1] > k:
+                top = np.argpartition(best_scores, -k, axis=1)[:, -k:]
+                best_scores = np.take_along_axis(best_scores, top, axis=1)
+                best_rows = np.take_along_axis(best_rows, top, axis=1)
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+
+        results = []
+        for scores, rows in zip(best_scores.tolist(), best_rows):
+            matches = [(int(row_id), score) for row_id, score in zip(ids[rows].tolist(), scores)]
+            if min_similarity is not None:
+                matches = [match for match in matches if match[1] >= min_similarity]
+            results.append(matches)
+        return results
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(connection, table: str, id_column: str = "id", vector_column: str = "embedding",
+              dimensions: int = 1536) -> MemmapVectorIndex:
+    """
+    The process-wide index of ``table`` in the database ``connection`` is
+    on, created on first use. Its files are in
+    ``VECTOR_INDEX_DIR/<database>/<schema>/<table>``, the schema being the
+    one ``table`` resolves to then, so tables of the same name in other
+    databases or schemas never share an export.
+    """
+    key = (connection.engine.url.render_as_string(), table, id_column, vector_column)
+    index = _indexes.get(key)
+    if index is None:
+        database, schema = connection.execute(text(
+            "SELECT current_database(), relnamespace::regnamespace::text FROM pg_class "
+            "WHERE oid = CAST(:table AS regclass)"
+        ), {"table": table}).one()
+        with _indexes_lock:
+            index = _indexes.get(key)
+            if index is None:
+                directory = os.path.join(VECTOR_INDEX_DIR, database, schema, table)
+                index = _indexes[key] = MemmapVectorIndex(
+                    table, directory, id_column=id_column, vector_column=vector_column, dimensions=dimensions
+                )
+    return index
+
+
+# Joins search results back to their rows in one statement:
+#   FROM {MATCHES_SQL} AS m(ord, id, similarity) JOIN table t ON t.id = m.id
+# where ord is the 1-based query position, as with unnest(...) WITH ORDINALITY
+MATCHES_SQL = "unnest(CAST(:ords AS int[]), CAST(:ids AS bigint[]), CAST(:similarities AS float8[]))"
+
+
+def match_params(matches: List[List[Tuple[int, float]]]) -> dict:
+    """Bind parameters for ``MATCHES_SQL`` from the output of ``MemmapVectorIndex.search``."""
+    params = {"ords": [], "ids": [], "similarities": []}
+    for position, query_matches in enumerate(matches, start=1):
+        for row_id, similarity in query_matches:
+            params["ords"].append(position)
+            params["ids"].append(row_id)
+            params["similarities"].append(similarity)
+    return params
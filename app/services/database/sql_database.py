@@ -0,0 +1,38 @@
+from typing import Dict, Iterable, Optional, Tuple
+from langchain.sql_database import SQLDatabase
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+
+class CachedSQLDatabase(SQLDatabase):
+    """
+    SQLDatabase that renders table info (DDL plus sample rows) once per set of
+    tables instead of querying the database on every chain invocation.
+    Build a new instance to pick up schema or data changes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._table_info_cache: Dict[Optional[Tuple[str, ...]], str] = {}
+
+    def get_table_info(self, table_names: Optional[Iterable[str]] = None) -> str:
+        key = tuple(sorted(table_names)) if table_names else None
+        if key not in self._table_info_cache:
+            self._table_info_cache[key] = super().get_table_info(table_names)
+        return self._table_info_cache[key]
+
+
+def get_schema_fingerprint(engine: Engine) -> str:
+    """
+    Return a hash of every column definition in the current schema.
+    Cheap enough to poll; changes whenever a table or column is added, dropped or altered.
+    """
+    with engine.connect() as connection:
+        return connection.execute(text("""
+            SELECT md5(coalesce(string_agg(
+                table_name || '.' || column_name || ':' || data_type,
+                ',' ORDER BY table_name, ordinal_position
+            ), ''))
+            FROM information_schema.columns
+            WHERE table_schema = current_schema()
+        """)).scalar()
@@ -0,0 +1,126 @@
+"""
+Helpers for pgvector: exchanging values in binary with float32 NumPy arrays,
+per-query ANN settings, and nearest-neighbour SQL (optionally quantized).
+
+Parameters need nothing special: on connections registered with pgvector
+(see ``create_vector_engine`` and the API pool) a NumPy array is dumped in
+binary automatically. Results only come back in binary from a binary cursor,
+which SQLAlchemy does not expose, so ``fetch_binary`` drops to the driver.
+"""
+
+import os
+from typing import Any, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+from sqlalchemy import text
+
+
+def to_numpy(value: Any) -> Optional[np.ndarray]:
+    """Convert a loaded vector (pgvector ``Vector`` or array-like) to float32 NumPy."""
+    if value is None:
+        return None
+    if hasattr(value, "to_numpy"):
+        value = value.to_numpy()
+    return np.asarray(value, dtype=np.float32)
+
+
+def fetch_binary(connection, query: str, params: Union[Sequence, Mapping, None] = None) -> List[tuple]:
+    """
+    Run ``query`` (psycopg placeholder style) on a SQLAlchemy connection's
+    underlying psycopg 3 connection with binary results, so vector columns are
+    decoded straight from pgvector's binary format.
+    """
+    raw_connection = connection.connection.driver_connection
+    with raw_connection.cursor(binary=True) as cursor:
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+
+# pgvector's default hnsw.ef_search; an HNSW scan returns at most this many rows
+DEFAULT_HNSW_EF_SEARCH = 40
+
+
+def set_search_params(connection, limit: int, ef_search: Optional[int] = None,
+                      probes: Optional[int] = None):
+    """
+    Apply per-query ANN recall/speed knobs for the current transaction only.
+
+    ``ef_search`` (HNSW) and ``probes`` (IVFFlat) trade latency for recall.
+    When ``ef_search`` is not given it is raised to ``limit`` if needed, since
+    an HNSW scan never returns more than ``ef_search`` rows. Works with a
+    SQLAlchemy ``Connection`` or ``Session``.
+    """
+    if ef_search is None and limit > DEFAULT_HNSW_EF_SEARCH:
+        ef_search = limit
+    if ef_search is not None:
+        connection.execute(text("SELECT set_config('hnsw.ef_search', :value, true)"),
+                           {"value": str(int(ef_search))})
+    if probes is not None:
+        connection.execute(text("SELECT set_config('ivfflat.probes', :value, true)"),
+                           {"value": str(int(probes))})
+
+
+# Quantized candidate search, served by the quantized indexes that
+# manage_vector_indexes.py builds (requires pgvector >= 0.7):
+#   "none"    - full-precision vectors throughout
+#   "halfvec" - candidates ranked on float16 copies of the vectors
+#   "binary"  - candidates ranked by Hamming distance on sign bits
+# Candidates are then re-ranked by exact cosine distance on the stored
+# float32 vectors, so returned distances are always full precision.
+QUANTIZATIONS = ("none", "halfvec", "binary")
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+# Candidates fetched per requested row before the re-rank
+VECTOR_RERANK_FACTOR = int(os.getenv("VECTOR_RERANK_FACTOR", "4"))
+
+
+def quantized_distance(column: str, query: str, quantization: str, dimensions: int = 1536) -> str:
+    """
+    SQL distance between ``column`` and ``query`` in the given quantization.
+    The expression matches the index expression, so the index can serve it.
+    """
+    if quantization == "halfvec":
+        return f"({column}::halfvec({dimensions})) <=> CAST({query} AS halfvec({dimensions}))"
+    if quantization == "binary":
+        return f"(binary_quantize({column})::bit({dimensions})) <~> binary_quantize({query})"
+    if quantization == "none":
+        return f"{column} <=> {query}"
+    raise ValueError(f"Unknown quantization {quantization!r}; expected one of {QUANTIZATIONS}")
+
+
+def rerank_candidates(limit: int, quantization: str) -> int:
+    """Number of candidates to fetch for ``limit`` results."""
+    return limit if quantization == "none" else limit * VECTOR_RERANK_FACTOR
+
+
+def nearest_sql(table: str, columns: Sequence[str], query: str, limit: str,
+                vector_column: str = "embedding", quantization: str = "none",
+                dimensions: int = 1536) -> str:
+    """
+    SQL for the ``limit`` rows of ``table`` nearest to ``query`` by cosine
+    distance, selecting ``columns`` (plain column names) plus a
+    full-precision ``distance``, nearest first. ``query`` and ``limit`` are SQL expressions (a bind
+    parameter or an outer column).
+
+    With quantization, the ``:candidates`` nearest rows by quantized distance
+    are fetched first (see ``rerank_candidates``) and re-ranked.
+    """
+    selected = ", ".join(columns)
+    distance = f"{vector_column} <=> {query}"
+    if quantization == "none":
+        return f"""
+            SELECT {selected}, {distance} AS distance
+            FROM {table}
+            WHERE {vector_column} IS NOT NULL
+            ORDER BY {distance}
+            LIMIT {limit}"""
+    return f"""
+            SELECT {selected}, {distance} AS distance
+            FROM (
+                SELECT {selected}, {vector_column}
+                FROM {table}
+                WHERE {vector_column} IS NOT NULL
+                ORDER BY {quantized_distance(vector_column, query, quantization, dimensions)}
+                LIMIT :candidates
+            ) candidates
+            ORDER BY distance
+            LIMIT {limit}"""
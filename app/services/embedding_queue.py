@@ -0,0 +1,136 @@
+from typing import List, Optional, Tuple
+from app.database.utils import execute_query, execute_non_query
+from app.services.llm.embeddings import acreate_embeddings
+import asyncio
+import os
+
+class EmbeddingQueue:
+    """
+    Background worker that embeds newly added tasks into ``task_embeddings``.
+
+    Task ids are queued by ``TaskService.add_task`` and embedded in batches
+    (one embeddings request per batch). Delivery is best effort: anything
+    still queued when the process stops is picked up by the next run of
+    ``populate_task_embeddings.py``, which embeds every task without an
+    up-to-date embedding.
+    """
+    _queue: asyncio.Queue = None
+    _worker: asyncio.Task = None
+
+    BATCH_SIZE = int(os.getenv("EMBEDDING_QUEUE_BATCH_SIZE", "64"))
+    FLUSH_INTERVAL = float(os.getenv("EMBEDDING_QUEUE_FLUSH_INTERVAL", "1.0"))
+    # Tasks per embed_tasks call when a bulk insert is embedded before responding
+    BULK_BATCH_SIZE = int(os.getenv("EMBEDDING_BULK_BATCH_SIZE", "1000"))
+
+    UPSERT_QUERY = """
+        INSERT INTO task_embeddings
+        (task_id, title, description, priority, category, created_at, content_hash, embedding)
+        SELECT t.id, t.title, t.description, t.priority, t.category, t.created_at,
+               e.content_hash, e.embedding
+        FROM unnest(%s::int[], %s::text[], %s::vector[]) AS e(task_id, content_hash, embedding)
+        JOIN tasks t ON t.id = e.task_id
+        ON CONFLICT (task_id) DO UPDATE SET
+        title = EXCLUDED.title,
+        description = EXCLUDED.description,
+        priority = EXCLUDED.priority,
+        category = EXCLUDED.category,
+        created_at = EXCLUDED.created_at,
+        content_hash = EXCLUDED.content_hash,
+        embedding = EXCLUDED.embedding
+    """
+
+    @staticmethod
+    def start():
+        """
+        Start the worker on the running event loop.
+        """
+        if EmbeddingQueue._worker is None:
+            EmbeddingQueue._queue = asyncio.Queue()
+            EmbeddingQueue._worker = asyncio.create_task(EmbeddingQueue._run())
+
+    @staticmethod
+    async def stop():
+        """
+        Stop the worker. Queued tasks are left for the next sync run.
+        """
+        if EmbeddingQueue._worker is not None:
+            EmbeddingQueue._worker.cancel()
+            try:
+                await EmbeddingQueue._worker
+            except asyncio.CancelledError:
+                pass
+            pending = EmbeddingQueue._queue.qsize()
+            if pending:
+                print(f"⏸️ {pending} tasks left unembedded; run populate_task_embeddings.py")
+            EmbeddingQueue._worker = None
+            EmbeddingQueue._queue = None
+
+    @staticmethod
+    def enqueue(task_id: int):
+        """
+        Queue a task for embedding. A no-op when the worker is not running.
+        """
+        if EmbeddingQueue._queue is not None:
+            EmbeddingQueue._queue.put_nowait(task_id)
+
+    @staticmethod
+    async def embed_in_batches(task_ids: List[int]) -> Tuple[int, Optional[str]]:
+        """
+        Embed many tasks now, BULK_BATCH_SIZE at a time, stopping at the first
+        failed batch. Returns how many tasks were embedded and the error, if any.
+        """
+        embedded = 0
+        for start in range(0, len(task_ids), EmbeddingQueue.BULK_BATCH_SIZE):
+            batch = task_ids[start:start + EmbeddingQueue.BULK_BATCH_SIZE]
+            try:
+                await EmbeddingQueue.embed_tasks(batch)
+            except Exception as e:
+                print(f"❌ Failed to embed tasks {batch[0]}..{batch[-1]}: {e}")
+                return embedded, str(e)
+            embedded += len(batch)
+        return embedded, None
+
+    @staticmethod
+    async def _run():
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for one task, then gather more until the batch fills or the interval passes
+            task_ids = [await EmbeddingQueue._queue.get()]
+            deadline = loop.time() + EmbeddingQueue.FLUSH_INTERVAL
+            while len(task_ids) < EmbeddingQueue.BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    task_ids.append(await asyncio.wait_for(EmbeddingQueue._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await EmbeddingQueue.embed_tasks(task_ids)
+            except Exception as e:
+                print(f"❌ Failed to embed tasks {task_ids}: {e}")
+
+    @staticmethod
+    async def embed_tasks(task_ids: List[int]):
+        """
+        Embed the given tasks' descriptions in one request and upsert them.
+        """
+        rows = await execute_query(
+            "SELECT id, description, md5(description) FROM tasks WHERE id = ANY(%s) AND description <> ''",
+            [task_ids]
+        )
+        if not rows:
+            return
+
+        embeddings = await acreate_embeddings([row[1] for row in rows])
+        if embeddings is None:
+            raise Exception("embedding generation failed")
+        await execute_non_query(
+            EmbeddingQueue.UPSERT_QUERY,
+            [
+                [row[0] for row in rows],
+                [row[2] for row in rows],
+                embeddings,  # float32 arrays, sent in pgvector's binary format
+            ]
+        )
@@ -0,0 +1,163 @@
+"""
+Embedding generation shared by the API and every ingestion/query script.
+
+All callers go through a persistent content-addressed cache, so identical
+text (repeated questions, duplicate chunks, unchanged descriptions) is only
+sent to the embeddings API once. Misses are embedded in as few requests as
+the API limits allow.
+"""
+
+import os
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+from openai import AsyncOpenAI, OpenAI
+
+from app.services.concurrency import run_blocking
+from app.services.llm.embedding_cache import EmbeddingCache
+from app.services.metrics import Metrics
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_DIMENSIONS = 1536
+
+# OpenAI limits: 2048 inputs and ~300k tokens per embeddings request,
+# 8191 tokens per input for text-embedding-ada-002
+MAX_BATCH_SIZE = 2048
+MAX_BATCH_TOKENS = 300_000
+MAX_INPUT_TOKENS = 8191
+
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "prime", "embeddings.sqlite3")
+)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+
+_client = None
+_async_client = None
+_cache = None
+_encoding = None
+
+
+def get_openai_client() -> OpenAI:
+    """Return one OpenAI client reused for every request."""
+    global _client
+    if _client is None:
+        _client = OpenAI()
+    return _client
+
+
+def get_async_openai_client() -> AsyncOpenAI:
+    """Return one async OpenAI client reused for every request."""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOpenAI()
+    return _async_client
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Return the shared embedding cache, or None if EMBEDDING_CACHE_MAX_ENTRIES is 0."""
+    global _cache
+    if _cache is None and EMBEDDING_CACHE_MAX_ENTRIES > 0:
+        _cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES)
+    return _cache
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens the way the embeddings endpoint does (estimated without tiktoken)."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.encoding_for_model(EMBEDDING_MODEL)
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return len(text) // 3 + 1
+
+
+def batch_texts(texts: List[str], batch_size: int = MAX_BATCH_SIZE,
+                max_batch_tokens: int = MAX_BATCH_TOKENS) -> Iterator[List[str]]:
+    """Group texts into embeddings requests that stay within the per-request limits."""
+    batch, batch_tokens = [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if batch and (len(batch) >= batch_size or batch_tokens + tokens > max_batch_tokens):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(text)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+def _to_vectors(response) -> List[np.ndarray]:
+    # Results carry their input index; don't rely on response order
+    ordered = sorted(response.data, key=lambda item: item.index)
+    vectors = [np.array(item.embedding, dtype=np.float32) for item in ordered]
+    for vector in vectors:
+        if len(vector) != EMBEDDING_DIMENSIONS:
+            raise ValueError(f"Unexpected embedding dimension: {len(vector)}")
+    return vectors
+
+
+def _lookup(texts: List[str]):
+    """Split texts into cached vectors and unique texts that still need embedding."""
+    cache = get_embedding_cache()
+    found = cache.get_many(EMBEDDING_MODEL, texts) if cache else {}
+    missing = list(dict.fromkeys(text for text in texts if text not in found))
+    return found, missing
+
+
+def _store(found: Dict[str, np.ndarray], batch: List[str], vectors: List[np.ndarray]):
+    found.update(zip(batch, vectors))
+    cache = get_embedding_cache()
+    if cache:
+        try:
+            cache.put_many(EMBEDDING_MODEL, list(zip(batch, vectors)))
+        except Exception as e:
+            # The vectors are still good; they are just embedded again next time
+            print(f"⚠️ Embedding cache write failed, {len(batch)} embeddings not cached: {e}")
+
+
+def create_embeddings(texts: List[str]) -> Optional[List[np.ndarray]]:
+    """
+    Embed many texts, serving repeats from the cache and sending the rest in
+    as few requests as possible. Returns vectors in input order, or None on error.
+    """
+    try:
+        with Metrics.span("embedding"):
+            found, missing = _lookup(texts)
+            for batch in batch_texts(missing):
+                response = get_openai_client().embeddings.create(model=EMBEDDING_MODEL, input=batch)
+                _store(found, batch, _to_vectors(response))
+            return [found[text] for text in texts]
+    except Exception as e:
+        print(f"Error generating embeddings for {len(texts)} texts: {e}")
+        return None
+
+
+def create_embedding(text: str) -> Optional[np.ndarray]:
+    """Embed a single text. Returns None on error."""
+    embeddings = create_embeddings([text])
+    return embeddings[0] if embeddings else None
+
+
+async def acreate_embeddings(texts: List[str]) -> Optional[List[np.ndarray]]:
+    """Async variant of create_embeddings; cache I/O runs off the event loop."""
+    try:
+        with Metrics.span("embedding"):
+            found, missing = await run_blocking(_lookup, texts)
+            for batch in batch_texts(missing):
+                response = await get_async_openai_client().embeddings.create(model=EMBEDDING_MODEL, input=batch)
+                await run_blocking(_store, found, batch, _to_vectors(response))
+            return [found[text] for text in texts]
+    except Exception as e:
+        print(f"Error generating embeddings for {len(texts)} texts: {e}")
+        return None
+
+
+async def acreate_embedding(text: str) -> Optional[np.ndarray]:
+    """Async variant of create_embedding."""
+    embeddings = await acreate_embeddings([text])
+    return embeddings[0] if embeddings else None
@@ -0,0 +1,131 @@
+"""
+Offline stand-ins for the OpenAI clients, used by the tests and benchmarks.
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, List, Optional, Union
+
+import numpy as np
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+EMBEDDING_DIMENSIONS = 1536
+
+
+class FakeSQLChatModel(BaseChatModel):
+    """
+    Chat model that always answers with the same SQL after a fixed delay.
+    The async path sleeps with ``asyncio.sleep`` like a real network call.
+    ``calls`` counts the completions requested.
+    """
+    sql: str = "SELECT id, title, description, priority, category FROM tasks LIMIT 5"
+    latency: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-sql"
+
+    def _result(self) -> ChatResult:
+        self.calls += 1
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.sql))])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return self._result()
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._result()
+
+
+def fake_embedding(text: str, dimensions: int = EMBEDDING_DIMENSIONS) -> np.ndarray:
+    """A unit vector seeded by the SHA-256 of ``text``: the same text gets the same vector in every run."""
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def clustered_embeddings(count: int, clusters: int = 20, spread: float = 1.0, seed: int = 0,
+                         dimensions: int = EMBEDDING_DIMENSIONS) -> np.ndarray:
+    """
+    ``count`` unit vectors scattered around ``clusters`` random topics, like
+    embeddings of related texts (``fake_embedding`` vectors are all nearly
+    orthogonal). ``spread`` is the noise norm relative to a topic vector.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimensions)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    noise = rng.standard_normal((count, dimensions)).astype(np.float32)
+    noise *= spread / np.linalg.norm(noise, axis=1, keepdims=True)
+    vectors = centers[rng.integers(clusters, size=count)] + noise
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class _FakeEmbeddings:
+    """``client.embeddings``: one request sleeps ``latency`` seconds, whatever its size."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.requests = 0
+        self.inputs = 0
+        self._lock = threading.Lock()
+
+    def _response(self, input: Union[str, List[str]]):
+        texts = [input] if isinstance(input, str) else input
+        with self._lock:
+            self.requests += 1
+            self.inputs += len(texts)
+        return SimpleNamespace(data=[
+            SimpleNamespace(index=index, embedding=fake_embedding(text)) for index, text in enumerate(texts)
+        ])
+
+    def create(self, model: str, input: Union[str, List[str]], **kwargs: Any):
+        time.sleep(self.latency)
+        return self._response(input)
+
+
+class _FakeAsyncEmbeddings(_FakeEmbeddings):
+    async def create(self, model: str, input: Union[str, List[str]], **kwargs: Any):
+        await asyncio.sleep(self.latency)
+        return self._response(input)
+
+
+class FakeEmbeddingsClient:
+    """Stands in for ``openai.OpenAI`` in ``client.embeddings.create(model=..., input=...)``."""
+
+    def __init__(self, latency: float = 0.0):
+        self.embeddings = _FakeEmbeddings(latency)
+
+
+class FakeAsyncEmbeddingsClient:
+    """Stands in for ``openai.AsyncOpenAI`` in ``await client.embeddings.create(...)``."""
+
+    def __init__(self, latency: float = 0.0):
+        self.embeddings = _FakeAsyncEmbeddings(latency)
+
+
+def install_fakes(chat_latency: float = 0.0, embedding_latency: float = 0.0, sql: Optional[str] = None):
+    """
+    Send every SQL generation and embeddings request of this process to the
+    fakes, and turn the persistent embedding cache off so fake vectors never
+    reach it. Returns the chat model and the sync and async embeddings clients
+    (their counters show how many calls were made).
+    """
+    from app.services import query_builder
+    from app.services.llm import embeddings
+
+    llm = FakeSQLChatModel(latency=chat_latency, **({"sql": sql} if sql else {}))
+    query_builder.get_llm = lambda: llm
+    embeddings._client = FakeEmbeddingsClient(embedding_latency)
+    embeddings._async_client = FakeAsyncEmbeddingsClient(embedding_latency)
+    embeddings.EMBEDDING_CACHE_MAX_ENTRIES = 0
+    embeddings._cache = None
+    return llm, embeddings._client, embeddings._async_client
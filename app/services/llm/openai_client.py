@@ -1,8 +1,13 @@
 from langchain_openai import ChatOpenAI
 
+_llm = None
+
 def get_llm():
-    """Initialize and return the OpenAI LLM client."""
-    return ChatOpenAI(
-        model_name="gpt-4o-mini",
-        temperature=0
-    )
\ No newline at end of file
+    """Return the shared OpenAI LLM client, creating it on first use."""
+    global _llm
+    if _llm is None:
+        _llm = ChatOpenAI(
+            model_name="gpt-4o-mini",
+            temperature=0
+        )
+    return _llm
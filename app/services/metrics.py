@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+# Record stage timings; when off, spans are a shared no-op context manager
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() not in ("0", "false", "no")
+# Upper bounds, in seconds, of the latency histogram buckets
+METRICS_BUCKETS = tuple(sorted(
+    float(bound) for bound in os.getenv("METRICS_BUCKETS", "0.001,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30").split(",")
+))
+
+# Stage durations of the current request, when it asked for them
+_trace: ContextVar[Optional[Dict[str, float]]] = ContextVar("metrics_trace", default=None)
+_NO_SPAN = nullcontext()
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        Metrics.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class _Histogram:
+    __slots__ = ("counts", "total")
+
+    def __init__(self):
+        self.counts = [0] * (len(METRICS_BUCKETS) + 1)  # last bucket is +Inf
+        self.total = 0.0
+
+
+class Metrics:
+    """
+    Per-stage latency histograms for the API and the scripts.
+
+    Code wraps each stage in ``with Metrics.span("<stage>"):`` (it works
+    around ``await`` too). Stages: schema_reflection, sql_generation,
+    embedding, vector_search, sql_guard, db_execution, formatting,
+    serialization and llm_summarization. Durations go into a process-wide
+    histogram per stage, exported by ``GET /metrics``, and into the current
+    request's trace when it sent ``X-Debug-Timing``.
+    """
+
+    _histograms: Dict[str, _Histogram] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def span(stage: str):
+        """Context manager timing one run of ``stage``."""
+        return _Span(stage) if METRICS_ENABLED else _NO_SPAN
+
+    @staticmethod
+    def observe(stage: str, seconds: float):
+        bucket = bisect_left(METRICS_BUCKETS, seconds)
+        with Metrics._lock:
+            histogram = Metrics._histograms.get(stage)
+            if histogram is None:
+                histogram = Metrics._histograms[stage] = _Histogram()
+            histogram.counts[bucket] += 1
+            histogram.total += seconds
+        trace = _trace.get()
+        if trace is not None:
+            trace[stage] = trace.get(stage, 0.0) + seconds
+
+    @staticmethod
+    @contextmanager
+    def trace() -> Iterator[Dict[str, float]]:
+        """Collect the total seconds per stage of everything run inside the block."""
+        stages: Dict[str, float] = {}
+        token = _trace.set(stages)
+        try:
+            yield stages
+        finally:
+            _trace.reset(token)
+
+    @staticmethod
+    def server_timing(stages: Dict[str, float]) -> str:
+        """A ``Server-Timing`` header value (durations in milliseconds)."""
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in stages.items())
+
+    @staticmethod
+    def snapshot() -> Dict[str, Dict]:
+        """Per stage: count, sum (seconds) and cumulative bucket counts keyed by upper bound."""
+        with Metrics._lock:
+            histograms = {stage: (list(h.counts), h.total) for stage, h in Metrics._histograms.items()}
+        snapshot = {}
+        for stage, (counts, total) in sorted(histograms.items()):
+            cumulative, buckets = 0, {}
+            for bound, count in zip([*METRICS_BUCKETS, float("inf")], counts):
+                cumulative += count
+                buckets[bound] = cumulative
+            snapshot[stage] = {"count": cumulative, "sum": total, "buckets": buckets}
+        return snapshot
+
+    @staticmethod
+    def exposition(counters: Dict[str, Dict[str, float]]) -> str:
+        """
+        The histograms, plus ``counters`` ({group: {name: value}}, exported as
+        ``prime_<group>_<name>``), in the Prometheus text format.
+        """
+        lines = [
+            "# HELP prime_stage_duration_seconds Time spent per request stage.",
+            "# TYPE prime_stage_duration_seconds histogram",
+        ]
+        for stage, histogram in Metrics.snapshot().items():
+            for bound, count in histogram["buckets"].items():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'prime_stage_duration_seconds_bucket{{stage="{stage}",le="{le}"}} {count}')
+            lines.append(f'prime_stage_duration_seconds_sum{{stage="{stage}"}} {histogram["sum"]}')
+            lines.append(f'prime_stage_duration_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+        for group, values in counters.items():
+            for name, value in values.items():
+                lines.append(f"# TYPE prime_{group}_{name} gauge")
+                lines.append(f"prime_{group}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def report() -> List[str]:
+        """Lines of a per-stage summary table for the scripts (empty if nothing was timed)."""
+        snapshot = Metrics.snapshot()
+        if not snapshot:
+            return []
+        lines = [f"{'stage':<20} {'count':>6} {'total ms':>10} {'mean ms':>9}"]
+        for stage, histogram in snapshot.items():
+            total_ms = histogram["sum"] * 1000
+            lines.append(f"{stage:<20} {histogram['count']:>6} {total_ms:>10.1f} {total_ms / histogram['count']:>9.1f}")
+        return lines
+
+    @staticmethod
+    def print_report():
+        lines = Metrics.report()
+        if lines:
+            print("\n⏱️ Stage timings")
+            print("\n".join(lines))
@@ -0,0 +1,144 @@
+import base64
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, Optional
+
+# Rows per page of /tasks/query results, and the most a client may ask for
+QUERY_PAGE_SIZE = int(os.getenv("QUERY_PAGE_SIZE", "100"))
+QUERY_MAX_PAGE_SIZE = int(os.getenv("QUERY_MAX_PAGE_SIZE", "1000"))
+
+_SELECT = re.compile(r"(select|with)\b", re.IGNORECASE)
+# LIMIT n [OFFSET m] or [OFFSET m ROWS] FETCH FIRST [n] ROWS ONLY at the end of a query
+_TRAILING_LIMIT = re.compile(
+    r"\b(?:limit\s+(\d+)(?:\s+offset\s+\d+(?:\s+rows?)?)?|fetch\s+(?:first|next)\s+(\d+\s+)?rows?\s+only)\s*$",
+    re.IGNORECASE
+)
+# String literals, quoted identifiers and comments, masked before looking for keywords
+_QUOTED = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/", re.DOTALL)
+_ORDER_BY = re.compile(r"\border\s+by\b", re.IGNORECASE)
+_ORDER_END = re.compile(r"\b(?:limit|offset|fetch|for)\b", re.IGNORECASE)
+# The only ORDER BY a keyset page on id reproduces
+_ORDER_BY_ID = re.compile(r'(?:\w+\.)?"?id"?(?:\s+asc)?(?:\s+nulls\s+last)?', re.IGNORECASE)
+
+
+def _mask(sql: str) -> str:
+    """``sql`` with literals, quoted identifiers and comments blanked out (same length)."""
+    return _QUOTED.sub(lambda match: "_" * len(match.group()), sql)
+
+
+class Pagination:
+    """
+    Row limits and keyset pagination for generated SQL.
+
+    A generated SELECT that is unordered or ordered by ``id`` ascending is
+    wrapped as a subquery and read in pages ordered by its ``id`` column
+    (``WHERE id > <last id> ORDER BY id LIMIT n``), so every page is an index
+    range scan no matter how deep the client pages. Any other ORDER BY
+    (``id DESC``, ``created_at``...) is kept and paged with LIMIT / OFFSET.
+    The continuation cursor carries the question, the last id (or the
+    offset) and a fingerprint of the SQL; follow-up pages take the SQL from
+    the query cache and refuse to continue if it has changed since the
+    first page.
+    """
+
+    @staticmethod
+    def page_size(limit: Optional[int] = None) -> int:
+        """Clamp a requested page size to 1..QUERY_MAX_PAGE_SIZE."""
+        return max(1, min(limit or QUERY_PAGE_SIZE, QUERY_MAX_PAGE_SIZE))
+
+    @staticmethod
+    def select_body(sql: str) -> Optional[str]:
+        """
+        The SQL without trailing semicolons if it is a single SELECT (or WITH
+        ... SELECT) that can be used as a subquery, else None.
+        """
+        body = sql.strip().rstrip(";").strip()
+        if ";" in _mask(body) or not _SELECT.match(body):
+            return None
+        return body
+
+    @staticmethod
+    def own_limit(body: str) -> Optional[int]:
+        """The row count of a trailing LIMIT (or FETCH FIRST) in the query itself, if any."""
+        match = _TRAILING_LIMIT.search(_mask(body).rstrip("_ \t\r\n"))
+        if not match:
+            return None
+        return int(match.group(1) or match.group(2) or 1)
+
+    @staticmethod
+    def order_by(body: str) -> Optional[str]:
+        """
+        The query's own (outermost) ORDER BY list, lowercased with whitespace
+        collapsed, or None if it has none.
+        """
+        masked = _mask(body)
+        depth, depths = 0, []
+        for char in masked:
+            depth += (char == "(") - (char == ")")
+            depths.append(depth)
+        top_level = [match for match in _ORDER_BY.finditer(masked) if depths[match.start()] == 0]
+        if not top_level:
+            return None
+        start = top_level[-1].end()
+        end = next(
+            (match.start() for match in _ORDER_END.finditer(masked, start) if depths[match.start()] == 0),
+            len(body)
+        )
+        return " ".join(body[start:end].lower().split())
+
+    @staticmethod
+    def keyset_compatible(body: str) -> bool:
+        """Whether paging by id preserves the query's order (no ORDER BY, or ORDER BY id ASC)."""
+        order = Pagination.order_by(body)
+        return order is None or _ORDER_BY_ID.fullmatch(order) is not None
+
+    @staticmethod
+    def keyset_query(body: str, page_size: int, after_id: Optional[int] = None) -> str:
+        """
+        One page of ``body`` ordered by id, plus one row to tell whether
+        another page follows.
+        """
+        where = f"WHERE page.id > {int(after_id)}" if after_id is not None else ""
+        return f"SELECT page.* FROM ({body}\n) AS page {where} ORDER BY page.id LIMIT {page_size + 1}"
+
+    @staticmethod
+    def offset_query(body: str, page_size: int, offset: int = 0) -> str:
+        """
+        One page of ``body`` in its own order, starting after ``offset`` rows,
+        plus one row to tell whether another page follows. The query is
+        wrapped, so its own LIMIT, OFFSET or FETCH still applies; the outer
+        LIMIT does not reorder it.
+        """
+        return f"SELECT * FROM ({body}\n) AS page LIMIT {page_size + 1} OFFSET {int(offset)}"
+
+    @staticmethod
+    def limit_query(body: str, page_size: int) -> str:
+        """``body`` capped at ``page_size`` rows (for results without an id column)."""
+        return f"SELECT * FROM ({body}\n) AS page LIMIT {page_size}"
+
+    @staticmethod
+    def fingerprint(sql: str) -> str:
+        return hashlib.sha1(sql.encode()).hexdigest()[:16]
+
+    @staticmethod
+    def encode_cursor(question: str, position: Dict[str, int], page_size: int, sql: str) -> str:
+        """``position`` is {"after": <last id>} for keyset pages or {"offset": <rows read>}."""
+        state = {"q": question, **position, "size": page_size, "sql": Pagination.fingerprint(sql)}
+        return base64.urlsafe_b64encode(json.dumps(state).encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Dict[str, Any]:
+        """Raises ValueError if the cursor is malformed."""
+        try:
+            state = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            return {
+                "question": str(state["q"]),
+                "after_id": int(state["after"]) if "after" in state else None,
+                "offset": int(state["offset"]) if "after" not in state else 0,
+                "page_size": Pagination.page_size(int(state["size"])),
+                "sql": str(state["sql"]),
+            }
+        except (ValueError, TypeError, KeyError) as e:
+            raise ValueError(f"Invalid cursor: {e}")
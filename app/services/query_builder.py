@@ -1,39 +1,146 @@
-from typing import Dict, Tuple
+from typing import Dict, Optional, Tuple
 from langchain.chains import create_sql_query_chain
-from langchain.sql_database import SQLDatabase
 from .database.connection import get_db_engine
+from .database.sql_database import CachedSQLDatabase, get_schema_fingerprint
 from .llm.openai_client import get_llm
+from .llm.embeddings import acreate_embedding
+from .concurrency import SingleFlight, run_blocking
+from .metrics import Metrics
+from .sql_cache import SQLQueryCache
+import numpy as np
+import asyncio
+import time
+import os
 
 class QueryBuilder:
+    # Process-wide SQL chain, built lazily and reused across requests
+    _chain = None
+    _schema_fingerprint = None
+    _built_at = 0.0
+    _checked_at = 0.0
+    _lock = asyncio.Lock()
+
+    # Seconds between cheap schema-change checks, and maximum age of the
+    # cached table info (sample rows) before it is rebuilt regardless
+    SCHEMA_CHECK_INTERVAL = float(os.getenv("SCHEMA_CHECK_INTERVAL", "60"))
+    SCHEMA_CACHE_TTL = float(os.getenv("SCHEMA_CACHE_TTL", "3600"))
+
+    # Generated SQL for previously seen questions (and similar ones, when
+    # SQL_CACHE_SIMILARITY_THRESHOLD is set)
+    sql_cache = SQLQueryCache.from_env()
+    # SQL generations in flight, keyed by normalized question: concurrent
+    # askers of the same question share one cache lookup and LLM call
+    in_flight = SingleFlight()
+
+    @staticmethod
+    def refresh():
+        """
+        Drop the cached chain and generated SQL so the next question
+        re-reflects the schema.
+        """
+        QueryBuilder._chain = None
+        QueryBuilder._schema_fingerprint = None
+        QueryBuilder.sql_cache.clear()
+
+    @staticmethod
+    def _is_fresh(now: float) -> bool:
+        return (
+            QueryBuilder._chain is not None
+            and now - QueryBuilder._checked_at < QueryBuilder.SCHEMA_CHECK_INTERVAL
+            and now - QueryBuilder._built_at < QueryBuilder.SCHEMA_CACHE_TTL
+        )
+
+    @staticmethod
+    async def get_chain():
+        """
+        Return the cached SQL query chain, rebuilding it when the schema
+        fingerprint changes, the TTL expires or refresh() was called.
+        """
+        if QueryBuilder._is_fresh(time.monotonic()):
+            return QueryBuilder._chain
+
+        async with QueryBuilder._lock:
+            now = time.monotonic()
+            if QueryBuilder._is_fresh(now):
+                return QueryBuilder._chain
+
+            with Metrics.span("schema_reflection"):
+                engine = get_db_engine()
+                fingerprint = await run_blocking(get_schema_fingerprint, engine)
+
+                if (
+                    QueryBuilder._chain is None
+                    or fingerprint != QueryBuilder._schema_fingerprint
+                    or now - QueryBuilder._built_at >= QueryBuilder.SCHEMA_CACHE_TTL
+                ):
+                    # Reflect the schema and render table info once (both blocking)
+                    db = await run_blocking(CachedSQLDatabase, engine)
+                    await run_blocking(db.get_table_info)
+
+                    if QueryBuilder._schema_fingerprint not in (None, fingerprint):
+                        # SQL generated against the old schema may no longer run
+                        QueryBuilder.sql_cache.clear()
+
+                    QueryBuilder._chain = create_sql_query_chain(get_llm(), db)
+                    QueryBuilder._schema_fingerprint = fingerprint
+                    QueryBuilder._built_at = now
+                    print("🔄 SQL query chain rebuilt")
+
+            QueryBuilder._checked_at = now
+            return QueryBuilder._chain
+
     @staticmethod
-    def build_query(question: str) -> Tuple[str, str, Dict]:
+    async def _lookup_cached_sql(question: str) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Look the question up in the SQL cache, exact match first, then by
+        embedding similarity. Returns the cached SQL (or None) and the question
+        embedding so a miss can be cached without embedding it twice.
+        """
+        sql_query = QueryBuilder.sql_cache.get(question)
+        if sql_query is not None or not QueryBuilder.sql_cache.semantic_enabled:
+            return sql_query, None
+
+        # The semantic tier is an optimization; fall back to the LLM on error
+        embedding = await acreate_embedding(question)
+        if embedding is None:
+            return None, None
+
+        return QueryBuilder.sql_cache.get_similar(embedding), embedding
+
+    @staticmethod
+    async def _generate_sql(question: str) -> str:
+        """Cached SQL for the question, or SQL generated by the chain (and cached)."""
+        sql_query, embedding = await QueryBuilder._lookup_cached_sql(question)
+
+        if sql_query is None:
+            # Get the cached SQL query chain
+            chain = await QueryBuilder.get_chain()
+
+            # Generate SQL query
+            with Metrics.span("sql_generation"):
+                sql_query = await chain.ainvoke({"question": question})
+            QueryBuilder.sql_cache.put(question, sql_query, embedding)
+        return sql_query
+
+    @staticmethod
+    async def build_query(question: str) -> Tuple[str, str, Dict]:
         """
         Build an SQL query using LangChain's SQL query chain.
+        Concurrent calls for the same (normalized) question share one generation.
         Returns:
             Tuple[str, str, Dict]: SQL query, response template, and template variables
         """
         try:
-            # Get database engine
-            engine = get_db_engine()
-            
-            # Create SQL database wrapper
-            db = SQLDatabase(engine)
-            
-            # Get LLM
-            llm = get_llm()
-            
-            # Create SQL query chain
-            chain = create_sql_query_chain(llm, db)
-            
-            # Generate SQL query
-            sql_query = chain.invoke({"question": question})
-            
+            sql_query = await QueryBuilder.in_flight.do(
+                SQLQueryCache.normalize_question(question), lambda: QueryBuilder._generate_sql(question)
+            )
+
             # Default template and variables
             template = "Found {count} matching tasks."
             variables = {"count": "len(results)"}
-            
+
             return sql_query, template, variables
-            
+
         except Exception as e:
             print(f"Error generating SQL query: {e}")
             # Fallback to a basic query if chain fails
@@ -41,4 +148,4 @@ class QueryBuilder:
                 "SELECT * FROM tasks",
                 "Found {count} tasks.",
                 {"count": "len(results)"}
-            )
\ No newline at end of file
+            )
@@ -0,0 +1,216 @@
+import json
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from psycopg import errors
+from sqlalchemy import text
+
+from .metrics import Metrics
+from .pagination import Pagination
+
+# The tag SQLShapes.normalize appends to generated SQL
+_SHAPE_TAG = re.compile(r"/\* shape:(\w+) \*/$")
+
+
+class QueryRejected(Exception):
+    """Generated SQL that was not run (too expensive) or was cancelled (timeout)."""
+
+    def __init__(self, reason: str, message: str, cost: Optional[float] = None, rows: Optional[float] = None):
+        super().__init__(message)
+        self.reason = reason
+        self.cost = cost
+        self.rows = rows
+
+    def to_dict(self) -> Dict:
+        return {"reason": self.reason, "detail": str(self), "estimated_cost": self.cost, "estimated_rows": self.rows}
+
+
+class QueryGuard:
+    """
+    Pre-execution checks for LLM-generated SQL.
+
+    Before a generated statement runs, the planner's estimate is read with
+    ``EXPLAIN (FORMAT JSON)`` (planning only, nothing is executed):
+      - above ``SQL_MAX_COST`` (planner cost units) the query is rejected;
+      - above ``SQL_MAX_ROWS`` estimated rows a single SELECT is rewritten to
+        return at most that many rows, and rejected if still too expensive.
+    The statement then runs under ``SQL_STATEMENT_TIMEOUT_MS``, set for the
+    current transaction only, so a bad estimate still cannot run for long.
+    The verdict (with its cost and row estimate) is kept per shape
+    fingerprint, so a recurring shape is only explained once; statements
+    without a ``/* shape:… */`` tag are explained every time. Outcomes are
+    counted in ``stats()``.
+    """
+
+    MAX_COST = float(os.getenv("SQL_MAX_COST", "1000000"))
+    MAX_ROWS = float(os.getenv("SQL_MAX_ROWS", "100000"))
+    # 0 disables the timeout
+    STATEMENT_TIMEOUT_MS = int(os.getenv("SQL_STATEMENT_TIMEOUT_MS", "15000"))
+    # Shapes whose verdict is remembered (LRU); 0 explains every execution
+    CACHE_SIZE = int(os.getenv("SQL_GUARD_CACHE_SIZE", "1000"))
+
+    _counts = Counter()
+    _verdicts: "OrderedDict[str, Tuple[str, float, float]]" = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def count(outcome: str):
+        with QueryGuard._lock:
+            QueryGuard._counts[outcome] += 1
+
+    @staticmethod
+    def stats() -> Dict[str, int]:
+        """Checked / cached / passed / rewritten / rejected_cost / rejected_rows / timeouts counters."""
+        with QueryGuard._lock:
+            return {
+                outcome: QueryGuard._counts[outcome]
+                for outcome in ("checked", "cached", "passed", "rewritten", "rejected_cost", "rejected_rows",
+                                "timeouts")
+            }
+
+    @staticmethod
+    def _estimate(explain_output) -> Tuple[float, float]:
+        """Total cost and row estimate of the top plan node."""
+        plan = explain_output if isinstance(explain_output, list) else json.loads(explain_output)
+        return float(plan[0]["Plan"]["Total Cost"]), float(plan[0]["Plan"]["Plan Rows"])
+
+    @staticmethod
+    def _row_cap(sql: str) -> Optional[str]:
+        body = Pagination.select_body(sql)
+        if body is None:
+            return None
+        return f"SELECT * FROM ({body}\n) AS capped LIMIT {int(QueryGuard.MAX_ROWS)}"
+
+    @staticmethod
+    def _reject(reason: str, cost: float, rows: float) -> QueryRejected:
+        QueryGuard.count(f"rejected_{reason}")
+        if reason == "cost":
+            message = f"Estimated cost {cost:.0f} exceeds the limit of {QueryGuard.MAX_COST:.0f}"
+        else:
+            message = f"Estimated {rows:.0f} rows exceed the limit of {QueryGuard.MAX_ROWS:.0f}"
+        print(f"⛔ Generated SQL rejected: {message}")
+        return QueryRejected(reason, message, cost, rows)
+
+    @staticmethod
+    def _cached(sql: str) -> Optional[Tuple[str, float, float]]:
+        """The remembered verdict for the shape ``sql`` is tagged with, if any."""
+        match = _SHAPE_TAG.search(sql)
+        if match is None or not QueryGuard.CACHE_SIZE:
+            return None
+        with QueryGuard._lock:
+            verdict = QueryGuard._verdicts.get(match.group(1))
+            if verdict is not None:
+                QueryGuard._verdicts.move_to_end(match.group(1))
+                QueryGuard._counts["cached"] += 1
+        return verdict
+
+    @staticmethod
+    def _verdict(sql: str, cost: float, rows: float,
+                 capped_cost: Optional[float]) -> Tuple[str, float, float]:
+        """
+        Decide on ``sql`` from its estimates (``capped_cost`` is the cost of
+        the row-capped query, when one was explained) and remember the
+        verdict for its shape: (outcome, cost, rows), the outcome being
+        "passed", "rewritten" or the reason it is rejected.
+        """
+        if cost > QueryGuard.MAX_COST:
+            verdict = ("cost", cost, rows)
+        elif rows <= QueryGuard.MAX_ROWS:
+            verdict = ("passed", cost, rows)
+        elif capped_cost is None:
+            verdict = ("rows", cost, rows)
+        elif capped_cost > QueryGuard.MAX_COST:
+            verdict = ("cost", capped_cost, rows)
+        else:
+            verdict = ("rewritten", capped_cost, rows)
+
+        match = _SHAPE_TAG.search(sql)
+        if match is not None and QueryGuard.CACHE_SIZE:
+            with QueryGuard._lock:
+                QueryGuard._verdicts[match.group(1)] = verdict
+                QueryGuard._verdicts.move_to_end(match.group(1))
+                while len(QueryGuard._verdicts) > QueryGuard.CACHE_SIZE:
+                    QueryGuard._verdicts.popitem(last=False)
+        return verdict
+
+    @staticmethod
+    def _apply(sql: str, verdict: Tuple[str, float, float]) -> str:
+        """The SQL to execute under ``verdict``; raises QueryRejected."""
+        outcome, cost, rows = verdict
+        if outcome in ("cost", "rows"):
+            raise QueryGuard._reject(outcome, cost, rows)
+        QueryGuard.count(outcome)
+        return sql if outcome == "passed" else QueryGuard._row_cap(sql)
+
+    @staticmethod
+    async def prepare(conn, sql: str, params: Optional[List[Any]] = None) -> str:
+        """
+        Check ``sql`` (with its bind ``params``) on an open psycopg connection
+        and set the statement timeout for its transaction. Returns the SQL to
+        execute (possibly row-capped); raises QueryRejected.
+        """
+        with Metrics.span("sql_guard"):
+            return await QueryGuard._prepare(conn, sql, params)
+
+    @staticmethod
+    async def _prepare(conn, sql: str, params: Optional[List[Any]]) -> str:
+        async with conn.cursor() as cursor:
+            if QueryGuard.STATEMENT_TIMEOUT_MS:
+                await cursor.execute("SELECT set_config('statement_timeout', %s, true)",
+                                     [str(QueryGuard.STATEMENT_TIMEOUT_MS)])
+            verdict = QueryGuard._cached(sql)
+            if verdict is None:
+                QueryGuard.count("checked")
+                await cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                cost, rows = QueryGuard._estimate((await cursor.fetchone())[0])
+                capped, capped_cost = QueryGuard._row_cap(sql), None
+                if cost <= QueryGuard.MAX_COST and rows > QueryGuard.MAX_ROWS and capped is not None:
+                    await cursor.execute(f"EXPLAIN (FORMAT JSON) {capped}", params)
+                    capped_cost, _ = QueryGuard._estimate((await cursor.fetchone())[0])
+                verdict = QueryGuard._verdict(sql, cost, rows, capped_cost)
+            return QueryGuard._apply(sql, verdict)
+
+    @staticmethod
+    def prepare_sync(connection, sql: str) -> str:
+        """``prepare`` for a SQLAlchemy connection (scripts)."""
+        with Metrics.span("sql_guard"):
+            return QueryGuard._prepare_sync(connection, sql)
+
+    @staticmethod
+    def _prepare_sync(connection, sql: str) -> str:
+        if QueryGuard.STATEMENT_TIMEOUT_MS:
+            connection.execute(text("SELECT set_config('statement_timeout', :value, true)"),
+                               {"value": str(QueryGuard.STATEMENT_TIMEOUT_MS)})
+        verdict = QueryGuard._cached(sql)
+        if verdict is None:
+            QueryGuard.count("checked")
+            cost, rows = QueryGuard._estimate(connection.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar())
+            capped, capped_cost = QueryGuard._row_cap(sql), None
+            if cost <= QueryGuard.MAX_COST and rows > QueryGuard.MAX_ROWS and capped is not None:
+                capped_cost, _ = QueryGuard._estimate(
+                    connection.execute(text(f"EXPLAIN (FORMAT JSON) {capped}")).scalar()
+                )
+            verdict = QueryGuard._verdict(sql, cost, rows, capped_cost)
+        return QueryGuard._apply(sql, verdict)
+
+    @staticmethod
+    def rejection(error: BaseException) -> Optional[QueryRejected]:
+        """
+        The QueryRejected behind an execution error (also when wrapped), turning
+        statement timeouts into one; None for any other error.
+        """
+        while error is not None:
+            if isinstance(error, QueryRejected):
+                return error
+            # 57014 query_canceled, from psycopg or (in scripts) psycopg2
+            if isinstance(error, errors.QueryCanceled) or getattr(error, "pgcode", None) == "57014":
+                QueryGuard.count("timeouts")
+                print(f"⛔ Generated SQL cancelled after {QueryGuard.STATEMENT_TIMEOUT_MS} ms")
+                return QueryRejected(
+                    "timeout", f"Query exceeded the statement timeout of {QueryGuard.STATEMENT_TIMEOUT_MS} ms"
+                )
+            error = error.__cause__ or getattr(error, "orig", None)
+        return None
@@ -1,66 +1,95 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Sequence
+
+# Column names assumed for rows whose description is not available
+TASK_COLUMNS = ("id", "title", "description", "priority", "category")
 
 class ResponseFormatter:
     @staticmethod
-    def format_task_results(results: List[tuple]) -> List[Dict[str, Any]]:
+    def column_names(columns: Sequence[str]) -> List[str]:
         """
-        Format raw database results into structured task dictionaries.
+        Result column names made unique (``count``, ``count_2``...), so rows
+        can become dictionaries without columns overwriting each other.
         """
-        formatted_results = []
-        try:
-            for row in results:
-                formatted_results.append({
-                    "id": row[0],
-                    "title": row[1],
-                    "description": row[2],
-                    "priority": row[3],
-                    "category": row[4]
-                })
-        except Exception as e:
-            print(f"Error formatting results: {e}")
-        return formatted_results
+        names, seen = [], set()
+        for column in columns:
+            name, suffix = column, 2
+            while name in seen:
+                name, suffix = f"{column}_{suffix}", suffix + 1
+            seen.add(name)
+            names.append(name)
+        return names
+
+    @staticmethod
+    def format_task_results(results: List[tuple], columns: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Format raw database results into dictionaries keyed by column name.
+        `columns` comes from the cursor description; without it the rows are
+        taken to be tasks (id, title, description, priority, category).
+        """
+        if not results:
+            return []
+        names = ResponseFormatter.column_names(columns if columns is not None else TASK_COLUMNS[:len(results[0])])
+        return [dict(zip(names, row)) for row in results]
 
     @staticmethod
-    def process_template_variables(template_vars: Dict, results: List[Dict]) -> Dict:
-        """Process template variables with actual values."""
+    def compact_results(results: List[tuple], columns: Sequence[str]) -> Dict[str, Any]:
+        """
+        Results as column names plus one list of values per row, without
+        building a dictionary per row (rows are serialized as JSON arrays).
+        """
+        return {"columns": ResponseFormatter.column_names(columns), "results": results}
+
+    @staticmethod
+    def process_template_variables(template_vars: Dict, count: int) -> Dict:
+        """Process template variables with actual values (count is the number of result rows)."""
         processed_vars = {}
         try:
             for key, value in template_vars.items():
                 if isinstance(value, str) and value == "len(results)":
-                    processed_vars[key] = len(results)
+                    processed_vars[key] = count
                 else:
                     processed_vars[key] = value
             
             # Ensure count is always present
             if "count" not in processed_vars:
-                processed_vars["count"] = len(results)
+                processed_vars["count"] = count
         except Exception as e:
             print(f"Error processing variables: {e}")
-            processed_vars = {"count": len(results)}
+            processed_vars = {"count": count}
             
         return processed_vars
 
+    @staticmethod
+    def format_summary(template: str, template_vars: Dict, count: int, query: str) -> Dict[str, Any]:
+        """
+        Format the response message for a result of `count` rows, without the rows
+        (the closing event of a streamed query).
+        """
+        vars_dict = ResponseFormatter.process_template_variables(template_vars, count)
+        try:
+            response_message = template.format(**vars_dict)
+        except:
+            response_message = f"Found {vars_dict['count']} matching tasks."
+        return {
+            "message": "Query executed successfully",
+            "query": query,
+            "response": response_message,
+            "count": vars_dict["count"]
+        }
+
     @staticmethod
     def format_response(template: str, template_vars: Dict, results: List[Dict], query: str) -> Dict[str, Any]:
         """
         Format the final response using the template and variables.
         """
         try:
-            # Ensure we have processed variables with count
-            vars_dict = ResponseFormatter.process_template_variables(template_vars, results)
-            
-            # Format response message
-            try:
-                response_message = template.format(**vars_dict)
-            except:
-                response_message = f"Found {vars_dict['count']} matching tasks."
-            
+            summary = ResponseFormatter.format_summary(template, template_vars, len(results), query)
             return {
-                "message": "Query executed successfully",
+                "message": summary["message"],
                 "query": query,
-                "response": response_message,
+                "response": summary["response"],
                 "results": results,
-                "count": vars_dict["count"]
+                "count": summary["count"]
             }
         except Exception as e:
             # Ultimate fallback
@@ -0,0 +1,171 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Sequence
+
+import numpy as np
+
+
+class SQLQueryCache:
+    """
+    Cache of natural-language question -> generated SQL.
+
+    Lookups go through two tiers:
+      1. exact match on the normalized question (case, whitespace and
+         trailing "?", "!" or "." insensitive; operators, signs and other
+         symbols are kept, since "id > 100" and "id < 100" need different SQL);
+      2. cosine similarity between question embeddings, accepted when the
+         best match scores at least ``similarity_threshold``. Off unless a
+         threshold is given: questions that differ only in a value ("high
+         priority tasks" / "low priority tasks") score above 0.95 with
+         text-embedding-ada-002 but need different SQL.
+
+    Only the SQL is cached, never the rows, so answers stay fresh. Entries are
+    evicted least-recently-used once ``max_size`` is reached and expire after
+    ``ttl`` seconds. Embeddings are supplied by the caller, which keeps the
+    cache usable from both sync scripts and async request handlers.
+
+    The ``scope`` argument separates questions whose SQL depends on more than
+    the question text (for example the target table or row limit).
+    """
+
+    def __init__(self, max_size: int = 1000, ttl: float = 3600, similarity_threshold: Optional[float] = None):
+        """A ``similarity_threshold`` of None (or above 1) disables the semantic tier."""
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+
+        self._entries: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._vectors: Optional[np.ndarray] = None  # one unit-length row per slot
+        self._slot_keys: list = [None] * max_size
+        self._free_slots = list(range(max_size - 1, -1, -1))
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def from_env() -> "SQLQueryCache":
+        """
+        A cache configured by SQL_CACHE_SIZE, SQL_CACHE_TTL and
+        SQL_CACHE_SIMILARITY_THRESHOLD (unset: exact matches only).
+        """
+        threshold = os.getenv("SQL_CACHE_SIMILARITY_THRESHOLD")
+        return SQLQueryCache(
+            max_size=int(os.getenv("SQL_CACHE_SIZE", "1000")),
+            ttl=float(os.getenv("SQL_CACHE_TTL", "3600")),
+            similarity_threshold=float(threshold) if threshold else None
+        )
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        """Lowercase, collapse whitespace and strip trailing "?", "!" and "."."""
+        return re.sub(r"[\s?!.]+$", "", " ".join(question.lower().split()))
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.similarity_threshold is not None and self.similarity_threshold <= 1.0
+
+    def get(self, question: str, scope: Hashable = None) -> Optional[str]:
+        """
+        Exact-tier lookup. When the semantic tier is enabled a miss here is not
+        counted, since callers fall through to ``get_similar`` next.
+        """
+        key = (scope, self.normalize_question(question))
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is None:
+                if not self.semantic_enabled:
+                    self.misses += 1
+                return None
+            self.exact_hits += 1
+            return entry["sql"]
+
+    def get_similar(self, embedding: Sequence[float], scope: Hashable = None) -> Optional[str]:
+        """
+        Semantic-tier lookup against every cached question in the same scope.
+        Counts a miss when nothing scores above the threshold, or the tier is off.
+        """
+        with self._lock:
+            if not self.semantic_enabled or self._vectors is None or not self._entries:
+                self.misses += 1
+                return None
+
+            query = self._unit(embedding)
+            scores = self._vectors @ query
+            for slot in np.argsort(scores)[::-1]:
+                if scores[slot] < self.similarity_threshold:
+                    break
+                key = self._slot_keys[slot]
+                if key is None or key[0] != scope:
+                    continue
+                entry = self._live_entry(key)
+                if entry is not None:
+                    self.semantic_hits += 1
+                    return entry["sql"]
+
+            self.misses += 1
+            return None
+
+    def put(self, question: str, sql: str, embedding: Optional[Sequence[float]] = None,
+            scope: Hashable = None):
+        """Cache generated SQL for a question (and its embedding, if known)."""
+        key = (scope, self.normalize_question(question))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            while len(self._entries) >= self.max_size:
+                self._remove(next(iter(self._entries)))
+
+            slot = None
+            if embedding is not None:
+                vector = self._unit(embedding)
+                if self._vectors is None:
+                    self._vectors = np.zeros((self.max_size, len(vector)), dtype=np.float32)
+                slot = self._free_slots.pop()
+                self._vectors[slot] = vector
+                self._slot_keys[slot] = key
+
+            self._entries[key] = {"sql": sql, "slot": slot, "expires_at": time.monotonic() + self.ttl}
+
+    def clear(self):
+        """Forget every cached query (e.g. after a schema change)."""
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current size."""
+        return {
+            "size": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+        }
+
+    def _live_entry(self, key: tuple) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry["expires_at"] <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remove(self, key: tuple):
+        entry = self._entries.pop(key)
+        slot = entry["slot"]
+        if slot is not None:
+            self._vectors[slot] = 0.0
+            self._slot_keys[slot] = None
+            self._free_slots.append(slot)
+
+    @staticmethod
+    def _unit(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
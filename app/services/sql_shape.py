@@ -0,0 +1,190 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from psycopg.types.numeric import Int4, Int8
+
+# Executions of a shape before it runs as a server-side prepared statement;
+# 0 never prepares
+SQL_PREPARE_THRESHOLD = int(os.getenv("SQL_PREPARE_THRESHOLD", "2"))
+# Distinct shapes whose execution counts are remembered (LRU)
+SQL_SHAPE_CACHE_SIZE = int(os.getenv("SQL_SHAPE_CACHE_SIZE", "1000"))
+
+_TOKEN = re.compile(r"""
+      (?P<space>\s+)
+    | (?P<comment>--[^\n]*|/\*.*?\*/)
+    | (?P<dollar>\$(?P<tag>[A-Za-z_]*)\$.*?\$(?P=tag)\$)
+    | (?P<prefixed>[EeBbXxNn]'(?:[^'\\]|\\.|'')*')
+    | (?P<string>'(?:[^']|'')*')
+    | (?P<ident>"(?:[^"]|"")*")
+    | (?P<param>\$\d+)
+    | (?P<number>(?:\d+\.\d*|\.\d+|\d+)(?:[eE][+-]?\d+)?)
+    | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    | (?P<op>::|<>|!=|<=|>=|\|\||[^\s])
+""", re.VERBOSE | re.DOTALL)
+
+# Words after which a string literal is an ordinary value. After any other
+# word (DATE, INTERVAL, a type name...) it is part of a typed constant and
+# stays inline.
+_VALUE_KEYWORDS = {
+    "like", "ilike", "in", "and", "or", "not", "then", "else", "when", "between",
+    "select", "values", "is", "similar", "to", "return", "case", "any", "all", "some",
+}
+# Literals in GROUP BY / ORDER BY / PARTITION BY lists stay inline: positions
+# (ORDER BY 1) are not values, and an expression such as date_trunc('month', x)
+# only matches the same expression in the select list when both keep the literal
+_GROUPING_CLAUSES = {"by"}
+_CLAUSE_END = {"limit", "offset", "having", "fetch", "for", "union", "except", "intersect", "window",
+               "from", "where", "select"}
+
+
+def _number(token: str):
+    """A numeric literal as a parameter of the type PostgreSQL gives the literal."""
+    if re.fullmatch(r"\d+", token):
+        value = int(token)
+        if value < 2 ** 31:
+            return Int4(value)
+        if value < 2 ** 63:
+            return Int8(value)
+    return Decimal(token)
+
+
+class SqlShape(NamedTuple):
+    """Generated SQL with its literals lifted into bind parameters."""
+    sql: str              # %s placeholders, "%" escaped, tagged with the fingerprint
+    params: Optional[List[Any]]  # None when the shape is kept inline (see SQLShapes.keep_inline)
+    fingerprint: str      # stable across literal values, whitespace and keyword case
+    executions: int       # times this shape has been seen, including this one
+
+    @property
+    def prepare(self) -> bool:
+        """Whether to run as a server-side prepared statement."""
+        return SQL_PREPARE_THRESHOLD > 0 and self.executions >= SQL_PREPARE_THRESHOLD
+
+
+class SQLShapes:
+    """
+    Normalizes generated SQL into parameterized shapes.
+
+    The LLM inlines literals (``WHERE category = 'documentation'``), so every
+    variant of a question is different SQL, parsed and planned from scratch.
+    ``normalize`` lifts string and numeric literals into parameters (strings
+    untyped, numbers typed as the literal would be), so all variants share
+    one statement text that psycopg can prepare once per connection.
+    Literals used in a GROUP BY, ORDER BY or PARTITION BY list stay inline
+    wherever they appear in the statement, since the server matches grouping
+    expressions by their text. The shape's fingerprint is appended on its
+    own line as a ``/* shape:<fingerprint> */`` comment, so it appears in
+    the server's statement and slow-query logs as well as in API responses.
+
+    A few constructs cannot take an untyped parameter where they accepted a
+    literal (``concat('a', x)``); callers report such shapes with
+    ``keep_inline`` and later normalizations leave their literals in place.
+    """
+
+    _executions: "OrderedDict[str, int]" = OrderedDict()
+    _inline = set()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def normalize(sql: str) -> SqlShape:
+        tokens = []            # (kind, token, lowered, liftable)
+        grouped = set()        # literals that appear in a GROUP BY / ORDER BY / PARTITION BY list
+        previous = None        # last significant token, lowercased
+        depth = 0
+        grouping_depth = None  # paren depth of a GROUP BY / ORDER BY / PARTITION BY list
+        typmod_depths = []     # parens holding type modifiers, e.g. varchar(20)
+        before_previous = None
+
+        for match in _TOKEN.finditer(sql.strip().rstrip(";").rstrip()):
+            kind, token = match.lastgroup, match.group()
+            if kind in ("space", "comment"):
+                tokens.append((kind, token, None, False))
+                continue
+
+            lowered = token.lower()
+            liftable = False
+            if kind in ("string", "number"):
+                if grouping_depth is not None:
+                    # Grouping and sort expressions must match the select list
+                    # exactly, which separate parameters never do
+                    grouped.add(token)
+                elif kind == "string":
+                    liftable = previous is None or previous in _VALUE_KEYWORDS or not re.match(r"[a-z_]", previous)
+                else:
+                    liftable = depth not in typmod_depths
+            tokens.append((kind, token, lowered, liftable))
+
+            if kind == "op" and token == "(":
+                depth += 1
+                if before_previous in ("::", "as") and previous and re.match(r"[a-z_]", previous):
+                    typmod_depths.append(depth)
+            elif kind == "op" and token == ")":
+                if typmod_depths and typmod_depths[-1] == depth:
+                    typmod_depths.pop()
+                depth -= 1
+                if grouping_depth is not None and depth < grouping_depth:
+                    grouping_depth = None
+            elif kind == "word":
+                if lowered in _GROUPING_CLAUSES and previous in ("order", "group", "partition"):
+                    grouping_depth = depth
+                elif lowered in _CLAUSE_END and grouping_depth == depth:
+                    grouping_depth = None
+
+            before_previous, previous = previous, lowered
+
+        out, shape, params = [], [], []
+        for kind, token, lowered, liftable in tokens:
+            if kind == "space":
+                out.append(token)
+            elif kind == "comment":
+                out.append(token.replace("%", "%%"))
+            elif liftable and token not in grouped:
+                out.append("%s")
+                shape.append("?")
+                params.append(token[1:-1].replace("''", "'") if kind == "string" else _number(token))
+            else:
+                out.append(token.replace("%", "%%"))
+                shape.append(lowered if kind == "word" else token)
+
+        fingerprint = hashlib.sha1(" ".join(shape).encode()).hexdigest()[:16]
+        with SQLShapes._lock:
+            executions = SQLShapes._executions.pop(fingerprint, 0) + 1
+            SQLShapes._executions[fingerprint] = executions
+            while len(SQLShapes._executions) > SQL_SHAPE_CACHE_SIZE:
+                SQLShapes._executions.popitem(last=False)
+            inline = fingerprint in SQLShapes._inline
+
+        if inline:
+            return SQLShapes.inline(sql, fingerprint)
+        return SqlShape(f"{''.join(out)}\n/* shape:{fingerprint} */", params, fingerprint, executions)
+
+    @staticmethod
+    def inline(sql: str, fingerprint: str) -> SqlShape:
+        """``sql`` as written (no parameters, never prepared), tagged with its fingerprint."""
+        return SqlShape(f"{sql.strip().rstrip(';').rstrip()}\n/* shape:{fingerprint} */", None, fingerprint, 0)
+
+    @staticmethod
+    def keep_inline(fingerprint: str):
+        """Stop parameterizing a shape (its parameters could not be typed)."""
+        with SQLShapes._lock:
+            if len(SQLShapes._inline) >= SQL_SHAPE_CACHE_SIZE:
+                SQLShapes._inline.clear()
+            SQLShapes._inline.add(fingerprint)
+
+    @staticmethod
+    def stats() -> Dict[str, int]:
+        """Distinct shapes seen and how many recur enough to be prepared."""
+        with SQLShapes._lock:
+            counts = list(SQLShapes._executions.values())
+        return {
+            "shapes": len(counts),
+            "prepared_shapes": sum(
+                SQL_PREPARE_THRESHOLD > 0 and count >= SQL_PREPARE_THRESHOLD for count in counts
+            ),
+            "executions": sum(counts),
+        }
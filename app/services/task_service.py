@@ -1,10 +1,34 @@
-from app.database.utils import execute_query, execute_non_query
+from app.database.utils import execute_query, execute_non_query, stream_query, copy_insert, STREAM_BATCH_SIZE
 from app.schemas.task import TaskCreate
+from pydantic import ValidationError
 from app.services.query_builder import QueryBuilder
 from app.services.response_formatter import ResponseFormatter
-from typing import Dict, Any, List
+from app.services.embedding_queue import EmbeddingQueue
+from app.services.pagination import Pagination
+from app.services.metrics import Metrics
+from app.services.query_guard import QueryGuard
+from app.services.sql_shape import SQLShapes, SqlShape
+from app.services.sql_cache import SQLQueryCache
+from app.services.concurrency import SingleFlight
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
+from psycopg import errors
+import os
+
+# Errors from a lifted literal whose type the server cannot infer from its context,
+# or that no longer matches the same expression elsewhere (GROUP BY)
+_UNTYPED_PARAMETER_ERRORS = (
+    errors.IndeterminateDatatype, errors.UndefinedFunction, errors.AmbiguousFunction, errors.GroupingError
+)
+
 
 class TaskService:
+    # Most tasks accepted by one bulk request
+    BULK_MAX_TASKS = int(os.getenv("BULK_MAX_TASKS", "100000"))
+    BULK_COLUMNS = ["title", "description", "priority", "category"]
+    # Page queries in flight: concurrent identical requests share one
+    # generation and execution, and get the same response
+    in_flight = SingleFlight()
+
     @staticmethod
     async def add_task(task: TaskCreate) -> int:
         """
@@ -15,50 +39,294 @@ class TaskService:
                 INSERT INTO tasks (title, description, priority, category)
                 VALUES (%s, %s, %s, %s) RETURNING id
             """
-            result = execute_query(
+            result = await execute_query(
                 query, 
                 [task.title, task.description, task.priority, task.category]
             )
-            return result[0][0]
+            task_id = result[0][0]
+
+            # Embed the new task in the background for semantic search
+            EmbeddingQueue.enqueue(task_id)
+            return task_id
         except Exception as e:
             raise Exception(f"Failed to add task: {str(e)}")
 
     @staticmethod
-    async def query_tasks(question: str) -> Dict[str, Any]:
+    def validate_tasks(items: List[Tuple[int, Any]]) -> Tuple[List[Tuple[int, TaskCreate]], List[Dict[str, Any]]]:
+        """
+        Validate bulk items given as (index, parsed JSON) pairs.
+        Returns the valid tasks with their indexes, and one error per invalid item.
+        """
+        tasks, failures = [], []
+        for index, item in items:
+            try:
+                task = TaskCreate.model_validate(item)
+            except ValidationError as e:
+                failures.append({
+                    "index": index,
+                    "errors": [f"{'.'.join(map(str, error['loc'])) or 'item'}: {error['msg']}" for error in e.errors()]
+                })
+                continue
+            # PostgreSQL text cannot hold NUL, and one bad row would abort the whole COPY
+            nul_fields = [column for column in TaskService.BULK_COLUMNS if "\x00" in getattr(task, column)]
+            if nul_fields:
+                failures.append({"index": index, "errors": [f"{column}: contains a NUL character" for column in nul_fields]})
+                continue
+            tasks.append((index, task))
+        return tasks, failures
+
+    @staticmethod
+    async def add_tasks(items: List[Tuple[int, Any]], total: int, failures: List[Dict[str, Any]] = (),
+                        all_or_nothing: bool = False, embed: bool = False) -> Dict[str, Any]:
+        """
+        Validate and insert many tasks with COPY in one transaction.
+        `items` are (index, parsed JSON) pairs out of `total` submitted, and
+        `failures` any items already rejected (e.g. unparsable lines).
+        Invalid items are reported by index and skipped; with `all_or_nothing`
+        nothing is inserted if any item is invalid.
+        New tasks are embedded in batches before returning when `embed` is set,
+        otherwise in the background like single adds.
+        Returns "task_ids" aligned with the submitted items (None where invalid).
+        """
+        tasks, invalid = TaskService.validate_tasks(items)
+        failures = sorted([*failures, *invalid], key=lambda failure: failure["index"])
+        task_ids: List[Optional[int]] = [None] * total
+        result = {"inserted": 0, "task_ids": task_ids, "errors": failures}
+        if not tasks or (failures and all_or_nothing):
+            return result
+
+        rows = [[getattr(task, column) for column in TaskService.BULK_COLUMNS] for _, task in tasks]
+        ids = await copy_insert("tasks", TaskService.BULK_COLUMNS, rows)
+        for (index, _), task_id in zip(tasks, ids):
+            task_ids[index] = task_id
+        result["inserted"] = len(ids)
+
+        if embed:
+            # The tasks stay committed if embedding fails; populate_task_embeddings.py picks up the rest
+            result["embedded"], embedding_error = await EmbeddingQueue.embed_in_batches(ids)
+            if embedding_error:
+                result["embedding_error"] = embedding_error
+        else:
+            for task_id in ids:
+                EmbeddingQueue.enqueue(task_id)
+        return result
+
+    @staticmethod
+    async def _execute_generated(sql_query: str) -> Tuple[List[str], List[tuple], str]:
         """
-        Query tasks using natural language and return formatted results.
+        Run generated SQL through the QueryGuard with its literals as bind
+        parameters, prepared once its shape recurs. Returns the column names,
+        the rows and the shape fingerprint.
         """
+        shape = SQLShapes.normalize(sql_query)
         try:
-            # Get SQL query and response template
-            sql_query, response_template, template_vars = QueryBuilder.build_query(question)
-            
-            # Execute query
-            raw_results = execute_query(sql_query)
-            if raw_results is None:
-                raw_results = []
-            
-            # Format results
-            formatted_results = ResponseFormatter.format_task_results(raw_results)
-            
-            # Ensure we have the count variable
-            if isinstance(template_vars, dict) and "count" not in template_vars:
-                template_vars["count"] = "len(results)"
+            columns, rows = await execute_query(shape.sql, shape.params, guard=QueryGuard.prepare,
+                                                prepare=shape.prepare, with_columns=True)
+        except Exception as e:
+            if shape.params is None or not isinstance(e.__cause__, _UNTYPED_PARAMETER_ERRORS):
+                raise
+            # A literal the server could only type in place (e.g. concat('a', x))
+            SQLShapes.keep_inline(shape.fingerprint)
+            shape = SQLShapes.inline(sql_query, shape.fingerprint)
+            columns, rows = await execute_query(shape.sql, guard=QueryGuard.prepare, with_columns=True)
+        return columns, rows or [], shape.fingerprint
+
+    @staticmethod
+    async def _fetch_page(sql_query: str, page_size: int, after_id: Optional[int] = None,
+                          offset: int = 0) -> Tuple[List[str], List[tuple], Optional[Dict[str, int]], str]:
+        """
+        Run generated SQL for at most `page_size` rows, from after id `after_id`
+        (keyset pages) or after `offset` rows (queries with their own order).
+        Returns the column names, the rows, the position of the next page for
+        its cursor (None on the last page) and the shape fingerprint of the
+        statement that ran.
+        """
+        body = Pagination.select_body(sql_query)
+        if body is None:
+            # Not a single SELECT, so it cannot be wrapped; run it as generated
+            columns, rows, shape = await TaskService._execute_generated(sql_query)
+            return columns, rows, None, shape
+
+        own_limit = Pagination.own_limit(body)
+        if after_id is None and not offset and own_limit is not None and own_limit <= page_size:
+            # Already bounded; run as is to keep its own ORDER BY
+            columns, rows, shape = await TaskService._execute_generated(body)
+            return columns, rows, None, shape
+
+        if offset or not Pagination.keyset_compatible(body):
+            # Ordered by something other than id: keep that order, page by offset
+            columns, rows, shape = await TaskService._execute_generated(
+                Pagination.offset_query(body, page_size, offset)
+            )
+            next_page = {"offset": offset + page_size} if len(rows) > page_size else None
+            return columns, rows[:page_size], next_page, shape
+
+        try:
+            columns, rows, shape = await TaskService._execute_generated(
+                Pagination.keyset_query(body, page_size, after_id)
+            )
+        except Exception as e:
+            if not isinstance(e.__cause__, (errors.UndefinedColumn, errors.AmbiguousColumn)):
+                raise
+            # No single id column to page by (e.g. aggregates): only cap the rows
+            columns, rows, shape = await TaskService._execute_generated(Pagination.limit_query(body, page_size))
+            return columns, rows, None, shape
+
+        last_id = rows[page_size - 1][columns.index("id")] if len(rows) > page_size else None
+        next_page = {"after": last_id} if isinstance(last_id, int) else None
+        return columns, rows[:page_size], next_page, shape
+
+    @staticmethod
+    async def query_tasks(question: Optional[str] = None, limit: Optional[int] = None,
+                          cursor: Optional[str] = None, compact: bool = False) -> Dict[str, Any]:
+        """
+        Query tasks using natural language and return one page of formatted results,
+        one dictionary per row, or with `compact` the column names under "columns"
+        and one list of values per row.
+        Pass the returned `next_cursor` (instead of a question) to fetch the next page;
+        it reuses the cached SQL rather than asking the LLM again.
+        Generated SQL that the QueryGuard refuses or cancels is reported under "rejected".
+        Concurrent requests for the same page of the same (normalized) question
+        share one run and receive the same response object.
+        Raises ValueError for an invalid or expired cursor.
+        """
+        page_size = Pagination.page_size(limit)
+        after_id = cursor_sql = None
+        offset = 0
+        if cursor:
+            state = Pagination.decode_cursor(cursor)
+            question, after_id, offset, page_size, cursor_sql = (
+                state["question"], state["after_id"], state["offset"], state["page_size"], state["sql"]
+            )
+
+        key = (SQLQueryCache.normalize_question(question or ""), after_id, offset, page_size, cursor_sql, compact)
+        return await TaskService.in_flight.do(
+            key, lambda: TaskService._query_page(question, page_size, after_id, offset, cursor_sql, compact)
+        )
+
+    @staticmethod
+    async def _query_page(question: str, page_size: int, after_id: Optional[int], offset: int,
+                          cursor_sql: Optional[str], compact: bool) -> Dict[str, Any]:
+        # Get SQL query and response template
+        sql_query, response_template, template_vars = await QueryBuilder.build_query(question)
+        if cursor_sql is not None and Pagination.fingerprint(sql_query) != cursor_sql:
+            raise ValueError("Cursor has expired; ask the question again to start over")
+
+        try:
+            # Execute query, one page at a time
+            columns, raw_results, next_page, shape = await TaskService._fetch_page(
+                sql_query, page_size, after_id, offset
+            )
             
-            # Format final response
-            response = ResponseFormatter.format_response(
-                template=response_template,
-                template_vars=template_vars,
-                results=formatted_results,
-                query=sql_query
+            with Metrics.span("formatting"):
+                # Format results
+                if compact:
+                    compact_results = ResponseFormatter.compact_results(raw_results, columns)
+                    formatted_results = compact_results["results"]
+                else:
+                    formatted_results = ResponseFormatter.format_task_results(raw_results, columns)
+                
+                # Ensure we have the count variable
+                if isinstance(template_vars, dict) and "count" not in template_vars:
+                    template_vars["count"] = "len(results)"
+                
+                # Format final response
+                response = ResponseFormatter.format_response(
+                    template=response_template,
+                    template_vars=template_vars,
+                    results=formatted_results,
+                    query=sql_query
+                )
+            response["next_cursor"] = (
+                Pagination.encode_cursor(question, next_page, page_size, sql_query)
+                if next_page is not None else None
             )
+            response["shape"] = shape
+            if compact:
+                response["columns"] = compact_results["columns"]
             
             return response
         except Exception as e:
+            rejected = QueryGuard.rejection(e)
+            if rejected:
+                return {
+                    "message": "Query rejected",
+                    "query": sql_query,
+                    "response": str(rejected),
+                    "results": [],
+                    "count": 0,
+                    "next_cursor": None,
+                    "rejected": rejected.to_dict()
+                }
             # Provide a valid response even in case of error
             return {
                 "message": "Query executed with fallback",
                 "query": "SELECT * FROM tasks",
                 "response": "No results found",
                 "results": [],
-                "count": 0
-            }
\ No newline at end of file
+                "count": 0,
+                "next_cursor": None
+            }
+
+    @staticmethod
+    async def stream_query_tasks(question: str, batch_size: int = STREAM_BATCH_SIZE,
+                                 compact: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Query tasks using natural language and stream the results (rows formatted
+        as in `query_tasks`, with "columns" on each "rows" event when `compact`).
+        The SQL is generated before returning, so failures to build it raise here;
+        the returned iterator yields a "query" event, one "rows" event per batch
+        and a closing "done" event (or "error" if the query fails or is rejected
+        by the QueryGuard, with the rejection under "rejected").
+        """
+        sql_query, response_template, template_vars = await QueryBuilder.build_query(question)
+        if isinstance(template_vars, dict) and "count" not in template_vars:
+            template_vars["count"] = "len(results)"
+        return TaskService._stream_events(sql_query, response_template, template_vars, batch_size, compact)
+
+    @staticmethod
+    async def _stream_generated(sql_query: str, shape: SqlShape,
+                                batch_size: int) -> AsyncIterator[Tuple[List[str], List[tuple]]]:
+        """
+        `stream_query` (with column names) for generated SQL, falling back to
+        inline literals like `_execute_generated`.
+        """
+        try:
+            async for batch in stream_query(shape.sql, shape.params, batch_size=batch_size,
+                                            guard=QueryGuard.prepare, with_columns=True):
+                yield batch
+            return
+        except Exception as e:
+            # Parameter types are resolved while the guard plans the query, before any rows
+            if shape.params is None or not isinstance(e.__cause__, _UNTYPED_PARAMETER_ERRORS):
+                raise
+        SQLShapes.keep_inline(shape.fingerprint)
+        shape = SQLShapes.inline(sql_query, shape.fingerprint)
+        async for batch in stream_query(shape.sql, batch_size=batch_size, guard=QueryGuard.prepare, with_columns=True):
+            yield batch
+
+    @staticmethod
+    async def _stream_events(sql_query: str, response_template: str, template_vars: Dict,
+                             batch_size: int, compact: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        # Server-side cursors cannot use prepared statements, but the literals
+        # are still bound, so the plan cache sees one statement per shape
+        shape = SQLShapes.normalize(sql_query)
+        yield {"event": "query", "query": sql_query, "shape": shape.fingerprint}
+        count = 0
+        try:
+            async for columns, rows in TaskService._stream_generated(sql_query, shape, batch_size):
+                count += len(rows)
+                with Metrics.span("formatting"):
+                    if compact:
+                        event = {"event": "rows", **ResponseFormatter.compact_results(rows, columns)}
+                    else:
+                        event = {"event": "rows", "results": ResponseFormatter.format_task_results(rows, columns)}
+                yield event
+        except Exception as e:
+            event = {"event": "error", "detail": str(e), "count": count}
+            rejected = QueryGuard.rejection(e)
+            if rejected:
+                event.update(detail=str(rejected), rejected=rejected.to_dict())
+            yield event
+            return
+        yield {"event": "done", **ResponseFormatter.format_summary(response_template, template_vars, count, sql_query)}
@@ -0,0 +1,66 @@
+"""
+bench_concurrency.py
+
+Shows that /tasks/query keeps many questions in flight on one worker:
+with a fake LLM that takes LLM_LATENCY seconds per call, throughput should
+grow roughly linearly with the number of concurrent requests instead of
+staying at 1 / LLM_LATENCY requests per second.
+
+Requires the PG_* environment variables to point at a database with a
+populated `tasks` table. Run from the repository root:
+
+    python -m benchmarks.bench_concurrency
+"""
+
+import asyncio
+import time
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.main import app
+from app.database import Database
+from app.services import query_builder
+from app.services.query_builder import QueryBuilder
+from app.services.llm.fakes import FakeSQLChatModel
+
+LLM_LATENCY = 0.25
+TOTAL_REQUESTS = 200
+CONCURRENCY_LEVELS = [1, 10, 50, 200]
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, label: str) -> float:
+    """Send distinct questions with `concurrency` in flight; return requests/sec."""
+    requests = min(TOTAL_REQUESTS, concurrency * 10)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            response = await client.post("/tasks/query", json={"question": f"List tasks ({label} {i})"})
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+async def main():
+    query_builder.get_llm = lambda: FakeSQLChatModel(latency=LLM_LATENCY)
+    # Every question is distinct; skip the (networked) semantic SQL cache tier
+    QueryBuilder.sql_cache.similarity_threshold = 2.0
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await run_level(client, 1, "warm-up")  # warm up pool and schema reflection
+        print(f"Fake LLM latency: {LLM_LATENCY}s (serial ceiling {1 / LLM_LATENCY:.1f} req/s)")
+        for concurrency in CONCURRENCY_LEVELS:
+            throughput = await run_level(client, concurrency, f"level {concurrency}")
+            print(f"in flight={concurrency:4d}  throughput={throughput:8.1f} req/s  "
+                  f"speedup={throughput * LLM_LATENCY:6.1f}x")
+    await Database.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+"""
+bench_hybrid.py
+
+Hybrid (full-text + vector) retrieval over tasks / task_embeddings:
+
+- sequential: embed the question, then run the keyword search and the
+  vector search as two statements and fuse them in Python
+- fused: embed the question, then both legs and the rank fusion in one
+  statement (hybrid_sql)
+- overlapped: the keyword leg runs while the question is being embedded,
+  and its ranked ids go to the fused statement (hybrid_sql(...,
+  keyword_ids=True)), as find_hybrid_records does
+
+Checks all three give the same top-k, then times them with the embeddings
+request taking no time and EMBEDDING_LATENCY. Query vectors are random and
+the request is a sleep, so no embeddings API is needed. Requires the PG_*
+environment variables and populated tasks / task_embeddings tables; build
+the full-text index first with
+``python manage_vector_indexes.py create --method gin``. Run from the
+repository root:
+
+    python -m benchmarks.bench_hybrid
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+load_dotenv()
+
+from app.services.database.connection import create_vector_engine
+from app.services.database.hybrid import (
+    HYBRID_CANDIDATES, HYBRID_RRF_K, hybrid_params, hybrid_sql, keyword_sql,
+)
+
+DIMENSIONS = 1536
+ROUNDS = 50
+TOP_K = 5
+EMBEDDING_LATENCY = 0.02
+QUESTIONS = ["memory leak", "unit testing parser", "documentation API", "login page", "deploy"]
+COLUMNS = ["title", "description"]
+
+KEYWORD_QUERY = text(keyword_sql("tasks"))
+
+VECTOR_QUERY = text("""
+    SELECT task_id
+    FROM task_embeddings
+    WHERE embedding IS NOT NULL
+    ORDER BY embedding <=> :embedding, task_id
+    LIMIT :leg_limit
+""")
+
+FUSED_QUERY = text(hybrid_sql("tasks", COLUMNS, "task_embeddings", vector_id="task_id"))
+BOUND_QUERY = text(hybrid_sql("tasks", COLUMNS, "task_embeddings", vector_id="task_id", keyword_ids=True))
+
+
+def embed(embedding, latency):
+    time.sleep(latency)  # the embeddings request
+    return embedding
+
+
+def sequential(connection, question, embedding, latency):
+    embedding = embed(embedding, latency)
+    keyword = connection.execute(KEYWORD_QUERY, {"question": question, "leg_limit": HYBRID_CANDIDATES})
+    semantic = connection.execute(VECTOR_QUERY, {"embedding": embedding, "leg_limit": HYBRID_CANDIDATES})
+    scores = {}
+    for rows in (semantic.scalars().all(), [row.id for row in keyword]):
+        for rank, row_id in enumerate(rows, start=1):
+            scores[row_id] = scores.get(row_id, 0.0) + 1.0 / (HYBRID_RRF_K + rank)
+    return [row_id for row_id, _ in sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:TOP_K]]
+
+
+def fused(connection, question, embedding, latency):
+    embedding = embed(embedding, latency)
+    params = hybrid_params(question, embedding, TOP_K, 1.0, 1.0, HYBRID_CANDIDATES, HYBRID_CANDIDATES)
+    return [row.id for row in connection.execute(FUSED_QUERY, params)]
+
+
+def overlapped(connection, question, embedding, latency):
+    with ThreadPoolExecutor(max_workers=1) as embedder:
+        pending = embedder.submit(embed, embedding, latency)
+        keyword_ids = [row.id for row in connection.execute(
+            KEYWORD_QUERY, {"question": question, "leg_limit": HYBRID_CANDIDATES}
+        )]
+        embedding = pending.result()
+    params = hybrid_params(question, embedding, TOP_K, 1.0, 1.0, HYBRID_CANDIDATES, HYBRID_CANDIDATES, keyword_ids)
+    return [row.id for row in connection.execute(BOUND_QUERY, params)]
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    calls = ROUNDS * len(QUESTIONS)
+    print(f"  {label:<42} {seconds * 1000:9.1f} ms  ({seconds / calls * 1000:7.2f} ms/question)")
+    return result
+
+
+def main():
+    rng = np.random.default_rng(0)
+    embeddings = list(rng.standard_normal((len(QUESTIONS), DIMENSIONS)).astype(np.float32))
+    engine = create_vector_engine()
+    pairs = list(zip(QUESTIONS, embeddings))
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT set_config('hnsw.ef_search', :value, false)"),
+                           {"value": str(HYBRID_CANDIDATES)})
+        # Warm up, so every statement is past psycopg's prepare threshold
+        for search in (sequential, fused, overlapped):
+            for question, embedding in pairs * 2:
+                search(connection, question, embedding, 0)
+
+        print(f"{len(QUESTIONS)} questions x {ROUNDS} rounds, top {TOP_K}, {HYBRID_CANDIDATES} candidates per leg")
+        for latency in (0, EMBEDDING_LATENCY):
+            print(f"Embeddings request: {latency * 1000:.0f} ms")
+            results = {
+                label: timed(label, lambda: [
+                    search(connection, question, embedding, latency)
+                    for _ in range(ROUNDS) for question, embedding in pairs
+                ])
+                for label, search in (("sequential (2 statements)", sequential),
+                                      ("fused (1 statement)", fused),
+                                      ("overlapped (keyword leg during embedding)", overlapped))
+            }
+            expected = results.pop("sequential (2 statements)")
+            for label, got in results.items():
+                same = sum(a == b for a, b in zip(expected, got))
+                print(f"  Identical top-{TOP_K} ({label.split()[0]}): {same}/{len(got)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+bench_quantization.py
+
+Storage and recall of quantized vector search on task_embeddings:
+
+- bytes per row of the float32 vector, its halfvec copy and its binary
+  quantization (pg_column_size)
+- size of each vector index on the table (pg_relation_size)
+- recall@k of each quantization, candidates re-ranked at full precision,
+  against an exact float32 scan, using stored embeddings as queries
+
+Quantized searches use an index only if one has been built with
+``manage_vector_indexes.py create --quantization ...``; without one they
+scan, which still measures recall. On pgvector < 0.7, which has neither
+halfvec nor binary_quantize, the quantized searches are emulated in NumPy
+over the stored vectors (``emulated_search``) and the quantized sizes are
+computed from pgvector's storage format. Needs the PG_* environment
+variables and a populated task_embeddings table. Run from the repository
+root:
+
+    python -m benchmarks.bench_quantization
+"""
+
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+load_dotenv()
+
+from app.services.database.connection import create_vector_engine
+from app.services.database.vector import (
+    QUANTIZATIONS, nearest_sql, rerank_candidates, set_search_params, to_numpy,
+)
+
+QUESTIONS = 100
+TOP_K = 10
+DIMENSIONS = 1536
+
+# Bytes pgvector stores per value: an 8-byte header, then 4 bytes per
+# dimension (vector), 2 bytes (halfvec) or 1 bit (bit)
+STORED_BYTES = {
+    "vector": 8 + 4 * DIMENSIONS,
+    "halfvec": 8 + 2 * DIMENSIONS,
+    "binary": 8 + DIMENSIONS // 8,
+}
+
+COLUMN_SIZES = """
+    SELECT avg(pg_column_size(embedding)) AS vector,
+           avg(pg_column_size(embedding::halfvec(1536))) AS halfvec,
+           avg(pg_column_size(binary_quantize(embedding)::bit(1536))) AS binary
+    FROM task_embeddings
+    WHERE embedding IS NOT NULL
+"""
+
+INDEX_SIZES = """
+    SELECT c.relname AS name, pg_size_pretty(pg_relation_size(c.oid)) AS size
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indexrelid
+    WHERE i.indrelid = 'task_embeddings'::regclass
+    ORDER BY c.relname
+"""
+
+
+def search(connection, query, quantization):
+    candidates = rerank_candidates(TOP_K, quantization)
+    set_search_params(connection, candidates)
+    sql = nearest_sql("task_embeddings", ["task_id"], ":embedding", ":top_k", quantization=quantization)
+    rows = connection.execute(text(sql), {"embedding": query, "top_k": TOP_K, "candidates": candidates})
+    return [row.task_id for row in rows]
+
+
+def cosine_distances(vectors, query):
+    return 1 - (vectors @ query) / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+
+
+def quantized_distances(vectors, query, quantization):
+    """NumPy counterpart of ``quantized_distance`` for every row of ``vectors``."""
+    if quantization == "halfvec":
+        return cosine_distances(vectors.astype(np.float16).astype(np.float32),
+                                query.astype(np.float16).astype(np.float32))
+    if quantization == "binary":
+        # binary_quantize keeps one bit per dimension: value > 0
+        return np.count_nonzero((vectors > 0) != (query > 0), axis=1)
+    return cosine_distances(vectors, query)
+
+
+def emulated_search(vectors, query, quantization, top_k=TOP_K):
+    """
+    Row positions ``nearest_sql`` returns for ``query``, computed in NumPy:
+    the ``rerank_candidates`` nearest by quantized distance, re-ranked by
+    exact cosine distance.
+    """
+    distances = quantized_distances(vectors, query, quantization)
+    candidates = np.argsort(distances, kind="stable")[:rerank_candidates(top_k, quantization)]
+    return candidates[np.argsort(cosine_distances(vectors[candidates], query), kind="stable")[:top_k]]
+
+
+def recall(results, exact):
+    found = sum(len(set(got) & set(expected)) for got, expected in zip(results, exact))
+    return found / sum(len(expected) for expected in exact)
+
+
+def main():
+    engine = create_vector_engine()
+    with engine.connect() as connection:
+        version = connection.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")).scalar()
+        native = tuple(int(part) for part in (version or "0.0").split(".")[:2]) >= (0, 7)
+        if not native:
+            print(f"⚠️ pgvector {version} has no halfvec or binary_quantize: "
+                  f"quantized sizes are computed and quantized searches emulated in NumPy")
+
+        print("Bytes per row")
+        if native:
+            sizes = connection.execute(text(COLUMN_SIZES)).one()._asdict()
+        else:
+            sizes = dict(STORED_BYTES, vector=connection.execute(text(
+                "SELECT avg(pg_column_size(embedding)) FROM task_embeddings WHERE embedding IS NOT NULL"
+            )).scalar())
+        for column in STORED_BYTES:
+            print(f"  {column:<10} {float(sizes[column]):8.0f}")
+
+        print("Indexes")
+        for row in connection.execute(text(INDEX_SIZES)):
+            print(f"  {row.name:<50} {row.size}")
+
+        queries = connection.execute(text(
+            "SELECT embedding FROM task_embeddings WHERE embedding IS NOT NULL ORDER BY task_id LIMIT :n"
+        ), {"n": QUESTIONS}).scalars().all()
+
+        # Exact reference: sequential scan over the float32 vectors
+        connection.rollback()
+        with connection.begin():
+            connection.execute(text("SET LOCAL enable_indexscan = off"))
+            exact = [search(connection, query, "none") for query in queries]
+
+        if not native:
+            rows = connection.execute(text(
+                "SELECT task_id, embedding FROM task_embeddings WHERE embedding IS NOT NULL"
+            )).all()
+            task_ids = np.array([row.task_id for row in rows])
+            vectors = np.stack([to_numpy(row.embedding) for row in rows])
+
+    print(f"Recall@{TOP_K} over {len(queries)} queries (re-ranked at full precision)")
+    for quantization in QUANTIZATIONS:
+        start = time.perf_counter()
+        if native:
+            with engine.connect() as connection, connection.begin():
+                results = [search(connection, query, quantization) for query in queries]
+        else:
+            results = [task_ids[emulated_search(vectors, to_numpy(query), quantization)] for query in queries]
+        seconds = time.perf_counter() - start
+        print(f"  {quantization:<10} recall {recall(results, exact):6.3f}   "
+              f"{seconds / len(queries) * 1000:7.2f} ms/query{'' if native else ' (NumPy)'}   "
+              f"candidates {rerank_candidates(TOP_K, quantization)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+bench_query_builder.py
+
+Measures the per-question overhead of QueryBuilder.build_query outside the
+LLM call: the old path built a new engine, reflected the schema, sampled
+rows and assembled the chain on every question; the cached path reuses
+one chain. A zero-latency fake LLM isolates the overhead.
+
+Requires the PG_* environment variables. Run from the repository root:
+
+    python -m benchmarks.bench_query_builder
+"""
+
+import asyncio
+import time
+
+from dotenv import load_dotenv
+from langchain.chains import create_sql_query_chain
+from langchain.sql_database import SQLDatabase
+from sqlalchemy import create_engine
+
+load_dotenv()
+
+from app.services import query_builder
+from app.services.query_builder import QueryBuilder
+from app.services.database.connection import get_db_engine
+from app.services.llm.fakes import FakeSQLChatModel
+
+ITERATIONS = 20
+
+
+async def uncached_build_query(question: str, llm) -> str:
+    """The pre-caching QueryBuilder.build_query path."""
+    engine = create_engine(get_db_engine().url)
+    db = SQLDatabase(engine)
+    chain = create_sql_query_chain(llm, db)
+    sql_query = await chain.ainvoke({"question": question})
+    engine.dispose()
+    return sql_query
+
+
+async def measure(label: str, build, iterations: int = ITERATIONS) -> float:
+    await build("warm up")
+    start = time.perf_counter()
+    for i in range(iterations):
+        await build(f"How many documentation tasks are there? ({i})")
+    per_request_ms = (time.perf_counter() - start) / iterations * 1000
+    print(f"{label:<10} {per_request_ms:8.2f} ms/question")
+    return per_request_ms
+
+
+async def main():
+    llm = FakeSQLChatModel()
+    query_builder.get_llm = lambda: llm
+    # Every question is distinct; skip the (networked) semantic SQL cache tier
+    QueryBuilder.sql_cache.similarity_threshold = 2.0
+
+    before = await measure("uncached", lambda q: uncached_build_query(q, llm))
+    after = await measure("cached", QueryBuilder.build_query)
+    print(f"Overhead reduced {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""
+bench_serialization.py
+
+Turning 100k result rows into a /tasks/query response body:
+
+- before: rows mapped to dicts by position, then FastAPI's default path for
+  a returned dict (jsonable_encoder, then json.dumps in JSONResponse)
+- objects: dicts keyed by the cursor's column names, rendered with orjson
+  (FastJSONResponse returned directly, so jsonable_encoder is skipped)
+- compact: column names once plus the row tuples as arrays, with orjson
+
+Rows are generated in-process, so no database is needed. Run from the
+repository root:
+
+    python -m benchmarks.bench_serialization
+"""
+
+import json
+import time
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.routes.responses import FastJSONResponse
+from app.services.response_formatter import ResponseFormatter
+
+ROWS = 100_000
+ROUNDS = 3
+COLUMNS = ["id", "title", "description", "priority", "category", "created_at"]
+
+
+def make_rows():
+    start = datetime(2024, 1, 1)
+    return [
+        (i, f"Task {i}", f"Description of task {i}, with some detail about what needs doing",
+         ("low", "medium", "high")[i % 3], ("bug", "feature", "documentation")[i % 3],
+         start + timedelta(minutes=i))
+        for i in range(ROWS)
+    ]
+
+
+def before(rows):
+    results = [
+        {"id": row[0], "title": row[1], "description": row[2], "priority": row[3], "category": row[4]}
+        for row in rows
+    ]
+    content = {"message": "Query executed successfully", "results": results, "count": len(results)}
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def objects(rows):
+    results = ResponseFormatter.format_task_results(rows, COLUMNS)
+    return FastJSONResponse({"message": "Query executed successfully", "results": results, "count": len(results)}).body
+
+
+def compact(rows):
+    content = ResponseFormatter.compact_results(rows, COLUMNS)
+    return FastJSONResponse({"message": "Query executed successfully", **content, "count": len(rows)}).body
+
+
+def timed(label, func, rows, baseline=None):
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        body = func(rows)
+        best = min(best, time.perf_counter() - start)
+    speedup = f"  {baseline / best:5.1f}x" if baseline else ""
+    print(f"  {label:<40} {best * 1000:8.1f} ms  {len(body) / 1e6:6.1f} MB{speedup}")
+    return best, body
+
+
+def main():
+    rows = make_rows()
+    print(f"{ROWS} rows, best of {ROUNDS}")
+    baseline, _ = timed("before (positional + jsonable_encoder)", before, rows)
+    _, body = timed("objects (column names + orjson)", objects, rows, baseline)
+    timed("compact (arrays + orjson)", compact, rows, baseline)
+
+    # Same values as the standard library would produce, created_at included
+    decoded = json.loads(body)["results"]
+    expected = [
+        {**dict(zip(COLUMNS, row)), "created_at": row[5].isoformat()} for row in rows
+    ]
+    print(f"objects output matches the stdlib encoding: {decoded == expected}")
+
+
+if __name__ == "__main__":
+    main()
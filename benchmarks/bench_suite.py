@@ -0,0 +1,357 @@
+"""
+bench_suite.py
+
+End-to-end benchmark of the main code paths at several data sizes, with no
+network access: SQL generation and embeddings go to the deterministic fakes
+in app/services/llm/fakes.py (vectors derived from a hash of the text, optional
+fixed latency per call), everything else runs for real against PostgreSQL
+with pgvector.
+
+For each size N the suite recreates its own schema (--schema, default
+prime_bench; the public tables are never touched) with N tasks and a
+generated PDF of N / 20 pages (every table is created up front: the
+scripts' create_all would see the public tables on the search path and
+write there), then measures:
+
+- add_task: TaskService.add_task, one task per call
+- populate_task_embeddings: a full rebuild of task_embeddings (HNSW index
+  maintained, unless --index none)
+- find_similar_records: semantic search over task_embeddings
+- tasks_query / tasks_query_cached: POST /tasks/query in-process, for new
+  questions (fake LLM called) and for the same questions again (SQL cache)
+- ingest_pdf: extraction, embedding and COPY of the generated PDF
+- find_similar_documents: vector search over pdf_documents
+
+Latencies are reported per call (mean, p50, p95 in ms), bulk steps as rows
+per second. Results are written as JSON (default
+benchmarks/results/<commit>.json); pass --compare with an earlier file to
+see the change per metric. Requires the PG_* environment variables. Run
+from the repository root:
+
+    python -m benchmarks.bench_suite --sizes 100 1000 5000
+    python -m benchmarks.bench_suite --compare benchmarks/results/<older commit>.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+import psycopg
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.database import Database, copy_insert
+from app.schemas.task import TaskCreate
+from app.services.database.connection import get_database_url
+from app.services.query_builder import QueryBuilder
+from app.services.task_service import TaskService
+from app.services.llm.fakes import fake_embedding, install_fakes
+
+PDF_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pdf-semantic-search")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+ADD_TASK_CALLS = 100
+QUERIES = 20
+PAGES_PER_TASKS = 20  # one PDF page per this many tasks
+TOP_K = 5
+FAKE_SQL = "SELECT id, title, description, priority, category FROM tasks WHERE category = 'bug' ORDER BY created_at DESC"
+
+WORDS = (
+    "fix update login page database index query cache memory leak parser api docs deploy test "
+    "user report timeout error export import schema search vector embedding review refactor "
+    "release build config backup monitor alert dashboard latency session token upload invoice"
+).split()
+PRIORITIES = ("low", "medium", "high")
+CATEGORIES = ("bug", "feature", "documentation")
+
+SCHEMA_SQL = """
+    DROP SCHEMA IF EXISTS {schema} CASCADE;
+    CREATE SCHEMA {schema};
+    CREATE TABLE {schema}.tasks (
+        id SERIAL PRIMARY KEY,
+        title TEXT,
+        description TEXT,
+        priority VARCHAR NOT NULL,
+        category TEXT,
+        created_at TIMESTAMP DEFAULT now()
+    );
+    CREATE TABLE {schema}.task_embeddings (
+        task_id INTEGER PRIMARY KEY REFERENCES {schema}.tasks(id) ON DELETE CASCADE,
+        title TEXT,
+        description TEXT,
+        priority VARCHAR,
+        category TEXT,
+        created_at TIMESTAMP,
+        embedding vector(1536),
+        content_hash TEXT
+    );
+    CREATE TABLE {schema}.pdf_documents (
+        id SERIAL PRIMARY KEY,
+        filename VARCHAR,
+        page_number INTEGER,
+        page_end INTEGER,
+        content VARCHAR,
+        embedding vector(1536)
+    );
+"""
+HNSW_SQL = "CREATE INDEX ON {schema}.task_embeddings USING hnsw (embedding vector_cosine_ops)"
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True)
+        return commit.stdout.strip(), bool(dirty.stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def make_tasks(count, rng):
+    return [
+        TaskCreate(title=sentence(rng, 4).capitalize(), description=sentence(rng, 25),
+                   priority=rng.choice(PRIORITIES), category=rng.choice(CATEGORIES))
+        for _ in range(count)
+    ]
+
+
+def write_pdf(path, pages, rng, lines_per_page=40):
+    """A plain text-only PDF (Helvetica, one content stream per page)."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for _ in range(pages):
+        lines = " ".join(f"({sentence(rng, 12)}) '" for _ in range(lines_per_page))
+        stream = f"BT /F1 10 Tf 14 TL 50 780 Td {lines} ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects)
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), pages)
+
+    body, offsets = bytearray(b"%PDF-1.4\n"), []
+    for number, content in enumerate(objects, start=1):
+        offsets.append(len(body))
+        body += b"%d 0 obj\n%s\nendobj\n" % (number, content)
+    xref = len(body)
+    body += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    body += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    body += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as pdf:
+        pdf.write(body)
+
+
+def latency(samples):
+    """Per-call statistics of a list of durations in seconds."""
+    ordered = sorted(samples)
+    return {
+        "calls": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+    }
+
+
+def throughput(rows, seconds):
+    return {"rows": rows, "seconds": seconds, "rows_per_s": rows / seconds if seconds else 0.0}
+
+
+def quietly(func, *args, **kwargs):
+    """Run a script function with its progress output captured; returns (result, output)."""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result = func(*args, **kwargs)
+    return result, output.getvalue()
+
+
+def reset_schema(schema, index):
+    with psycopg.connect(get_database_url(), autocommit=True) as connection:
+        connection.execute(SCHEMA_SQL.format(schema=schema))
+        if index == "hnsw":
+            connection.execute(HNSW_SQL.format(schema=schema))
+
+
+def count_rows(schema, table):
+    with psycopg.connect(get_database_url()) as connection:
+        return connection.execute(f"SELECT count(*) FROM {schema}.{table}").fetchone()[0]
+
+
+async def bench_size(size, args, modules, client, fakes):
+    search, populate, ingestion, pdf_query = modules
+    llm, embeddings, _ = fakes
+    rng = random.Random(size)
+    questions = [f"{sentence(rng, 5)} ({size}, {i})" for i in range(QUERIES)]
+    results = {}
+
+    def report(name, result):
+        results[name] = result
+        if "p50_ms" in result:
+            print(f"  {name:<26} {result['mean_ms']:9.2f} ms mean {result['p50_ms']:9.2f} p50 {result['p95_ms']:9.2f} p95")
+        else:
+            print(f"  {name:<26} {result['rows_per_s']:9.1f} rows/s ({result['rows']} rows in {result['seconds']:.2f}s)")
+
+    reset_schema(args.schema, args.index)
+    # Connections opened before the reset would keep plans for the old tables
+    await Database.close()
+    for module in (search, populate, ingestion, pdf_query):
+        module.engine.dispose()
+    QueryBuilder.sql_cache.clear()
+
+    tasks = make_tasks(size, rng)
+    add_calls = min(ADD_TASK_CALLS, size)
+    samples = []
+    for task in tasks[:add_calls]:
+        start = time.perf_counter()
+        await TaskService.add_task(task)
+        samples.append(time.perf_counter() - start)
+    report("add_task", latency(samples))
+    await copy_insert("tasks", TaskService.BULK_COLUMNS,
+                      [[getattr(task, column) for column in TaskService.BULK_COLUMNS] for task in tasks[add_calls:]])
+
+    requests = embeddings.embeddings.requests
+    start = time.perf_counter()
+    _, output = quietly(populate.populate_task_embeddings, full=True)
+    seconds = time.perf_counter() - start
+    embedded = count_rows(args.schema, "task_embeddings")
+    if embedded != size:
+        raise RuntimeError(f"populate_task_embeddings embedded {embedded} of {size} tasks:\n{output}")
+    report("populate_task_embeddings",
+           {**throughput(size, seconds), "embedding_requests": embeddings.embeddings.requests - requests})
+
+    samples = []
+    for question in questions:
+        start = time.perf_counter()
+        records = search.find_similar_records(question, top_k=TOP_K)
+        samples.append(time.perf_counter() - start)
+        if isinstance(records, str):
+            raise RuntimeError(records)
+    report("find_similar_records", latency(samples))
+
+    for name in ("tasks_query", "tasks_query_cached"):
+        calls, samples = llm.calls, []
+        for question in questions:
+            start = time.perf_counter()
+            response = await client.post("/tasks/query", json={"question": question})
+            samples.append(time.perf_counter() - start)
+            response.raise_for_status()
+        report(name, {**latency(samples), "llm_calls": llm.calls - calls})
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f"bench_{size}.pdf")
+        write_pdf(path, max(1, size // PAGES_PER_TASKS), rng)
+        stats, output = quietly(ingestion.ingest_pdf, path, workers=args.workers)
+    stored = count_rows(args.schema, "pdf_documents")
+    if not stats["inserted"] or stored != stats["inserted"]:
+        raise RuntimeError(f"ingest_pdf inserted {stats['inserted']} chunks, {stored} in {args.schema}:\n{output}")
+    report("ingest_pdf", {**throughput(stats["inserted"], stats["seconds"]), "pages": stats["pages"]})
+
+    samples = []
+    for question in questions:
+        query_embedding = fake_embedding(question)
+        start = time.perf_counter()
+        # Fake vectors are unrelated, so accept any similarity and always rank TOP_K rows
+        pdf_query.find_similar_documents(query_embedding, limit=TOP_K, similarity_threshold=-1.0)
+        samples.append(time.perf_counter() - start)
+    report("find_similar_documents", latency(samples))
+    return results
+
+
+def compare(baseline, current):
+    """Print the headline number of every metric in both runs and the change."""
+    print(f"\nChange from {baseline['commit']} to {current['commit']} (negative is faster / lower)")
+    for size, metrics in current["results"].items():
+        for name, result in metrics.items():
+            old = baseline["results"].get(size, {}).get(name)
+            if old is None:
+                continue
+            key = "p50_ms" if "p50_ms" in result else "rows_per_s"
+            change = (result[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            if key == "rows_per_s":
+                change = -change
+            print(f"  {size:>7} {name:<26} {old[key]:10.2f} -> {result[key]:10.2f} {key:<10} {change:+6.1f}%")
+
+
+async def run(args):
+    fakes = install_fakes(args.chat_latency, args.embedding_latency, FAKE_SQL)
+
+    sys.path.append(PDF_DIR)
+    import pdf_ingestion
+    import pdf_query
+    import populate_task_embeddings
+    import semantic_search_pgvector
+    from app.main import app
+    modules = (semantic_search_pgvector, populate_task_embeddings, pdf_ingestion, pdf_query)
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for size in args.sizes:
+            print(f"\n{size} tasks")
+            results[str(size)] = await bench_size(size, args, modules, client, fakes)
+    await Database.close()
+    if not args.keep:
+        with psycopg.connect(get_database_url(), autocommit=True) as connection:
+            connection.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite with fake LLM and embedding providers")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000], help="numbers of tasks")
+    parser.add_argument("--chat-latency", type=float, default=0.0, help="seconds per fake SQL generation")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="seconds per fake embeddings request")
+    parser.add_argument("--index", choices=["hnsw", "none"], default="hnsw", help="vector index on task_embeddings")
+    parser.add_argument("--workers", type=int, default=2, help="PDF extraction processes")
+    parser.add_argument("--schema", default="prime_bench", help="schema holding the benchmark tables")
+    parser.add_argument("--keep", action="store_true", help="keep the schema and its data afterwards")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare with")
+    args = parser.parse_args()
+
+    # Every connection, including the scripts' engines and the API pool, finds
+    # the benchmark tables first (libpq reads PGOPTIONS when connecting)
+    os.environ["PGOPTIONS"] = f"{os.getenv('PGOPTIONS', '')} -c search_path={args.schema},public".strip()
+
+    commit, dirty = git_commit()
+    results = asyncio.run(run(args))
+    document = {
+        "commit": commit + ("-dirty" if dirty else ""),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {
+            "sizes": args.sizes, "chat_latency": args.chat_latency, "embedding_latency": args.embedding_latency,
+            "index": args.index, "workers": args.workers, "queries": QUERIES, "top_k": TOP_K,
+        },
+        "results": results,
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{document['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as results_file:
+        json.dump(document, results_file, indent=2)
+    print(f"\n✅ Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            compare(json.load(baseline_file), document)
+
+
+if __name__ == "__main__":
+    main()
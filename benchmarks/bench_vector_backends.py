@@ -0,0 +1,115 @@
+"""
+bench_vector_backends.py
+
+Top-k cosine search over task_embeddings through pgvector and through the
+in-process memory-mapped index (MemmapVectorIndex), on the same random
+query vectors. Checks that the memmap results match an exact pgvector
+scan (index scans disabled) and times:
+
+- pgvector, one query per question
+- pgvector, all questions in one LATERAL query
+- memmap, all questions in one batched search
+- memmap refresh, full export and no-op incremental
+
+Requires the PG_* environment variables and a populated task_embeddings
+table. Run from the repository root:
+
+    python -m benchmarks.bench_vector_backends
+"""
+
+import tempfile
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+load_dotenv()
+
+from app.services.database.connection import create_vector_engine
+from app.services.database.memmap_index import MemmapVectorIndex
+
+DIMENSIONS = 1536
+QUESTIONS = 200
+TOP_K = 5
+
+SINGLE_QUERY = """
+    SELECT task_id, 1 - (embedding <=> :embedding) AS similarity
+    FROM task_embeddings
+    WHERE embedding IS NOT NULL
+    ORDER BY embedding <=> :embedding
+    LIMIT :top_k
+"""
+
+BATCH_QUERY = """
+    SELECT q.ord, n.task_id, 1 - n.distance AS similarity
+    FROM unnest(CAST(:embeddings AS vector[])) WITH ORDINALITY AS q(embedding, ord)
+    CROSS JOIN LATERAL (
+        SELECT t.task_id, t.embedding <=> q.embedding AS distance
+        FROM task_embeddings t
+        WHERE t.embedding IS NOT NULL
+        ORDER BY t.embedding <=> q.embedding
+        LIMIT :top_k
+    ) n
+    ORDER BY q.ord, n.distance
+"""
+
+
+def timed(label: str, func, per_question: bool = True):
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    detail = f"  ({seconds / QUESTIONS * 1e6:8.1f} us/question)" if per_question else ""
+    print(f"  {label:<40} {seconds * 1000:9.1f} ms{detail}")
+    return result
+
+
+def main():
+    rng = np.random.default_rng(0)
+    queries = list(rng.standard_normal((QUESTIONS, DIMENSIONS)).astype(np.float32))
+    engine = create_vector_engine()
+
+    with engine.connect() as connection, tempfile.TemporaryDirectory() as directory:
+        # Exact scan as the reference: ANN indexes may return approximate results
+        connection.execute(text("SET enable_indexscan = off"))
+        rows = connection.execute(text("SELECT COUNT(*) FROM task_embeddings WHERE embedding IS NOT NULL")).scalar()
+        print(f"task_embeddings: {rows} rows, {QUESTIONS} questions, top {TOP_K}")
+
+        index = MemmapVectorIndex("task_embeddings", id_column="task_id", directory=directory)
+        print("Refresh")
+        timed("full export", lambda: index.refresh(connection), per_question=False)
+        timed("incremental (no changes)", lambda: index.refresh(connection), per_question=False)
+
+        print("Search")
+        single = timed("pgvector, one query per question", lambda: [
+            connection.execute(text(SINGLE_QUERY), {"embedding": query, "top_k": TOP_K}).fetchall()
+            for query in queries
+        ])
+        batch = timed("pgvector, one LATERAL query", lambda: connection.execute(
+            text(BATCH_QUERY), {"embeddings": queries, "top_k": TOP_K}
+        ).fetchall())
+        memmap = timed("memmap, one batched search", lambda: index.search(queries, TOP_K))
+
+    batched = [[] for _ in queries]
+    for row in batch:
+        batched[row.ord - 1].append((row.task_id, row.similarity))
+
+    same_ids = sum(
+        [row.task_id for row in expected] == [row_id for row_id, _ in got]
+        for expected, got in zip(single, memmap)
+    )
+    same_batch = sum(
+        [row.task_id for row in expected] == [row_id for row_id, _ in got]
+        for expected, got in zip(single, batched)
+    )
+    max_error = max(
+        abs(row.similarity - similarity)
+        for expected, got in zip(single, memmap)
+        for row, (_, similarity) in zip(expected, got)
+    )
+    print(f"Identical top-{TOP_K} ids: memmap {same_ids}/{QUESTIONS}, LATERAL {same_batch}/{QUESTIONS}; "
+          f"max similarity difference {max_error:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+bench_vector_serialization.py
+
+Cost of moving 1536-dimension embeddings between Python and pgvector:
+the old text path (formatting every float with an f-string, ~20KB per
+vector) against pgvector's binary format dumped straight from float32
+NumPy buffers. Measured per vector in-process, then per 10k-row batch
+written with COPY and read back through a cursor.
+
+Requires the PG_* environment variables and the pgvector extension.
+Run from the repository root:
+
+    python -m benchmarks.bench_vector_serialization
+"""
+
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+from pgvector import Vector
+
+load_dotenv()
+
+from app.services.database.connection import create_vector_engine
+from app.services.database.vector import fetch_binary, to_numpy
+
+DIMENSIONS = 1536
+PER_VECTOR_ITERATIONS = 2000
+BATCH_ROWS = 10_000
+
+
+def old_text_format(vector: np.ndarray) -> str:
+    return f"[{','.join(f'{float(val):.6f}' for val in vector)}]"
+
+
+def per_vector(label: str, func, vectors) -> float:
+    start = time.perf_counter()
+    for vector in vectors:
+        func(vector)
+    micros = (time.perf_counter() - start) / len(vectors) * 1e6
+    print(f"  {label:<28} {micros:9.1f} us/vector")
+    return micros
+
+
+def timed(label: str, func) -> float:
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    print(f"  {label:<28} {seconds * 1000:9.1f} ms/{BATCH_ROWS} rows")
+    return seconds
+
+
+def main():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((PER_VECTOR_ITERATIONS, DIMENSIONS)).astype(np.float32)
+
+    print("Encode (Python -> wire)")
+    per_vector("text (f-string, old)", old_text_format, vectors)
+    per_vector("binary (float32 buffer)", lambda v: Vector(v).to_binary(), vectors)
+
+    texts = [old_text_format(v).encode() for v in vectors[:200]]
+    binaries = [Vector(v).to_binary() for v in vectors[:200]]
+    print(f"Payload: text {np.mean([len(t) for t in texts]):.0f} B, binary {len(binaries[0])} B per vector")
+
+    print("Decode (wire -> NumPy)")
+    per_vector("text", lambda t: Vector.from_text(t.decode()).to_numpy(), texts)
+    per_vector("binary", lambda b: Vector.from_binary(b).to_numpy(), binaries)
+
+    batch = rng.standard_normal((BATCH_ROWS, DIMENSIONS)).astype(np.float32)
+    engine = create_vector_engine()
+    with engine.connect() as connection:
+        raw_connection = connection.connection.driver_connection
+        with raw_connection.cursor() as cursor:
+            cursor.execute(f"CREATE TEMP TABLE bench_vectors (id int, embedding vector({DIMENSIONS}))")
+
+            def copy_text():
+                with cursor.copy("COPY bench_vectors FROM STDIN") as copy:
+                    for i, vector in enumerate(batch):
+                        copy.write_row((i, old_text_format(vector)))
+
+            def copy_binary():
+                with cursor.copy("COPY bench_vectors FROM STDIN (FORMAT BINARY)") as copy:
+                    copy.set_types(["int4", "vector"])
+                    for i, vector in enumerate(batch):
+                        copy.write_row((i, vector))
+
+            print("Write batch (COPY)")
+            timed("text (f-string, old)", copy_text)
+            cursor.execute("TRUNCATE bench_vectors")
+            timed("binary", copy_binary)
+
+            def read_text():
+                cursor.execute("SELECT id, embedding::text FROM bench_vectors")
+                return [np.array(row[1][1:-1].split(","), dtype=np.float32) for row in cursor.fetchall()]
+
+            def read_binary():
+                return [to_numpy(row[1]) for row in fetch_binary(connection, "SELECT id, embedding FROM bench_vectors")]
+
+            print("Read batch")
+            timed("text", read_text)
+            timed("binary", read_binary)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,11 @@ from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
 from sqlalchemy import create_engine, text
 
+from app.services.llm.embeddings import create_embedding
+from app.services.metrics import Metrics
+from app.services.query_guard import QueryGuard
+from app.services.sql_cache import SQLQueryCache
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -28,6 +33,10 @@ db = SQLDatabase.from_uri(POSTGRES_URI)
 query_llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
 response_llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.2)
 
+# Cache generated SQL so repeated questions (and reworded ones, when
+# SQL_CACHE_SIMILARITY_THRESHOLD is set) skip the query LLM
+sql_cache = SQLQueryCache.from_env()
+
 # Define a custom prompt for SQL query generation
 query_template = '''Given an input question, create a syntactically correct PostgreSQL query to run.
 Return ONLY the SQL query without any additional text.
@@ -81,33 +90,58 @@ def extract_sql_query(llm_output):
     # If no match, return the entire cleaned output
     return clean_output
 
+# Look up previously generated SQL, exact match first, then by embedding similarity.
+# Returns the SQL (or None) and the question embedding for caching a miss.
+def lookup_cached_sql(question, scope):
+    clean_query = sql_cache.get(question, scope=scope)
+    if clean_query is not None or not sql_cache.semantic_enabled:
+        return clean_query, None
+
+    question_embedding = create_embedding(question)
+    if question_embedding is None:
+        return None, None
+
+    return sql_cache.get_similar(question_embedding, scope=scope), question_embedding
+
 # Create an SQLAlchemy engine
 engine = create_engine(POSTGRES_URI)
 
 def get_sql_query_result(question, table_info='tasks', top_k=5):
     try:
-        # Modify the query generation to use a different approach
-        # Use the database's sample tables to inform the query
-        table_sample = db.get_table_info(table_names=[table_info])
-        
-        # Generate the SQL query
-        generated_query = query_llm.invoke(
-            query_prompt.format(
-                input=question, 
-                table_info=table_sample, 
-                top_k=top_k
-            )
-        ).content
-        
-        # Extract clean SQL query
-        clean_query = extract_sql_query(generated_query)
-        
-        print(f"Generated SQL Query:\n{clean_query}\n")
+        # Generated SQL depends on the table and row limit as well as the question
+        cache_scope = (table_info, top_k)
+        clean_query, question_embedding = lookup_cached_sql(question, cache_scope)
+
+        if clean_query is None:
+            # Modify the query generation to use a different approach
+            # Use the database's sample tables to inform the query
+            with Metrics.span("schema_reflection"):
+                table_sample = db.get_table_info(table_names=[table_info])
+
+            # Generate the SQL query
+            with Metrics.span("sql_generation"):
+                generated_query = query_llm.invoke(
+                    query_prompt.format(
+                        input=question,
+                        table_info=table_sample,
+                        top_k=top_k
+                    )
+                ).content
+
+            # Extract clean SQL query
+            clean_query = extract_sql_query(generated_query)
+            sql_cache.put(question, clean_query, question_embedding, scope=cache_scope)
+
+            print(f"Generated SQL Query:\n{clean_query}\n")
+        else:
+            print(f"Cached SQL Query:\n{clean_query}\n")
         
-        # Execute the query
+        # Execute the query, checked by the cost guard (EXPLAIN) and under a statement timeout
         with engine.connect() as connection:
-            result = connection.execute(text(clean_query))
-            rows = result.fetchall()  # Fetch all rows
+            clean_query = QueryGuard.prepare_sync(connection, clean_query)
+            with Metrics.span("db_execution"):
+                result = connection.execute(text(clean_query))
+                rows = result.fetchall()  # Fetch all rows
 
         # Determine how to format the result based on the query
         if 'COUNT(' in clean_query or 'count(' in clean_query:
@@ -121,16 +155,20 @@ def get_sql_query_result(question, table_info='tasks', top_k=5):
             result_str = ", ".join(str(row[0]) for row in rows)
         
         # Generate a human-readable response using LLM
-        response = response_llm.invoke(
-            response_prompt.format(
-                input=question,
-                sql_result=result_str
-            )
-        ).content
+        with Metrics.span("llm_summarization"):
+            response = response_llm.invoke(
+                response_prompt.format(
+                    input=question,
+                    sql_result=result_str
+                )
+            ).content
 
         return response
     
     except Exception as e:
+        rejected = QueryGuard.rejection(e)
+        if rejected:
+            return f"Query rejected: {rejected}"
         return f"Error processing the query: {e}"
 
 # Example usage
@@ -144,4 +182,8 @@ questions = [
 for question in questions:
     print(f"\nQuestion: {question}")
     response = get_sql_query_result(question)
-    print("Response:", response)
\ No newline at end of file
+    print("Response:", response)
+
+print(f"\nSQL cache: {sql_cache.stats()}")
+print(f"Query guard: {QueryGuard.stats()}")
+Metrics.print_report()
\ No newline at end of file
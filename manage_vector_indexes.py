@@ -0,0 +1,191 @@
+"""
+manage_vector_indexes.py
+
+Create, rebuild, drop and inspect the approximate-nearest-neighbour indexes
+on the embedding columns of `task_embeddings` and `pdf_documents`.
+
+The indexes use `vector_cosine_ops`, matching the cosine distance operator
+(`<=>`) used by every similarity query in this project. Indexes are built
+CONCURRENTLY so searches keep working while they build.
+
+With --quantization (pgvector >= 0.7) the index is built over a float16
+(`halfvec`) or 1-bit (`binary_quantize`) copy of each vector instead,
+making it roughly 2x or 32x smaller. The table keeps the float32 vectors,
+which searches use to re-rank the quantized candidates
+(VECTOR_QUANTIZATION, see app/services/database/vector.py). Existing rows
+need no migration beyond building the index.
+
+Usage:
+    python manage_vector_indexes.py status
+    python manage_vector_indexes.py create --method hnsw
+    python manage_vector_indexes.py rebuild --table pdf_documents --method ivfflat
+    python manage_vector_indexes.py drop --method ivfflat
+
+Full-text (GIN) indexes for hybrid search (app/services/database/hybrid.py),
+on `tasks` and `pdf_documents`:
+    python manage_vector_indexes.py create --method gin
+
+Switching to binary quantization:
+    python manage_vector_indexes.py create --quantization binary
+    export VECTOR_QUANTIZATION=binary
+    python manage_vector_indexes.py drop            # the float32 HNSW index is no longer used
+"""
+
+import argparse
+import math
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from app.services.database.connection import create_vector_engine
+from app.services.database.hybrid import TEXT_SEARCH_COLUMNS, text_document
+from app.services.database.vector import QUANTIZATIONS
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Tables holding embeddings, and their vector column
+VECTOR_TABLES = {
+    "task_embeddings": "embedding",
+    "pdf_documents": "embedding",
+}
+METHODS = ("hnsw", "ivfflat", "gin")
+DIMENSIONS = 1536
+
+# Index builds run outside a transaction (required by CONCURRENTLY)
+engine = create_vector_engine(isolation_level="AUTOCOMMIT")
+
+# Function to list the tables a method indexes
+def method_tables(method):
+    return list(TEXT_SEARCH_COLUMNS) if method == "gin" else list(VECTOR_TABLES)
+
+# Function to name the index for a table, method and quantization
+def index_name(table, method, quantization="none"):
+    if method == "gin":
+        return f"{table}_search_gin_idx"
+    suffix = "" if quantization == "none" else f"_{quantization}"
+    return f"{table}_{VECTOR_TABLES[table]}_{method}{suffix}_idx"
+
+# Function to build the indexed expression and operator class.
+# Must match quantized_distance() in app/services/database/vector.py
+def index_key(column, quantization):
+    if quantization == "halfvec":
+        return f"({column}::halfvec({DIMENSIONS})) halfvec_cosine_ops"
+    if quantization == "binary":
+        return f"(binary_quantize({column})::bit({DIMENSIONS})) bit_hamming_ops"
+    return f"{column} vector_cosine_ops"
+
+# Function to check that the installed pgvector supports quantized indexes
+def require_quantization_support(connection):
+    version = connection.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")).scalar()
+    if version is None or tuple(int(part) for part in version.split(".")[:2]) < (0, 7):
+        raise SystemExit(
+            f"Quantized indexes need pgvector >= 0.7 (installed: {version}). "
+            "Upgrade the extension, then run ALTER EXTENSION vector UPDATE."
+        )
+
+# Function to pick the IVFFlat list count pgvector recommends for a row count
+def ivfflat_lists(rows):
+    if rows <= 1_000_000:
+        return max(1, rows // 1000)
+    return int(math.sqrt(rows))
+
+# Function to build the CREATE INDEX statement for a method
+def index_ddl(table, method, name, m, ef_construction, lists, quantization="none"):
+    if method == "gin":
+        # Same expression as the hybrid queries, so the planner can match it
+        return f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} USING gin ({text_document(table)})"
+    column = VECTOR_TABLES[table]
+    if method == "hnsw":
+        options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+    else:
+        options = f"lists = {int(lists)}"
+    return (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+        f"ON {table} USING {method} ({index_key(column, quantization)}) WITH ({options})"
+    )
+
+# Function to create an index (no-op if it already exists)
+def create_index(connection, table, method, m=16, ef_construction=64, lists=None, name=None,
+                 quantization="none"):
+    if quantization != "none" and method != "gin":
+        require_quantization_support(connection)
+    name = name or index_name(table, method, quantization)
+    if method == "ivfflat" and lists is None:
+        # IVFFlat clusters existing rows, so size it from the current table
+        rows = connection.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+        lists = ivfflat_lists(rows)
+    print(f"Creating {name} ...")
+    connection.execute(text(index_ddl(table, method, name, m, ef_construction, lists, quantization)))
+    connection.execute(text(f"ANALYZE {table}"))
+
+# Function to rebuild an index without blocking searches.
+# IVFFlat indexes are re-created so the list count tracks the table size;
+# HNSW indexes are re-created with the requested parameters.
+def rebuild_index(connection, table, method, m=16, ef_construction=64, lists=None, quantization="none"):
+    name = index_name(table, method, quantization)
+    new_name = f"{name}_new"
+    connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {new_name}"))
+    create_index(connection, table, method, m, ef_construction, lists, name=new_name, quantization=quantization)
+    connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    connection.execute(text(f"ALTER INDEX {new_name} RENAME TO {name}"))
+    print(f"Rebuilt {name}")
+
+# Function to drop an index
+def drop_index(connection, table, method, quantization="none"):
+    name = index_name(table, method, quantization)
+    connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    print(f"Dropped {name}")
+
+# Function to list the vector and full-text indexes on the managed tables
+def show_indexes(connection):
+    result = connection.execute(text("""
+        SELECT c.relname AS table_name, i.relname AS index_name, am.amname AS method,
+               pg_size_pretty(pg_relation_size(i.oid)) AS size, ix.indisvalid AS valid
+        FROM pg_index ix
+        JOIN pg_class i ON i.oid = ix.indexrelid
+        JOIN pg_class c ON c.oid = ix.indrelid
+        JOIN pg_am am ON am.oid = i.relam
+        WHERE c.relname = ANY(:tables) AND am.amname = ANY(:methods)
+        ORDER BY c.relname, i.relname
+    """), {"tables": list({*VECTOR_TABLES, *TEXT_SEARCH_COLUMNS}), "methods": list(METHODS)})
+    rows = result.fetchall()
+    if not rows:
+        print("No vector indexes found.")
+    for row in rows:
+        print(f"{row.table_name:<18} {row.index_name:<40} {row.method:<8} {row.size:>10} "
+              f"{'' if row.valid else '(INVALID)'}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage ANN indexes on embedding columns and full-text indexes")
+    parser.add_argument("action", choices=["create", "rebuild", "drop", "status"])
+    parser.add_argument("--table", choices=[*dict.fromkeys([*VECTOR_TABLES, *TEXT_SEARCH_COLUMNS]), "all"],
+                        default="all")
+    parser.add_argument("--method", choices=METHODS, default="hnsw", help="gin: full-text index for hybrid search")
+    parser.add_argument("--m", type=int, default=16, help="HNSW: links per node")
+    parser.add_argument("--ef-construction", type=int, default=64, help="HNSW: build-time candidate list size")
+    parser.add_argument("--lists", type=int, help="IVFFlat: number of lists (default: from row count)")
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, default="none",
+                        help="index float16 (halfvec) or 1-bit (binary) copies of the vectors; pgvector >= 0.7")
+    parser.add_argument("--maintenance-work-mem", default="1GB",
+                        help="memory for the build; HNSW builds are much faster when the graph fits")
+    args = parser.parse_args()
+
+    tables = method_tables(args.method) if args.table == "all" else [args.table]
+    if any(table not in method_tables(args.method) for table in tables):
+        parser.error(f"--method {args.method} applies to: {', '.join(method_tables(args.method))}")
+    with engine.connect() as connection:
+        if args.action == "status":
+            show_indexes(connection)
+        else:
+            connection.execute(text("SELECT set_config('maintenance_work_mem', :value, false)"),
+                               {"value": args.maintenance_work_mem})
+            for table in tables:
+                if args.action == "create":
+                    create_index(connection, table, args.method, args.m, args.ef_construction, args.lists,
+                                 quantization=args.quantization)
+                elif args.action == "rebuild":
+                    rebuild_index(connection, table, args.method, args.m, args.ef_construction, args.lists,
+                                  quantization=args.quantization)
+                else:
+                    drop_index(connection, table, args.method, args.quantization)
+            show_indexes(connection)
@@ -0,0 +1,65 @@
+"""
+pdf_extraction.py
+
+PDF text extraction and chunking, kept free of database and API setup so
+extraction can run in worker processes.
+"""
+
+from typing import Iterable, Iterator, List, Optional, Tuple
+from pypdf import PdfReader
+
+# A chunk of text and the first/last page it spans
+Chunk = Tuple[str, int, int]
+
+def read_pages(file_path: str, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page_number, text) for each page with extractable text, one page at
+    a time. `start` / `stop` select a 0-based page range.
+    """
+    reader = PdfReader(file_path)
+    pages = reader.pages[start:stop]
+    for page_number, page in enumerate(pages, start=start + 1):
+        extracted_text = page.extract_text()
+        if extracted_text:
+            yield page_number, extracted_text + "\n"
+
+def count_pages(file_path: str) -> int:
+    return len(PdfReader(file_path).pages)
+
+def extract_pages(file_path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    """Extract a page range; the unit of work for an extraction process pool."""
+    return list(read_pages(file_path, start, stop))
+
+def split_pages(pages: Iterable[Tuple[int, str]], chunk_size=500, overlap=50) -> Iterator[Chunk]:
+    """
+    Split streamed page text into overlapping chunks, as if the pages were one
+    string, keeping only the text not yet chunked in memory.
+    """
+    if chunk_size <= overlap:
+        raise ValueError("chunk_size must be greater than overlap")
+    step = chunk_size - overlap
+
+    buffer = ""
+    spans = []  # (offset in buffer where a page starts, page number)
+
+    def take_chunk():
+        nonlocal buffer, spans
+        chunk = buffer[:chunk_size]
+        # Pages whose text overlaps the chunk, judged by where each page ends:
+        # a page that ended exactly where the chunk starts is not in it
+        ends = [start for start, _ in spans[1:]] + [len(buffer)]
+        covered = [page for (start, page), end in zip(spans, ends) if start < len(chunk) and end > 0]
+        buffer = buffer[step:]
+        spans = [(start - step, page) for start, page in spans]
+        # Keep the page that the new buffer starts in, drop the ones before it
+        while len(spans) > 1 and spans[1][0] <= 0:
+            spans.pop(0)
+        return chunk, covered[0], covered[-1]
+
+    for page_number, page_text in pages:
+        spans.append((len(buffer), page_number))
+        buffer += page_text
+        while len(buffer) >= chunk_size:
+            yield take_chunk()
+    while buffer:
+        yield take_chunk()
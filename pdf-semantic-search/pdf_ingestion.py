@@ -1,127 +1,290 @@
+"""
+pdf_ingestion.py
+
+Ingests PDFs into the 'pdf_documents' table:
+page text -> overlapping chunks -> embedding batches -> inserts.
+
+- Text extraction (CPU-bound) runs in a process pool, a few pages per task.
+- Embedding requests (network-bound) run concurrently on a thread pool,
+  under a configurable concurrency and requests-per-minute limit.
+- A single writer thread collects embedded chunks and writes them with
+  one binary COPY and one commit per write batch, retrying a failed batch.
+
+Only a bounded window of pages and batches is in flight at any time, so
+memory use does not grow with the size or number of PDFs. Each chunk
+records the first and last page its text came from (page_number /
+page_end, 1-based).
+
+Usage:
+    python pdf-semantic-search/pdf_ingestion.py                       # bundled sample
+    python pdf-semantic-search/pdf_ingestion.py papers/ "more/*.pdf" --workers 8 --concurrency 4
+
+Maintaining an HNSW index costs far more per row than the COPY itself; for
+large loads drop the pdf_documents index first and create it afterwards
+with manage_vector_indexes.py.
+"""
+
 import os
-import numpy as np
-from pypdf import PdfReader
-from sqlalchemy import create_engine, text, Column, Integer, String
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from pgvector.sqlalchemy import Vector
+import sys
+import glob
+import time
+import queue
+import argparse
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import groupby, islice
+from typing import Iterable, Iterator, List, Tuple
+import psycopg
+from sqlalchemy.exc import OperationalError
 from dotenv import load_dotenv
-from openai import OpenAI
+
+from pdf_extraction import Chunk, count_pages, extract_pages, split_pages
+from pdf_schema import ensure_schema
+
+# Make the shared `app` package importable when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.database.connection import column_type_oids, create_vector_engine
+from app.services.llm.embeddings import create_embeddings
 
 load_dotenv()
 
-# Configuration
-PG_HOST = os.getenv("PG_HOST")
-PG_PORT = os.getenv("PG_PORT")
-PG_USER = os.getenv("PG_USER")
-PG_PASSWORD = os.getenv("PG_PASSWORD")
-PG_DATABASE = os.getenv("PG_DATABASE")
+# Configuration (database credentials come from the PG_* environment variables)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-DATABASE_URL = f"postgresql://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DATABASE}"
-N_DIM = 1536
-
-Base = declarative_base()
-engine = create_engine(DATABASE_URL, echo=True)  # Enable echo to debug SQL queries
-SessionLocal = sessionmaker(bind=engine)
-
-class PdfDocument(Base):
-    __tablename__ = 'pdf_documents'
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    filename = Column(String, nullable=True)
-    page_number = Column(Integer, nullable=True)
-    content = Column(String)
-    embedding = Vector(N_DIM)
-
-Base.metadata.create_all(engine)
-
-def read_pdf(file_path: str) -> str:
-    reader = PdfReader(file_path)
-    text = ""
-    for page in reader.pages:
-        extracted_text = page.extract_text()
-        if extracted_text:
-            text += extracted_text + "\n"
-    return text
-
-def split_text(text, chunk_size=500, overlap=50):
-    if chunk_size <= overlap:
-        raise ValueError("chunk_size must be greater than overlap")
-    
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = min(start + chunk_size, len(text))
-        chunks.append(text[start:end])
-        start += chunk_size - overlap
-    return chunks
-
-def create_embedding(text: str) -> np.ndarray:
-    try:
-        client = OpenAI()
-        response = client.embeddings.create(
-            model="text-embedding-ada-002",
-            input=[text]
+# Columns written by the pdf_documents COPY, which runs in binary format
+COPY_COLUMNS = ["filename", "page_number", "page_end", "content", "embedding"]
+
+# engine = create_vector_engine(echo=True)  # Enable echo to debug SQL queries
+# Embeddings are sent to pgvector in binary, straight from float32 NumPy arrays
+engine = create_vector_engine(pool_pre_ping=True)
+
+class RateLimiter:
+    """Space calls out to at most `per_minute` per minute, across threads (0 = no limit)."""
+
+    def __init__(self, per_minute: float = 0):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        time.sleep(slot - now)
+
+def find_pdfs(paths: Iterable[str]) -> List[str]:
+    """Expand files, directories (searched recursively) and glob patterns into PDF paths."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "**", "*.pdf"), recursive=True)))
+        elif glob.has_magic(path):
+            files.extend(sorted(glob.glob(path, recursive=True)))
+        elif os.path.exists(path):
+            files.append(path)
+        else:
+            print(f"File not found: {path}")
+    return list(dict.fromkeys(files))
+
+def page_ranges(files: Iterable[str], pages_per_task: int) -> Iterator[Tuple[str, int, int]]:
+    """Yield (file_path, start, stop) extraction tasks covering every page of every file."""
+    for file_path in files:
+        try:
+            page_count = count_pages(file_path)
+        except Exception as e:
+            print(f"Skipping {file_path}: {e}")
+            continue
+        print(f"Processing PDF: {file_path} ({page_count} pages)")
+        for start in range(0, page_count, pages_per_task):
+            yield file_path, start, min(start + pages_per_task, page_count)
+
+def extract_all(executor, tasks: Iterable[Tuple[str, int, int]], window: int) -> Iterator[Tuple[str, int, str]]:
+    """
+    Run extraction tasks on `executor`, keeping at most `window` ahead of the
+    consumer, and yield (file_path, page_number, text) in document order.
+    """
+    tasks = iter(tasks)
+    pending = deque((task, executor.submit(extract_pages, *task)) for task in islice(tasks, window))
+    while pending:
+        (file_path, start, stop), future = pending.popleft()
+        for task in islice(tasks, 1):
+            pending.append((task, executor.submit(extract_pages, *task)))
+        try:
+            pages = future.result()
+        except Exception as e:
+            print(f"Error extracting {file_path} pages {start + 1}-{stop}: {e}")
+            continue
+        for page_number, page_text in pages:
+            yield file_path, page_number, page_text
+
+def batch_chunks(chunks: Iterable[Chunk], batch_size: int) -> Iterator[List[Chunk]]:
+    """Group chunks into embedding batches."""
+    chunks = iter(chunks)
+    while batch := list(islice(chunks, batch_size)):
+        yield batch
+
+def copy_rows(connection, rows):
+    """Write (filename, page_number, page_end, content, embedding) rows with one binary COPY."""
+    raw_connection = connection.connection.driver_connection
+    with raw_connection.cursor() as cursor:
+        column_types = column_type_oids(cursor, "pdf_documents", COPY_COLUMNS)
+        with cursor.copy(f"COPY pdf_documents ({', '.join(COPY_COLUMNS)}) FROM STDIN (FORMAT BINARY)") as copy:
+            copy.set_types(column_types)
+            for row in rows:
+                copy.write_row(row)
+
+def insert_rows(rows, retries=3):
+    """
+    Insert rows in a single transaction. If the connection fails, the whole
+    batch is retried on a fresh connection, with exponential backoff.
+    """
+    for attempt in range(1, retries + 1):
+        try:
+            with engine.begin() as connection:
+                copy_rows(connection, rows)
+            return
+        except (psycopg.OperationalError, OperationalError) as e:
+            if attempt == retries:
+                raise
+            delay = 2 ** (attempt - 1)
+            print(f"Writing {len(rows)} chunks failed (attempt {attempt}/{retries}): {e}; retrying in {delay}s")
+            time.sleep(delay)
+
+def write_chunks(embedded: "queue.Queue", write_batch_size: int, retries: int, stats, lock):
+    """
+    Writer thread: collect embedded batches from `embedded` (None ends the
+    stream) and insert them `write_batch_size` rows at a time.
+    """
+    rows = []
+
+    def flush():
+        try:
+            insert_rows(rows, retries)
+            with lock:
+                stats["inserted"] += len(rows)
+        except Exception as e:
+            print(f"Error inserting {len(rows)} chunks: {e}")
+        rows.clear()
+
+    while (item := embedded.get()) is not None:
+        file_path, batch, embeddings = item
+        rows.extend(
+            (file_path, first_page, last_page, chunk, embedding)
+            for (chunk, first_page, last_page), embedding in zip(batch, embeddings)
         )
-        embedding = response.data[0].embedding
-        if len(embedding) != N_DIM:
-            raise ValueError(f"Unexpected embedding dimension: {len(embedding)}")
-        return np.array(embedding, dtype=np.float32)  # Convert to numpy array for compatibility
-    except Exception as e:
-        print(f"Error generating embedding: {e}")
-        return None
-
-def ingest_pdf(file_path: str):
-    print(f"Processing PDF: {file_path}")
-    
-    # Read PDF
-    pdf_text = read_pdf(file_path)
-    print(f"Extracted {len(pdf_text)} characters")
-    
-    # Split into chunks
-    text_chunks = split_text(pdf_text, chunk_size=500, overlap=50)
-    print(f"Created {len(text_chunks)} chunks")
-    
-    session = SessionLocal()
+        if len(rows) >= write_batch_size:
+            flush()
+    if rows:
+        flush()
+
+def ingest_pdfs(files: List[str], workers=None, concurrency=4, requests_per_minute=0,
+                batch_size=64, chunk_size=500, overlap=50, pages_per_task=8,
+                write_batch_size=500, write_retries=3, extract_only=False):
+    """
+    Ingest many PDFs. Returns a dict of counts and throughput.
+    With `extract_only`, chunks are produced but not embedded or stored.
+    """
+    workers = workers or os.cpu_count() or 1
+    limiter = RateLimiter(requests_per_minute)
+    # Batches being embedded; together with the bounded writer queue this bounds memory
+    in_flight = threading.BoundedSemaphore(concurrency * 2)
+    embedded = queue.Queue(maxsize=concurrency * 2)
+    lock = threading.Lock()
+    stats = {"files": len(files), "pages": 0, "chunks": 0, "inserted": 0}
+
+    if not extract_only:
+        ensure_schema(engine)
+
+    start_time = time.perf_counter()
+    writer = threading.Thread(
+        target=write_chunks, args=(embedded, write_batch_size, write_retries, stats, lock), daemon=True
+    )
+    writer.start()
     try:
-        for i, chunk in enumerate(text_chunks):
-            try:
-                # Generate embedding
-                embedding = create_embedding(chunk)
-                if embedding is None:
-                    print(f"Skipping chunk {i}: embedding generation failed")
-                    continue
-                
-                # Convert embedding to string for insertion
-                embedding_str = f"[{','.join(f'{float(val):.6f}' for val in embedding)}]"
-                
-                # Insert into database using raw SQL
-                query_str = """
-                INSERT INTO pdf_documents (filename, page_number, content, embedding)
-                VALUES (:filename, :page_number, :content, :embedding);
-                """
-                session.execute(
-                    text(query_str),
-                    {"filename": file_path, "page_number": i, "content": chunk, "embedding": embedding_str}
-                )
-                session.commit()
-                print(f"Successfully inserted chunk {i}")
-                
-            except Exception as e:
-                print(f"Error processing chunk {i}: {e}")
-                session.rollback()
-                continue
-    
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as extractors, \
+             ThreadPoolExecutor(max_workers=concurrency) as embedders:
+
+            def embed(file_path, batch):
+                try:
+                    limiter.wait()
+                    embeddings = create_embeddings([chunk for chunk, _, _ in batch])
+                    if embeddings is None:
+                        print(f"Skipping {len(batch)} chunks from {file_path} (pages {batch[0][1]}-{batch[-1][2]}): "
+                              "embedding generation failed")
+                    else:
+                        embedded.put((file_path, batch, embeddings))
+                finally:
+                    in_flight.release()
+
+            pages = extract_all(extractors, page_ranges(files, pages_per_task), window=workers * 2)
+            for file_path, file_pages in groupby(pages, key=lambda page: page[0]):
+                def numbered(file_pages=file_pages):
+                    for _, page_number, page_text in file_pages:
+                        stats["pages"] += 1
+                        yield page_number, page_text
+
+                for batch in batch_chunks(split_pages(numbered(), chunk_size, overlap), batch_size):
+                    stats["chunks"] += len(batch)
+                    if extract_only:
+                        continue
+                    in_flight.acquire()
+                    embedders.submit(embed, file_path, batch)
     finally:
-        session.close()
-        print("Ingestion complete")
+        # Embedders are done; let the writer flush what is left
+        embedded.put(None)
+        writer.join()
+
+    elapsed = time.perf_counter() - start_time
+    stats["seconds"] = elapsed
+    stats["pages_per_sec"] = stats["pages"] / elapsed if elapsed else 0.0
+    stats["chunks_per_sec"] = (stats["chunks"] if extract_only else stats["inserted"]) / elapsed if elapsed else 0.0
+
+    print(f"Ingestion complete: {stats['files']} files, {stats['pages']} pages, "
+          f"{stats['chunks']} chunks, {stats['inserted']} inserted in {elapsed:.1f}s")
+    print(f"Throughput: {stats['pages_per_sec']:.1f} pages/sec, {stats['chunks_per_sec']:.1f} chunks/sec "
+          f"({workers} extraction workers, {concurrency} concurrent embedding requests)")
+    return stats
+
+def ingest_pdf(file_path: str, **options):
+    return ingest_pdfs([file_path], **options)
 
 if __name__ == "__main__":
-    pdf_file = "./pdf-semantic-search/shreya_md_thesis_sample.pdf"
+    parser = argparse.ArgumentParser(description="Ingest PDFs into pdf_documents")
+    parser.add_argument("paths", nargs="*", default=["./pdf-semantic-search/shreya_md_thesis_sample.pdf"],
+                        help="PDF files, directories or glob patterns")
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes (default: CPU count)")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent embedding requests")
+    parser.add_argument("--requests-per-minute", type=float, default=0, help="embedding request rate limit (0 = none)")
+    parser.add_argument("--batch-size", type=int, default=64, help="chunks per embedding request")
+    parser.add_argument("--write-batch-size", type=int, default=500, help="chunks per COPY and commit")
+    parser.add_argument("--write-retries", type=int, default=3, help="attempts per write batch on connection errors")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--overlap", type=int, default=50)
+    parser.add_argument("--pages-per-task", type=int, default=8, help="pages extracted per worker task")
+    parser.add_argument("--extract-only", action="store_true", help="only extract and chunk; measures extraction throughput")
+    args = parser.parse_args()
+
     print(f"Current working directory: {os.getcwd()}")
-    
-    if not os.path.exists(pdf_file):
-        print(f"File not found: {pdf_file}")
+    pdf_files = find_pdfs(args.paths)
+    if not pdf_files:
+        print("No PDF files found.")
         exit(1)
-        
-    ingest_pdf(pdf_file)
+
+    ingest_pdfs(
+        pdf_files,
+        workers=args.workers,
+        concurrency=args.concurrency,
+        requests_per_minute=args.requests_per_minute,
+        batch_size=args.batch_size,
+        chunk_size=args.chunk_size,
+        overlap=args.overlap,
+        pages_per_task=args.pages_per_task,
+        write_batch_size=args.write_batch_size,
+        write_retries=args.write_retries,
+        extract_only=args.extract_only,
+    )
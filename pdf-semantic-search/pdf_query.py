@@ -8,44 +8,40 @@ Script to:
 """
 
 import os
+import sys
+from typing import List, Optional
 import numpy as np
-from sqlalchemy import create_engine, text, Column, Integer, String
+from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.declarative import declarative_base
-from pgvector.sqlalchemy import Vector
 from dotenv import load_dotenv
-from openai import OpenAI
 from langchain.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
 
+# Make the shared `app` package importable when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.database.connection import create_vector_engine
+from app.services.database.hybrid import HYBRID_CANDIDATES, hybrid_params, hybrid_sql
+from app.services.database.memmap_index import (
+    MATCHES_SQL, VECTOR_SEARCH_BACKEND, get_index, match_params
+)
+from app.services.database.vector import (
+    VECTOR_QUANTIZATION, nearest_sql, rerank_candidates, set_search_params
+)
+from app.services.llm.embeddings import create_embeddings
+from app.services.metrics import Metrics
+from pdf_schema import N_DIM
+
 load_dotenv()
 
-# Configuration
-PG_HOST = os.getenv("PG_HOST")
-PG_PORT = os.getenv("PG_PORT")
-PG_USER = os.getenv("PG_USER")
-PG_PASSWORD = os.getenv("PG_PASSWORD")
-PG_DATABASE = os.getenv("PG_DATABASE")
+# Configuration (database credentials come from the PG_* environment variables)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-DATABASE_URL = f"postgresql://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DATABASE}"
-N_DIM = 1536
-
-Base = declarative_base()
-# engine = create_engine(DATABASE_URL, echo=True)  # Enable echo to debug SQL queries
-engine = create_engine(DATABASE_URL)  # Enable echo to debug SQL queries
+# pdf_documents is created and upgraded by pdf_ingestion.py (pdf_schema.ensure_schema)
+# engine = create_vector_engine(echo=True)  # Enable echo to debug SQL queries
+# Embeddings are sent to pgvector in binary, straight from float32 NumPy arrays
+engine = create_vector_engine()
 SessionLocal = sessionmaker(bind=engine)
 
-class PdfDocument(Base):
-    __tablename__ = 'pdf_documents'
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    filename = Column(String, nullable=True)
-    page_number = Column(Integer, nullable=True)
-    content = Column(String)
-    embedding = Vector(N_DIM)
-
-Base.metadata.create_all(engine)
-
 response_template = '''Analyze the following matched PDF chunks and provide a concise response to the original question.
 
 Original Question: {input}
@@ -62,69 +58,134 @@ response_prompt = PromptTemplate(
     template=response_template
 )
 
-def create_embedding(text: str) -> np.ndarray:
-    try:
-        client = OpenAI()
-        response = client.embeddings.create(
-            model="text-embedding-ada-002",
-            input=[text]
-        )
-        embedding = response.data[0].embedding
-        if len(embedding) != N_DIM:
-            raise ValueError(f"Unexpected embedding dimension: {len(embedding)}")
-        return np.array(embedding, dtype=np.float32)  # Convert to numpy array for compatibility
-    except Exception as e:
-        print(f"Error generating embedding: {e}")
-        return None
-
-def find_similar_documents(query_embedding: np.ndarray, limit=5, similarity_threshold=0.7):
+def find_similar_documents_batch(query_embeddings: List[np.ndarray], limit=5, similarity_threshold=0.7,
+                                 ef_search=None, probes=None, backend=VECTOR_SEARCH_BACKEND,
+                                 quantization=VECTOR_QUANTIZATION):
     """
-    Find similar PDF chunks from the pdf_documents table that have distance
-    less than `similarity_threshold`. The vector column in PdfDocument is 
-    configured for cosine distance in this example.
+    Find similar PDF chunks for many query embeddings in one SQL statement.
+    Returns one list of rows per query embedding, in input order.
+
+    Each query takes its nearest `limit` chunks with an ordered scan (served
+    by an HNSW/IVFFlat index when one exists) inside a lateral join, and the
+    `similarity_threshold` is applied afterwards. `ef_search` / `probes` tune
+    index recall. `quantization` ("halfvec" / "binary") searches a quantized
+    index and re-ranks the candidates at full precision. With `backend="memmap"` the ranking is done in-process over
+    a memory-mapped export and SQL only fetches the matched rows by id.
     """
+    matches = [[] for _ in query_embeddings]
+    if not query_embeddings:
+        return matches
+
     session = SessionLocal()
     try:
-        # Convert embedding to string for querying
-        embedding_str = f"[{','.join(f'{float(val):.6f}' for val in query_embedding)}]"
-
-        # Build query for similarity
         query_str = f"""
-        SELECT id, filename, page_number, content, 1 - (embedding <=> :embedding) AS similarity
-        FROM pdf_documents
-        WHERE 1 - (embedding <=> :embedding) >= :similarity_threshold
-        ORDER BY embedding <=> :embedding
-        LIMIT :limit;
+        SELECT q.ord, n.id, n.filename, n.page_number, n.page_end, n.content, 1 - n.distance AS similarity
+        FROM unnest(CAST(:embeddings AS vector[])) WITH ORDINALITY AS q(embedding, ord)
+        CROSS JOIN LATERAL ({nearest_sql(
+            "pdf_documents", ["id", "filename", "page_number", "page_end", "content"], "q.embedding", ":limit",
+            quantization=quantization, dimensions=N_DIM
+        )}
+        ) n
+        WHERE 1 - n.distance >= :similarity_threshold
+        ORDER BY q.ord, n.distance;
         """
+        candidates = rerank_candidates(limit, quantization)
+
+        with Metrics.span("vector_search"):
+            if backend == "memmap":
+                pdf_index = get_index(session.connection(), "pdf_documents", dimensions=N_DIM)
+                pdf_index.refresh_if_stale(session.connection())
+                result = session.execute(
+                    text(f"""
+                    SELECT m.ord, d.id, d.filename, d.page_number, d.page_end, d.content, m.similarity
+                    FROM {MATCHES_SQL} AS m(ord, id, similarity)
+                    JOIN pdf_documents d ON d.id = m.id
+                    ORDER BY m.ord, m.similarity DESC;
+                    """),
+                    match_params(pdf_index.search(query_embeddings, limit, min_similarity=similarity_threshold))
+                )
+            else:
+                set_search_params(session, candidates, ef_search, probes)
+                result = session.execute(
+                    text(query_str),
+                    {"embeddings": list(query_embeddings), "similarity_threshold": similarity_threshold,
+                     "limit": limit, "candidates": candidates}
+                )
+
+        for row in result:
+            matches[row.ord - 1].append(row)
+        return matches
+    except Exception as e:
+        print(f"Error in find_similar_documents_batch: {e}")
+        return [[] for _ in query_embeddings]
+    finally:
+        session.close()
 
-        result = session.execute(
-            text(query_str),
-            {"embedding": embedding_str, "similarity_threshold": similarity_threshold, "limit": limit}
-        )
+def find_similar_documents(query_embedding: np.ndarray, limit=5, similarity_threshold=0.7,
+                           ef_search=None, probes=None, backend=VECTOR_SEARCH_BACKEND,
+                           quantization=VECTOR_QUANTIZATION):
+    """
+    Find similar PDF chunks from the pdf_documents table whose cosine similarity
+    is at least `similarity_threshold`.
+    """
+    return find_similar_documents_batch(
+        [query_embedding], limit, similarity_threshold, ef_search, probes, backend, quantization
+    )[0]
 
-        results = result.fetchall()
-        return results
+def find_hybrid_documents(question: str, query_embedding: Optional[np.ndarray], limit=5, semantic_weight=1.0,
+                          keyword_weight=1.0, candidates_per_leg=HYBRID_CANDIDATES, ef_search=None, probes=None,
+                          quantization=VECTOR_QUANTIZATION):
+    """
+    Find PDF chunks by keyword and meaning together: full-text search on the
+    chunk text and vector search on its embedding, run in one statement and
+    merged by reciprocal rank fusion. Rows carry `score`, each leg's rank and
+    `similarity` (None for keyword-only matches). A weight of 0 leaves that
+    leg out; `query_embedding` may then be None.
+    """
+    session = SessionLocal()
+    try:
+        leg_limit = max(limit, candidates_per_leg)
+        candidates = rerank_candidates(leg_limit, quantization)
+        query_str = hybrid_sql(
+            "pdf_documents", ["filename", "page_number", "page_end", "content"], "pdf_documents",
+            quantization=quantization, dimensions=N_DIM,
+            semantic=bool(semantic_weight), keyword=bool(keyword_weight)
+        )
+        with Metrics.span("vector_search"):
+            if semantic_weight:
+                set_search_params(session, candidates, ef_search, probes)
+            result = session.execute(
+                text(query_str),
+                hybrid_params(question, query_embedding, limit, semantic_weight, keyword_weight, candidates, leg_limit)
+            )
+            return result.fetchall()
     except Exception as e:
-        print(f"Error in find_similar_documents: {e}")
+        print(f"Error in find_hybrid_documents: {e}")
         return []
     finally:
         session.close()
 
+def format_pages(row) -> str:
+    if row.page_end is None or row.page_end == row.page_number:
+        return f"Page: {row.page_number}"
+    return f"Pages: {row.page_number}-{row.page_end}"
+
 def get_semantic_response(question: str, results):
     if not results:
         similar_records_str = "No matching chunks found."
     else:
         similar_records_str = "\n".join(
-            [f"Chunk ID: {row.id}, Page: {row.page_number}, Content: {row.content[:200]}..." for row in results]
+            [f"Chunk ID: {row.id}, {format_pages(row)}, Content: {row.content[:200]}..." for row in results]
         )
 
     response_llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.2)
-    response = response_llm.invoke(
-        response_prompt.format(
-            input=question,
-            similar_records=similar_records_str
-        )
-    ).content
+    with Metrics.span("llm_summarization"):
+        response = response_llm.invoke(
+            response_prompt.format(
+                input=question,
+                similar_records=similar_records_str
+            )
+        ).content
 
     return response
 
@@ -137,23 +198,25 @@ if __name__ == "__main__":
         "What conclusions were drawn regarding HPV-positive patients?",
     ]
 
-    for question in questions:
-        print(f"\nQuestion: {question}")
+    # Embed every question in one request
+    query_embeddings = create_embeddings(questions)
+    if query_embeddings is None:
+        print("Failed to generate embeddings for the questions.")
+        sys.exit(1)
 
-        # Generate embedding for the question
-        query_embedding = create_embedding(question)
-        if query_embedding is None:
-            print("Failed to generate embedding for the question.")
-            continue
-
-        # Retrieve similar documents
-        results = find_similar_documents(
-            query_embedding=query_embedding,
-            limit=5,                 # how many results to return
-            similarity_threshold=0.7 # how strict the similarity is
-        )
+    # Retrieve similar documents for all questions in one query
+    all_results = find_similar_documents_batch(
+        query_embeddings=query_embeddings,
+        limit=5,                 # how many results to return per question
+        similarity_threshold=0.7 # how strict the similarity is
+    )
+
+    for question, results in zip(questions, all_results):
+        print(f"\nQuestion: {question}")
 
         # Generate response from matched chunks
         response = get_semantic_response(question, results)
         print("Response:", response)
         print()
+
+    Metrics.print_report()
@@ -0,0 +1,31 @@
+"""
+pdf_schema.py
+
+The 'pdf_documents' table: one row per chunk of PDF text with its
+embedding. Shared by pdf_ingestion.py, which creates and upgrades the
+table, and pdf_query.py, which only reads it.
+"""
+
+from sqlalchemy import text, Column, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+from pgvector.sqlalchemy import Vector
+
+N_DIM = 1536
+
+Base = declarative_base()
+
+class PdfDocument(Base):
+    __tablename__ = 'pdf_documents'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    filename = Column(String, nullable=True)
+    page_number = Column(Integer, nullable=True)  # first source page
+    page_end = Column(Integer, nullable=True)     # last source page
+    content = Column(String)
+    embedding = Column(Vector(N_DIM))
+
+def ensure_schema(engine):
+    """Create pdf_documents, or add the columns an older table is missing."""
+    Base.metadata.create_all(engine)
+    # Tables created before page ranges were recorded have no page_end column
+    with engine.begin() as connection:
+        connection.execute(text("ALTER TABLE pdf_documents ADD COLUMN IF NOT EXISTS page_end INTEGER"))
@@ -1,39 +1,133 @@
-import os
-import numpy as np
+import argparse
+import time
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
-from langchain_openai import ChatOpenAI
-from openai import OpenAI
+from sqlalchemy import text
+
+from app.services.database.connection import column_type_oids, create_vector_engine
+from app.services.llm.embeddings import (
+    MAX_BATCH_SIZE,
+    MAX_BATCH_TOKENS,
+    MAX_INPUT_TOKENS,
+    count_tokens,
+    create_embeddings,
+    get_embedding_cache,
+)
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Read database credentials from environment variables
-PG_HOST = os.getenv("PG_HOST")
-PG_PORT = os.getenv("PG_PORT")
-PG_USER = os.getenv("PG_USER")
-PG_PASSWORD = os.getenv("PG_PASSWORD")
-PG_DATABASE = os.getenv("PG_DATABASE")
-
-# Build the connection string
-POSTGRES_URI = f"postgresql://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DATABASE}"
-
-# Create an SQLAlchemy engine
-engine = create_engine(POSTGRES_URI)
-
-# Function to create embeddings using the embeddings endpoint
-def create_embedding(text):
-    try:
-        client = OpenAI()
-        response = client.embeddings.create(
-            model="text-embedding-ada-002",
-            input=[text]
+# Create an SQLAlchemy engine (PG_* environment variables) on psycopg 3,
+# which provides COPY and binary pgvector transport
+engine = create_vector_engine()
+
+# Columns written by the staging COPY, which runs in binary format
+STAGING_COLUMNS = ["task_id", "title", "description", "priority", "category", "created_at", "content_hash", "embedding"]
+
+# Function to group tasks into embeddings requests within the per-request limits.
+# `tasks` yields rows whose description is at index 2; inputs over the
+# per-input token limit are skipped and reported.
+def batch_tasks(tasks, batch_size=MAX_BATCH_SIZE, max_batch_tokens=MAX_BATCH_TOKENS):
+    batch, batch_tokens = [], 0
+    for task in tasks:
+        tokens = count_tokens(task[2])
+        if tokens > MAX_INPUT_TOKENS:
+            print(f"Skipping task_id {task[0]}: description is {tokens} tokens (limit {MAX_INPUT_TOKENS})")
+            continue
+        if batch and (len(batch) >= batch_size or batch_tokens + tokens > max_batch_tokens):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(task)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+# Function to write a batch of embeddings with COPY into a staging table and one merge
+def bulk_upsert_embeddings(connection, rows):
+    raw_connection = connection.connection.driver_connection
+    column_list = ", ".join(STAGING_COLUMNS)
+    with raw_connection.cursor() as cursor:
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS task_embeddings_staging
+            (LIKE task_embeddings INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+        """)
+        column_types = column_type_oids(cursor, "task_embeddings_staging", STAGING_COLUMNS)
+        with cursor.copy(f"COPY task_embeddings_staging ({column_list}) FROM STDIN (FORMAT BINARY)") as copy:
+            copy.set_types(column_types)
+            for row in rows:
+                copy.write_row(row)
+        cursor.execute(f"""
+            INSERT INTO task_embeddings ({column_list})
+            SELECT {column_list}
+            FROM task_embeddings_staging
+            ON CONFLICT (task_id) DO UPDATE SET
+            title = EXCLUDED.title,
+            description = EXCLUDED.description,
+            priority = EXCLUDED.priority,
+            category = EXCLUDED.category,
+            created_at = EXCLUDED.created_at,
+            content_hash = EXCLUDED.content_hash,
+            embedding = EXCLUDED.embedding
+        """)
+
+# Function to check for a unique index on task_embeddings(task_id), which the
+# ON CONFLICT (task_id) upserts here and in the API's embedding queue need
+def has_unique_task_id(connection):
+    return connection.execute(text("""
+        SELECT EXISTS (
+            SELECT 1
+            FROM pg_index i
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+            WHERE i.indrelid = 'task_embeddings'::regclass
+              AND i.indisunique AND i.indnkeyatts = 1 AND a.attname = 'task_id'
+              AND i.indpred IS NULL AND i.indexprs IS NULL
         )
-        embedding = response.data[0].embedding
-        return np.array(embedding, dtype=np.float32)
-    except Exception as e:
-        print(f"Error generating embedding for text '{text}': {e}")
-        return None
+    """)).scalar()
+
+# Function to set up change tracking on an existing task_embeddings table:
+# the content_hash column (md5 of the embedded description), backfilled for
+# rows embedded before it existed, and a unique index on task_id. Safe to
+# run on every sync.
+def ensure_change_tracking(connection):
+    connection.execute(text(
+        "ALTER TABLE task_embeddings ADD COLUMN IF NOT EXISTS content_hash TEXT"
+    ))
+    # The stored description is the text that was embedded
+    backfilled = connection.execute(text("""
+        UPDATE task_embeddings SET content_hash = md5(description)
+        WHERE content_hash IS NULL AND embedding IS NOT NULL AND description IS NOT NULL
+    """)).rowcount
+    if backfilled:
+        print(f"Backfilled content_hash of {backfilled} embeddings")
+
+    if not has_unique_task_id(connection):
+        # Keep one embedding per task (the last one written)
+        duplicates = connection.execute(text("""
+            DELETE FROM task_embeddings a
+            USING task_embeddings b
+            WHERE a.task_id = b.task_id AND a.ctid < b.ctid
+        """)).rowcount
+        connection.execute(text(
+            "CREATE UNIQUE INDEX task_embeddings_task_id_key ON task_embeddings (task_id)"
+        ))
+        print(f"Created unique index on task_embeddings(task_id), removed {duplicates} duplicate embeddings")
+
+# Function to bring task_embeddings in line with tasks without calling the
+# embeddings API: drop rows for deleted tasks and copy over metadata edits.
+def sync_without_embedding(connection):
+    deleted = connection.execute(text("""
+        DELETE FROM task_embeddings te
+        WHERE NOT EXISTS (SELECT 1 FROM tasks t WHERE t.id = te.task_id)
+    """)).rowcount
+    updated = connection.execute(text("""
+        UPDATE task_embeddings te
+        SET title = t.title, priority = t.priority,
+            category = t.category, created_at = t.created_at
+        FROM tasks t
+        WHERE te.task_id = t.id
+          AND (te.title, te.priority, te.category, te.created_at)
+              IS DISTINCT FROM (t.title, t.priority, t.category, t.created_at)
+    """)).rowcount
+    return deleted, updated
 
 # Function to check if task_embeddings table exists and has the correct schema
 def verify_table_schema():
@@ -42,112 +136,118 @@ def verify_table_schema():
             # Check if table exists
             result = connection.execute(text("""
                 SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
+                    SELECT FROM information_schema.tables
                     WHERE table_name = 'task_embeddings'
                 );
             """))
             exists = result.scalar()
-            
+
             if not exists:
                 print("Error: task_embeddings table does not exist!")
                 return False
-            
+
             # Check table schema
             result = connection.execute(text("""
-                SELECT column_name, data_type 
-                FROM information_schema.columns 
+                SELECT column_name, data_type
+                FROM information_schema.columns
                 WHERE table_name = 'task_embeddings';
             """))
             columns = result.fetchall()
             print("Table schema:")
             for col in columns:
                 print(f"Column: {col[0]}, Type: {col[1]}")
-            
+
             return True
     except Exception as e:
         print(f"Error verifying table schema: {e}")
         return False
 
 # Function to populate the task_embeddings table
-def populate_task_embeddings():
+# With full=False only new tasks and tasks whose description changed since
+# they were last embedded are sent to the embeddings API.
+def populate_task_embeddings(batch_size=MAX_BATCH_SIZE, max_batch_tokens=MAX_BATCH_TOKENS, full=False):
     try:
         # First verify the table schema
         if not verify_table_schema():
             return
 
-        # Fetch task data from the tasks table
+        start = time.perf_counter()
+        embedding_seconds = write_seconds = 0.0
+        batches = embedded = failed = 0
+
         with engine.connect() as connection:
-            result = connection.execute(
-                text("SELECT id, title, description, priority, category, created_at FROM tasks")
-            )
+            ensure_change_tracking(connection)
+            deleted, updated = sync_without_embedding(connection)
+            print(f"Removed {deleted} embeddings of deleted tasks, refreshed metadata of {updated}")
+
+            # Fetch new or modified tasks (or every task for a full rebuild)
+            result = connection.execute(text(f"""
+                SELECT t.id, t.title, t.description, t.priority, t.category, t.created_at,
+                       md5(t.description) AS content_hash
+                FROM tasks t
+                LEFT JOIN task_embeddings te ON te.task_id = t.id
+                WHERE t.description <> ''
+                {"" if full else "AND te.content_hash IS DISTINCT FROM md5(t.description)"}
+                ORDER BY t.id
+            """))
             tasks = result.fetchall()
+            connection.commit()
             print(f"Found {len(tasks)} tasks to process")
 
-        # Insert task data and embeddings into the task_embeddings table
-        for task_id, title, description, priority, category, created_at in tasks:
-            print(f"\nProcessing task_id {task_id}...")
-            print(f"Description: {description}")
+            # Embed many descriptions per request, then write each batch in one transaction
+            for batch in batch_tasks(tasks, batch_size, max_batch_tokens):
+                batch_start = time.perf_counter()
+                embeddings = create_embeddings([task.description for task in batch])
+                embedding_seconds += time.perf_counter() - batch_start
+                batches += 1
 
-            # Generate embedding
-            embedding = create_embedding(description)
-            if embedding is None:
-                print(f"Skipping task_id {task_id} due to embedding generation error.")
-                continue
+                if embeddings is None:
+                    print(f"Skipping {len(batch)} tasks (task_id {batch[0].id}..{batch[-1].id}) due to embedding generation error.")
+                    failed += len(batch)
+                    continue
 
-            print(f"Generated embedding of length: {len(embedding)}")
-
-            try:
-                # Use a single connection for both insert and verify
-                with engine.connect() as connection:
-                    # Begin transaction
+                write_start = time.perf_counter()
+                try:
                     with connection.begin():
-                        # Insert the embedding
-                        connection.execute(
-                            text("""
-                                INSERT INTO task_embeddings 
-                                (task_id, title, description, priority, category, created_at, embedding)
-                                VALUES 
-                                (:task_id, :title, :description, :priority, :category, :created_at, :embedding)
-                                ON CONFLICT (task_id) DO UPDATE SET
-                                embedding = :embedding
-                            """),
-                            {
-                                "task_id": task_id,
-                                "title": title,
-                                "description": description,
-                                "priority": priority,
-                                "category": category,
-                                "created_at": created_at,
-                                "embedding": embedding.tolist()
-                            }
-                        )
-                        
-                        # Verify the insertion within the same transaction
-                        result = connection.execute(
-                            text("SELECT embedding FROM task_embeddings WHERE task_id = :task_id"),
-                            {"task_id": task_id}
+                        bulk_upsert_embeddings(
+                            connection,
+                            [(*task, embedding) for task, embedding in zip(batch, embeddings)]
                         )
-                        stored_embedding = result.scalar()
-                        
-                        if stored_embedding is None:
-                            print(f"Warning: Failed to verify insertion for task_id {task_id}")
-                        else:
-                            print(f"Task_id {task_id} inserted and verified successfully")
-
-            except Exception as e:
-                print(f"Error processing task_id {task_id}: {e}")
-                continue
-
-        # Final verification
-        with engine.connect() as connection:
-            result = connection.execute(
+                    embedded += len(batch)
+                except Exception as e:
+                    print(f"Error writing {len(batch)} embeddings (task_id {batch[0].id}..{batch[-1].id}): {e}")
+                    failed += len(batch)
+                write_seconds += time.perf_counter() - write_start
+
+                print(f"Embedded {embedded}/{len(tasks)} tasks")
+
+            # Final verification
+            count = connection.execute(
                 text("SELECT COUNT(*) FROM task_embeddings")
-            )
-            count = result.scalar()
-            print(f"\nTotal records in task_embeddings table: {count}")
+            ).scalar()
+
+        elapsed = time.perf_counter() - start
+        print(f"\nTotal records in task_embeddings table: {count}")
+        print(
+            f"Embedded {embedded} tasks ({failed} failed) in {elapsed:.1f}s "
+            f"over {batches} batches: "
+            f"{embedded / elapsed if elapsed else 0:.1f} tasks/s "
+            f"(embedding {embedding_seconds:.1f}s, database {write_seconds:.1f}s)"
+        )
+        cache = get_embedding_cache()
+        if cache:
+            print(f"Embedding cache: {cache.stats()}")
 
     except Exception as e:
         print(f"Error populating task_embeddings table: {e}")
 
 if __name__ == "__main__":
-    populate_task_embeddings()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate embeddings for new and modified tasks")
+    parser.add_argument("--batch-size", type=int, default=MAX_BATCH_SIZE,
+                        help="descriptions sent per embeddings request")
+    parser.add_argument("--max-batch-tokens", type=int, default=MAX_BATCH_TOKENS,
+                        help="token budget per embeddings request")
+    parser.add_argument("--full", action="store_true",
+                        help="re-embed every task, not just new or modified ones")
+    args = parser.parse_args()
+    populate_task_embeddings(batch_size=args.batch_size, max_batch_tokens=args.max_batch_tokens, full=args.full)
@@ -1,28 +1,31 @@
 import os
-import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
-from openai import OpenAI
+from sqlalchemy import text
 
 from langchain.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
 
+from app.services.database.connection import create_vector_engine
+from app.services.database.hybrid import HYBRID_CANDIDATES, hybrid_params, hybrid_sql, keyword_sql
+from app.services.database.memmap_index import (
+    MATCHES_SQL, VECTOR_SEARCH_BACKEND, get_index, match_params
+)
+from app.services.database.vector import (
+    VECTOR_QUANTIZATION, nearest_sql, rerank_candidates, set_search_params
+)
+from app.services.llm.embeddings import create_embeddings
+from app.services.metrics import Metrics
+
 # Load environment variables from .env file
 load_dotenv()
 
-# Read database credentials from environment variables
-PG_HOST = os.getenv("PG_HOST")
-PG_PORT = os.getenv("PG_PORT")
-PG_USER = os.getenv("PG_USER")
-PG_PASSWORD = os.getenv("PG_PASSWORD")
-PG_DATABASE = os.getenv("PG_DATABASE")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-# Build the connection string
-POSTGRES_URI = f"postgresql://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DATABASE}"
-
-# Create an SQLAlchemy engine
-engine = create_engine(POSTGRES_URI)
+# Create an SQLAlchemy engine (PG_* environment variables) that sends
+# embeddings to pgvector in binary, straight from float32 NumPy arrays
+engine = create_vector_engine()
 
 # Define a prompt for formatting the response
 response_template = '''Analyze the query result and provide a concise response to the original question.
@@ -47,96 +50,176 @@ VECTOR_TABLE = "task_embeddings"  # Updated table name
 VECTOR_COLUMN = "embedding"       # Column for the vector
 TEXT_COLUMN = "description"       # Column for task descriptions
 
-# Function to create embeddings using the embeddings endpoint
-def create_embedding(text):
+# Function to find similar records for many questions at once:
+# one embeddings request and one SQL statement, results keyed by question.
+# ef_search / probes tune recall of an HNSW / IVFFlat index for this query;
+# quantization="halfvec"/"binary" searches a quantized index, then re-ranks.
+# backend="memmap" ranks in-process and only looks rows up by id in SQL
+def find_similar_records_batch(questions, top_k=5, ef_search=None, probes=None,
+                               backend=VECTOR_SEARCH_BACKEND, quantization=VECTOR_QUANTIZATION):
     try:
-        client = OpenAI()
-        response = client.embeddings.create(
-            model="text-embedding-ada-002",
-            input=[text]
-        )
-        embedding = response.data[0].embedding
-        return np.array(embedding, dtype=np.float32)
-    except Exception as e:
-        print(f"Error generating embedding for text '{text}': {e}")
-        return None
+        questions = list(dict.fromkeys(questions))
+        if not questions:
+            return {}
 
-# Function to find similar records
-def find_similar_records(question, top_k=5):
-    try:
-        # Generate embedding for the input question
-        question_embedding = create_embedding(question)
-        if question_embedding is None:
-            return f"Error: Could not generate embedding for question: '{question}'"
+        # Generate embeddings for every question in one request
+        question_embeddings = create_embeddings(questions)
+        if question_embeddings is None:
+            return f"Error: Could not generate embeddings for {len(questions)} questions"
 
         # Ensure the dimension is 1536 if your column is VECTOR(1536)
-        if len(question_embedding) != 1536:
-            return f"Error: Embedding dimension {len(question_embedding)} does not match VECTOR(1536)."
-
-        embedding_str = f"[{','.join(f'{float(val):.6f}' for val in question_embedding)}]"
+        if question_embeddings[0].shape[0] != 1536:
+            return f"Error: Embedding dimension {question_embeddings[0].shape[0]} does not match VECTOR(1536)."
 
-        # Remove the ::vector cast; pass the string directly
+        # Each query vector takes its own top_k with an ordered (index) scan;
+        # the NumPy embeddings are bound as one vector[] and sent in binary
         query_str = f"""
-        SELECT 
-            task_id, 
-            {TEXT_COLUMN} AS description,
-            1 - ({VECTOR_COLUMN} <=> :embedding) AS similarity
-        FROM {VECTOR_TABLE}
-        WHERE {VECTOR_COLUMN} IS NOT NULL
-        ORDER BY {VECTOR_COLUMN} <=> :embedding
-        LIMIT :top_k;
+        SELECT
+            q.ord,
+            n.task_id,
+            n.{TEXT_COLUMN} AS description,
+            1 - n.distance AS similarity
+        FROM unnest(CAST(:embeddings AS vector[])) WITH ORDINALITY AS q(embedding, ord)
+        CROSS JOIN LATERAL ({nearest_sql(
+            VECTOR_TABLE, ["task_id", TEXT_COLUMN], "q.embedding", ":top_k",
+            vector_column=VECTOR_COLUMN, quantization=quantization
+        )}
+        ) n
+        ORDER BY q.ord, n.distance;
         """
+        candidates = rerank_candidates(top_k, quantization)
+
+        with Metrics.span("vector_search"), engine.connect() as connection:
+            if backend == "memmap":
+                task_index = get_index(connection, VECTOR_TABLE, id_column="task_id", vector_column=VECTOR_COLUMN)
+                task_index.refresh_if_stale(connection)
+                result = connection.execute(
+                    text(f"""
+                    SELECT m.ord, t.task_id, t.{TEXT_COLUMN} AS description, m.similarity
+                    FROM {MATCHES_SQL} AS m(ord, id, similarity)
+                    JOIN {VECTOR_TABLE} t ON t.task_id = m.id
+                    ORDER BY m.ord, m.similarity DESC;
+                    """),
+                    match_params(task_index.search(question_embeddings, top_k))
+                )
+            else:
+                set_search_params(connection, candidates, ef_search, probes)
+                result = connection.execute(
+                    text(query_str),
+                    {"embeddings": question_embeddings, "top_k": top_k, "candidates": candidates}
+                )
+
+            # Format the results
+            similar_records = {question: [] for question in questions}
+            for row in result:
+                similar_records[questions[row.ord - 1]].append(
+                    {"id": row.task_id, "text": row.description, "similarity": float(row.similarity)}
+                )
+        return similar_records
 
-        with engine.connect() as connection:
-            result = connection.execute(
-                text(query_str),
-                {"embedding": embedding_str, "top_k": top_k}
-            )
-            records = [dict(row._mapping) for row in result]
+    except Exception as e:
+        print(f"Error : {str(e)}")
+        return f"Error performing semantic search: {str(e)}"
 
-        # Format the results
-        similar_records = [
-            {"id": row["task_id"], "text": row["description"], "similarity": float(row["similarity"])} 
-            for row in records
-        ]
+# Function to find similar records
+def find_similar_records(question, top_k=5, ef_search=None, probes=None, backend=VECTOR_SEARCH_BACKEND,
+                         quantization=VECTOR_QUANTIZATION):
+    similar_records = find_similar_records_batch([question], top_k, ef_search, probes, backend, quantization)
+    if isinstance(similar_records, str):  # Error case
         return similar_records
+    return similar_records[question]
+
+# Function to find tasks by keyword and meaning together: full-text search on
+# tasks and vector search on task_embeddings, fused by reciprocal rank in one
+# statement. The keyword search runs while the question is being embedded
+# and its ranked ids are passed to that statement. A weight of 0 leaves that
+# search out entirely (with semantic_weight=0 no embedding is requested).
+# Always uses pgvector
+def find_hybrid_records(question, top_k=5, semantic_weight=1.0, keyword_weight=1.0,
+                        candidates_per_leg=HYBRID_CANDIDATES, ef_search=None, probes=None,
+                        quantization=VECTOR_QUANTIZATION):
+    try:
+        leg_limit = max(top_k, candidates_per_leg)
+        candidates = rerank_candidates(leg_limit, quantization)
+        embedding = keyword_ids = None
+
+        with engine.connect() as connection:
+            if semantic_weight:
+                with ThreadPoolExecutor(max_workers=1) as embedder:
+                    pending = embedder.submit(copy_context().run, create_embeddings, [question])
+                    if keyword_weight:
+                        keyword_ids = [row.id for row in connection.execute(
+                            text(keyword_sql("tasks")), {"question": question, "leg_limit": leg_limit}
+                        )]
+                    embeddings = pending.result()
+                if embeddings is None:
+                    return f"Error: Could not generate embedding for the question: {question}"
+                embedding = embeddings[0]
+
+            query_str = hybrid_sql(
+                "tasks", ["title", "description"], VECTOR_TABLE, vector_id="task_id",
+                vector_column=VECTOR_COLUMN, quantization=quantization,
+                semantic=bool(semantic_weight), keyword=bool(keyword_weight),
+                keyword_ids=keyword_ids is not None
+            )
+            with Metrics.span("vector_search"):
+                if semantic_weight:
+                    set_search_params(connection, candidates, ef_search, probes)
+                result = connection.execute(
+                    text(query_str),
+                    hybrid_params(question, embedding, top_k, semantic_weight, keyword_weight,
+                                  candidates, leg_limit, keyword_ids)
+                )
+                return [
+                    {"id": row.id, "text": row.description, "score": row.score,
+                     "similarity": None if row.similarity is None else float(row.similarity),
+                     "semantic_rank": row.semantic_rank, "keyword_rank": row.keyword_rank}
+                    for row in result
+                ]
 
     except Exception as e:
         print(f"Error : {str(e)}")
-        return f"Error performing semantic search: {str(e)}"
+        return f"Error performing hybrid search: {str(e)}"
+
+# Function to format similar records for the response prompt
+def format_similar_records(similar_records):
+    if not similar_records:
+        return "No matching tasks found."
+    return "\n".join(
+        [f"Task ID: {rec['id']}, Description: {rec['text']} (Similarity: {rec['similarity']:.2f})"
+         for rec in similar_records]
+    )
 
 # Function to generate a response
 def get_semantic_search_response(question, top_k=5):
+    return get_semantic_search_responses([question], top_k)[question]
+
+# Function to generate responses for many questions: one semantic search for
+# all of them, then the LLM calls run concurrently
+def get_semantic_search_responses(questions, top_k=5):
     try:
         # Perform the semantic search
-        similar_records = find_similar_records(question, top_k)
+        similar_records = find_similar_records_batch(questions, top_k)
 
         # Check if there are any results or errors
         if isinstance(similar_records, str):  # Error case
-            return similar_records
-
-        if not similar_records:
-            similar_records_str = "No matching tasks found."
-        else:
-            # Format the similar records as a string for LLM response generation
-            similar_records_str = "\n".join(
-                [f"Task ID: {rec['id']}, Description: {rec['text']} (Similarity: {rec['similarity']:.2f})"
-                 for rec in similar_records]
-            )
+            return {question: similar_records for question in questions}
 
-        # Generate a human-readable response using LLM
+        # Generate human-readable responses using LLM
         response_llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.2)
-        response = response_llm.invoke(
-            response_prompt.format(
-                input=question,
-                similar_records=similar_records_str
-            )
-        ).content
+        with Metrics.span("llm_summarization"):
+            responses = response_llm.batch([
+                response_prompt.format(
+                    input=question,
+                    similar_records=format_similar_records(records)
+                )
+                for question, records in similar_records.items()
+            ])
 
-        return response
+        return {question: response.content for question, response in zip(similar_records, responses)}
 
     except Exception as e:
-        return f"Error processing the question: {e}"
+        return {question: f"Error processing the question: {e}" for question in questions}
 
 # Example usage
 questions = [
@@ -151,7 +234,9 @@ questions = [
     "List some high priority tasks which are very critical and I must do now"
 ]
 
-for question in questions:
-    print(f"\nQuestion: {question}")
-    response = get_semantic_search_response(question)
-    print("Response:", response)
+if __name__ == "__main__":
+    responses = get_semantic_search_responses(questions)
+    for question in questions:
+        print(f"\nQuestion: {question}")
+        print("Response:", responses[question])
+    Metrics.print_report()
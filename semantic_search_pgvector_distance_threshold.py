@@ -1,28 +1,28 @@
 import os
-import numpy as np
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
-from openai import OpenAI
+from sqlalchemy import text
 
 from langchain.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
 
+from app.services.database.connection import create_vector_engine
+from app.services.database.memmap_index import (
+    MATCHES_SQL, VECTOR_SEARCH_BACKEND, get_index, match_params
+)
+from app.services.database.vector import (
+    VECTOR_QUANTIZATION, nearest_sql, rerank_candidates, set_search_params
+)
+from app.services.llm.embeddings import create_embedding
+from app.services.metrics import Metrics
+
 # Load environment variables from .env file
 load_dotenv()
 
-# Read database credentials from environment variables
-PG_HOST = os.getenv("PG_HOST")
-PG_PORT = os.getenv("PG_PORT")
-PG_USER = os.getenv("PG_USER")
-PG_PASSWORD = os.getenv("PG_PASSWORD")
-PG_DATABASE = os.getenv("PG_DATABASE")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-# Build the connection string
-POSTGRES_URI = f"postgresql://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DATABASE}"
-
-# Create an SQLAlchemy engine
-engine = create_engine(POSTGRES_URI)
+# Create an SQLAlchemy engine (PG_* environment variables) that sends
+# embeddings to pgvector in binary, straight from float32 NumPy arrays
+engine = create_vector_engine()
 
 # Define a prompt for formatting the response
 response_template = '''Analyze the query result and provide a concise response to the original question.
@@ -47,24 +47,15 @@ VECTOR_TABLE = "task_embeddings"  # Updated table name
 VECTOR_COLUMN = "embedding"       # Column for the vector
 TEXT_COLUMN = "description"       # Column for task descriptions
 
-# Function to create embeddings using the embeddings endpoint
-def create_embedding(text):
-    try:
-        client = OpenAI()
-        response = client.embeddings.create(
-            model="text-embedding-ada-002",
-            input=[text]
-        )
-        embedding = response.data[0].embedding
-        return np.array(embedding, dtype=np.float32)
-    except Exception as e:
-        print(f"Error generating embedding for text '{text}': {e}")
-        return None
-
-def find_similar_records(question, top_k=5, similarity_threshold=0.7):
+def find_similar_records(question, top_k=5, similarity_threshold=0.7, ef_search=None, probes=None,
+                         backend=VECTOR_SEARCH_BACKEND, quantization=VECTOR_QUANTIZATION):
     """
     Find records similar to the provided 'question' using PGVector’s <=> operator.
-    Filters by a computed distance threshold (1 - similarity_threshold) and returns top_k.
+    Returns up to top_k records whose cosine similarity (1 - distance) is at
+    least similarity_threshold, the same test as the memmap backend.
+    ef_search / probes tune recall of an HNSW / IVFFlat index for this query.
+    quantization="halfvec"/"binary" searches a quantized index, then re-ranks.
+    backend="memmap" ranks in-process over a memory-mapped export instead.
     """
     try:
         # Generate embedding for the input question
@@ -76,35 +67,47 @@ def find_similar_records(question, top_k=5, similarity_threshold=0.7):
         if len(question_embedding) != 1536:
             return f"Error: Embedding dimension {len(question_embedding)} does not match VECTOR(1536)."
 
-        # Convert from desired similarity threshold to distance threshold:
-        # If we treat similarity ~ 1 - distance, then distance_threshold = 1 - similarity_threshold
-        distance_threshold = 1 - similarity_threshold
-
-        # Convert embedding to the format PGVector expects
-        embedding_str = f"[{','.join(f'{float(val):.6f}' for val in question_embedding)}]"
-
-        # Updated query with threshold filtering
+        # Take the top_k nearest rows with an ordered (index) scan, then apply
+        # the threshold; equivalent to filtering first, but index-friendly.
+        # The threshold is on similarity, inclusive, as in the memmap backend
+        # (MemmapVectorIndex.search), so both keep a row exactly at it
         query_str = f"""
-        SELECT 
-            task_id, 
-            {TEXT_COLUMN} AS description,
-            1 - ({VECTOR_COLUMN} <=> :embedding) AS similarity
-        FROM {VECTOR_TABLE}
-        WHERE {VECTOR_COLUMN} IS NOT NULL
-          AND ({VECTOR_COLUMN} <=> :embedding) < :dist_thresh
-        ORDER BY {VECTOR_COLUMN} <=> :embedding
-        LIMIT :top_k;
+        SELECT task_id, {TEXT_COLUMN} AS description, 1 - distance AS similarity
+        FROM ({nearest_sql(
+            VECTOR_TABLE, ["task_id", TEXT_COLUMN], ":embedding", ":top_k",
+            vector_column=VECTOR_COLUMN, quantization=quantization
+        )}
+        ) nearest
+        WHERE 1 - distance >= :similarity_threshold
+        ORDER BY distance;
         """
-
-        with engine.connect() as connection:
-            result = connection.execute(
-                text(query_str),
-                {
-                    "embedding": embedding_str,
-                    "dist_thresh": distance_threshold,
-                    "top_k": top_k
-                }
-            )
+        candidates = rerank_candidates(top_k, quantization)
+
+        with Metrics.span("vector_search"), engine.connect() as connection:
+            if backend == "memmap":
+                task_index = get_index(connection, VECTOR_TABLE, id_column="task_id", vector_column=VECTOR_COLUMN)
+                task_index.refresh_if_stale(connection)
+                matches = task_index.search(question_embedding, top_k, min_similarity=similarity_threshold)
+                result = connection.execute(
+                    text(f"""
+                    SELECT t.task_id, t.{TEXT_COLUMN} AS description, m.similarity
+                    FROM {MATCHES_SQL} AS m(ord, id, similarity)
+                    JOIN {VECTOR_TABLE} t ON t.task_id = m.id
+                    ORDER BY m.similarity DESC;
+                    """),
+                    match_params(matches)
+                )
+            else:
+                set_search_params(connection, candidates, ef_search, probes)
+                result = connection.execute(
+                    text(query_str),
+                    {
+                        "embedding": question_embedding,  # bound in binary
+                        "similarity_threshold": similarity_threshold,
+                        "top_k": top_k,
+                        "candidates": candidates
+                    }
+                )
             records = [dict(row._mapping) for row in result]
 
         # Format the results
@@ -145,12 +148,13 @@ def get_semantic_search_response(question, top_k=5, similarity_threshold=0.7):
 
         # Generate a human-readable response using LLM
         response_llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.2)
-        response = response_llm.invoke(
-            response_prompt.format(
-                input=question,
-                similar_records=similar_records_str
-            )
-        ).content
+        with Metrics.span("llm_summarization"):
+            response = response_llm.invoke(
+                response_prompt.format(
+                    input=question,
+                    similar_records=similar_records_str
+                )
+            ).content
 
         return response
 
@@ -174,3 +178,5 @@ if __name__ == "__main__":
         print(f"\nQuestion: {question}")
         response = get_semantic_search_response(question)
         print("Response:", response)
+
+    Metrics.print_report()
@@ -0,0 +1,105 @@
+"""
+Shared fixtures. Tests that need PostgreSQL (with pgvector) use the ``db``
+fixture: it is skipped when the PG_* environment variables do not reach a
+server, and otherwise provides a throwaway schema (TEST_SCHEMA) that every
+connection of the test run searches first, so the public tables are never
+touched. Scripts that create their engine at import time are imported inside
+the tests that use them, after ``db``.
+"""
+
+import asyncio
+import os
+import sys
+
+import psycopg
+import pytest
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "pdf-semantic-search"))
+
+TEST_SCHEMA = os.getenv("TEST_SCHEMA", "prime_test")
+# libpq reads PGOPTIONS for every connection opened from here on
+os.environ["PGOPTIONS"] = f"{os.getenv('PGOPTIONS', '')} -c search_path={TEST_SCHEMA},public".strip()
+
+from app.services.database.connection import get_database_url  # noqa: E402
+
+SCHEMA_SQL = """
+    DROP SCHEMA IF EXISTS {schema} CASCADE;
+    CREATE SCHEMA {schema};
+    CREATE TABLE {schema}.tasks (
+        id SERIAL PRIMARY KEY,
+        title TEXT,
+        description TEXT,
+        priority VARCHAR NOT NULL,
+        category TEXT,
+        created_at TIMESTAMP DEFAULT now()
+    );
+    CREATE TABLE {schema}.task_embeddings (
+        task_id INTEGER PRIMARY KEY REFERENCES {schema}.tasks(id) ON DELETE CASCADE,
+        title TEXT,
+        description TEXT,
+        priority VARCHAR,
+        category TEXT,
+        created_at TIMESTAMP,
+        embedding vector(1536),
+        content_hash TEXT
+    );
+    INSERT INTO {schema}.tasks (title, description, priority, category, created_at)
+    SELECT 'Task ' || i, 'Description of task ' || i, (ARRAY['low', 'medium', 'high'])[i % 3 + 1],
+           (ARRAY['bug', 'feature', 'documentation'])[i % 3 + 1], timestamp '2024-01-01' + i * interval '5 days'
+    FROM generate_series(1, 60) i;
+"""
+
+
+def connect(**kwargs) -> psycopg.Connection:
+    return psycopg.connect(get_database_url(), **kwargs)
+
+
+@pytest.fixture(scope="session")
+def database():
+    try:
+        with connect(autocommit=True, connect_timeout=3) as connection:
+            connection.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    except psycopg.Error as e:
+        pytest.skip(f"PostgreSQL not available: {e}")
+    yield
+    with connect(autocommit=True) as connection:
+        connection.execute(f"DROP SCHEMA IF EXISTS {TEST_SCHEMA} CASCADE")
+
+
+@pytest.fixture
+def db(database):
+    """A fresh TEST_SCHEMA with 60 tasks (and an empty task_embeddings)."""
+    with connect(autocommit=True) as connection:
+        connection.execute(SCHEMA_SQL.format(schema=TEST_SCHEMA))
+    return TEST_SCHEMA
+
+
+@pytest.fixture
+def fake_embeddings(monkeypatch):
+    """Embeddings from FakeEmbeddingsClient with the persistent cache off; returns the client."""
+    from app.services.llm import embeddings
+    from app.services.llm.fakes import FakeEmbeddingsClient
+
+    client = FakeEmbeddingsClient()
+    monkeypatch.setattr(embeddings, "_client", client)
+    monkeypatch.setattr(embeddings, "_cache", None)
+    monkeypatch.setattr(embeddings, "EMBEDDING_CACHE_MAX_ENTRIES", 0)
+    return client
+
+
+def run(coroutine):
+    """Run a coroutine on a new event loop, closing the API's pool afterwards."""
+    from app.database import Database
+
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await Database.close()
+
+    return asyncio.run(main())
@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.main import app
+from app.services import query_builder
+from app.services.concurrency import SingleFlight
+from app.services.llm.fakes import FakeSQLChatModel
+from app.services.query_builder import QueryBuilder
+from app.services.sql_cache import SQLQueryCache
+from conftest import run
+
+LLM_LATENCY = 1.0
+CONCURRENCY_LEVELS = [1, 10, 50]
+
+
+@pytest.fixture
+def slow_llm(db, monkeypatch):
+    """Every question goes to a fake LLM that takes LLM_LATENCY seconds to answer."""
+    llm = FakeSQLChatModel(sql="SELECT id, title FROM tasks WHERE priority = 'high' LIMIT 5", latency=LLM_LATENCY)
+    monkeypatch.setattr(query_builder, "get_llm", lambda: llm)
+    monkeypatch.setattr(QueryBuilder, "_chain", None)
+    monkeypatch.setattr(QueryBuilder, "_lock", asyncio.Lock())
+    monkeypatch.setattr(QueryBuilder, "sql_cache", SQLQueryCache())
+    monkeypatch.setattr(QueryBuilder, "in_flight", SingleFlight())
+    return llm
+
+
+def test_total_time_stays_flat_as_requests_in_flight_grow(slow_llm):
+    async def send(client, count, label):
+        """``count`` distinct questions at once; returns the seconds until all are answered."""
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.post("/tasks/query", json={"question": f"High priority tasks ({label} {i})"})
+            for i in range(count)
+        ))
+        assert all(response.status_code == 200 for response in responses)
+        return time.perf_counter() - start
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+            await send(client, 1, "warm-up")  # schema reflection and pool
+            return [await send(client, count, f"level {count}") for count in CONCURRENCY_LEVELS]
+
+    seconds = run(main())
+
+    assert slow_llm.calls == 1 + sum(CONCURRENCY_LEVELS)
+    # Served one at a time, 50 requests would take 50 LLM latencies; in
+    # flight together they take about one (plus the per-request CPU time)
+    assert seconds[0] >= LLM_LATENCY
+    assert all(elapsed < 3 * LLM_LATENCY for elapsed in seconds)
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from pgvector.psycopg import register_vector
+from sqlalchemy import text
+
+from app.services.database import memmap_index
+from conftest import connect
+
+
+def plane_vector(x, y):
+    vector = np.zeros(1536, dtype=np.float32)
+    vector[:2] = x, y
+    return vector
+
+
+@pytest.fixture
+def embedded_tasks(db, tmp_path, monkeypatch):
+    """
+    Tasks 1-3 at cosine similarity 0.6 (3/5), 1 and 0 to the question;
+    returns the search module.
+    """
+    import semantic_search_pgvector_distance_threshold as search
+
+    with connect(autocommit=True) as connection:
+        register_vector(connection)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO task_embeddings (task_id, description, embedding) "
+                "SELECT id, description, %s FROM tasks WHERE id = %s",
+                [(plane_vector(3, 4), 1), (plane_vector(1, 0), 2), (plane_vector(0, 1), 3)],
+            )
+    monkeypatch.setattr(search, "create_embedding", lambda question: plane_vector(1, 0))
+    monkeypatch.setattr(memmap_index, "VECTOR_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(memmap_index, "_indexes", {})
+    search.engine.dispose()
+    return search
+
+
+@pytest.mark.parametrize("backend", ["pgvector", "memmap"])
+def test_row_at_the_threshold_is_kept(embedded_tasks, backend):
+    records = embedded_tasks.find_similar_records("question", similarity_threshold=0.6, backend=backend)
+    assert [record["id"] for record in records] == [2, 1]
+    assert records[1]["similarity"] == pytest.approx(0.6)
+
+
+def test_memmap_export_is_per_database_schema_and_table(db, embedded_tasks, tmp_path):
+    embedded_tasks.find_similar_records("question", backend="memmap")
+    with embedded_tasks.engine.connect() as connection:
+        index = memmap_index.get_index(connection, "task_embeddings", id_column="task_id")
+        database = connection.execute(text("SELECT current_database()")).scalar()
+    assert index.directory == str(tmp_path / database / db / "task_embeddings")
+    assert len(index) == 3
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from app.services.llm import embeddings
+from app.services.llm.embedding_cache import EmbeddingCache
+from app.services.llm.fakes import FakeEmbeddingsClient, fake_embedding
+
+MODEL = embeddings.EMBEDDING_MODEL
+
+
+@pytest.fixture
+def failing_cache(tmp_path):
+    """A cache whose inserts fail, as on a full disk."""
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"))
+    cache._conn.execute(
+        "CREATE TRIGGER fail_insert BEFORE INSERT ON embeddings BEGIN SELECT RAISE(ABORT, 'disk full'); END"
+    )
+    return cache
+
+
+def test_failed_write_rolls_back(failing_cache):
+    with pytest.raises(Exception, match="disk full"):
+        failing_cache.put_many(MODEL, [("a", fake_embedding("a"))])
+    assert not failing_cache._conn.in_transaction
+    assert failing_cache.stats()["size"] == 0
+
+    # The connection is usable again once writes succeed
+    failing_cache._conn.execute("DROP TRIGGER fail_insert")
+    failing_cache.put_many(MODEL, [("a", fake_embedding("a"))])
+    assert set(failing_cache.get_many(MODEL, ["a", "b"])) == {"a"}
+    assert failing_cache.stats()["size"] == 1
+
+
+def test_embeddings_are_returned_when_the_cache_write_fails(failing_cache, monkeypatch):
+    monkeypatch.setattr(embeddings, "_cache", failing_cache)
+    monkeypatch.setattr(embeddings, "_client", FakeEmbeddingsClient())
+    vectors = embeddings.create_embeddings(["first", "second", "first"])
+    assert vectors is not None
+    assert np.allclose(vectors[0], fake_embedding("first"))
+    assert np.allclose(vectors[2], fake_embedding("first"))
+    assert not failing_cache._conn.in_transaction
@@ -0,0 +1,60 @@
+import pytest
+from sqlalchemy import text
+
+from app.services.database.hybrid import hybrid_params, hybrid_sql, keyword_sql
+from app.services.llm.fakes import fake_embedding
+from conftest import connect
+
+
+@pytest.fixture
+def leak_tasks(db, fake_embeddings):
+    """Embed the 60 tasks, then add three about memory leaks that are not embedded yet; returns their ids."""
+    import populate_task_embeddings
+
+    populate_task_embeddings.engine.dispose()
+    populate_task_embeddings.populate_task_embeddings(full=True)
+    with connect(autocommit=True) as connection:
+        return [row[0] for row in connection.execute("""
+            INSERT INTO tasks (title, description, priority) VALUES
+                ('Fix memory leak', 'The parser leaks memory', 'high'),
+                ('Memory usage', 'Profile memory of the importer', 'low'),
+                ('Leak in cache', 'Cache entries leak', 'medium')
+            RETURNING id
+        """)]
+
+
+def test_bound_keyword_ids_fuse_like_the_keyword_leg(leak_tasks):
+    import semantic_search_pgvector
+
+    semantic_search_pgvector.engine.dispose()
+    question, embedding = "memory or leak", fake_embedding("memory or leak")
+    columns = ["title", "description"]
+    with semantic_search_pgvector.engine.connect() as connection:
+        inline = connection.execute(
+            text(hybrid_sql("tasks", columns, "task_embeddings", vector_id="task_id")),
+            hybrid_params(question, embedding, 10, 1.0, 1.0, 50, 50)
+        ).all()
+        keyword_ids = [row.id for row in connection.execute(
+            text(keyword_sql("tasks")), {"question": question, "leg_limit": 50}
+        )]
+        bound = connection.execute(
+            text(hybrid_sql("tasks", columns, "task_embeddings", vector_id="task_id", keyword_ids=True)),
+            hybrid_params(question, embedding, 10, 1.0, 1.0, 50, 50, keyword_ids)
+        ).all()
+
+    assert len(keyword_ids) == 3
+    assert bound == inline
+    assert sum(row.keyword_rank is not None for row in inline) == 3
+
+
+def test_hybrid_search_finds_tasks_by_keyword_and_meaning(leak_tasks):
+    import semantic_search_pgvector
+
+    semantic_search_pgvector.engine.dispose()
+    records = semantic_search_pgvector.find_hybrid_records("memory leak", top_k=5, keyword_weight=2.0)
+
+    # Not embedded yet, so only the keyword search can find it
+    assert records[0]["id"] == leak_tasks[0]
+    assert (records[0]["keyword_rank"], records[0]["similarity"]) == (1, None)
+    assert sum(record["semantic_rank"] is not None for record in records) >= 2
+    assert len(records) == 5
@@ -0,0 +1,97 @@
+import pytest
+
+from app.services.pagination import Pagination
+from app.services.query_builder import QueryBuilder
+from app.services.task_service import TaskService
+from conftest import run
+
+
+@pytest.mark.parametrize("sql, order, keyset", [
+    ("SELECT * FROM tasks", None, True),
+    ("SELECT * FROM tasks ORDER BY id", "id", True),
+    ("SELECT * FROM tasks t ORDER BY t.id ASC LIMIT 500", "t.id asc", True),
+    ("SELECT * FROM tasks ORDER BY id DESC", "id desc", False),
+    ("SELECT * FROM tasks ORDER BY created_at LIMIT 500", "created_at", False),
+    ("SELECT *, row_number() OVER (ORDER BY created_at) FROM tasks", None, True),
+    ("SELECT * FROM tasks WHERE title = 'order by x' ORDER BY priority, id", "priority, id", False),
+])
+def test_order_by(sql, order, keyset):
+    assert Pagination.order_by(sql) == order
+    assert Pagination.keyset_compatible(sql) is keyset
+
+
+@pytest.mark.parametrize("sql, body", [
+    ("SELECT * FROM tasks;", "SELECT * FROM tasks"),
+    ("SELECT * FROM tasks WHERE title = 'a; b'", "SELECT * FROM tasks WHERE title = 'a; b'"),
+    ('SELECT 1 AS "x;y" -- done; really', 'SELECT 1 AS "x;y" -- done; really'),
+    ("SELECT 1; DELETE FROM tasks", None),
+    ("DELETE FROM tasks", None),
+])
+def test_select_body(sql, body):
+    assert Pagination.select_body(sql) == body
+
+
+@pytest.mark.parametrize("body, limit", [
+    ("SELECT * FROM tasks LIMIT 5", 5),
+    ("SELECT * FROM tasks LIMIT 5 OFFSET 10", 5),
+    ("SELECT * FROM tasks LIMIT 5 -- five of them", 5),
+    ("SELECT * FROM tasks ORDER BY id FETCH FIRST 3 ROWS ONLY", 3),
+    ("SELECT * FROM tasks OFFSET 2 ROWS FETCH NEXT ROW ONLY", 1),
+    ("SELECT * FROM tasks WHERE title = 'limit 5'", None),
+    ("SELECT * FROM tasks -- limit 5", None),
+])
+def test_own_limit(body, limit):
+    assert Pagination.own_limit(body) == limit
+
+
+def read_all(sql, page_size=7, monkeypatch=None):
+    """Every page of ``sql`` through query_tasks and its cursors."""
+    async def build_query(question):
+        return sql, "Found {count} matching tasks.", {"count": "len(results)"}
+
+    monkeypatch.setattr(QueryBuilder, "build_query", build_query)
+
+    async def pages():
+        results = []
+        response = await TaskService.query_tasks("all tasks", limit=page_size)
+        while True:
+            assert len(response["results"]) <= page_size
+            results += response["results"]
+            if not response["next_cursor"]:
+                return results
+            response = await TaskService.query_tasks(cursor=response["next_cursor"])
+
+    return run(pages())
+
+
+def test_descending_id_order_is_kept_across_pages(db, monkeypatch):
+    results = read_all("SELECT id, title FROM tasks WHERE category = 'bug' ORDER BY id DESC", monkeypatch=monkeypatch)
+    ids = [row["id"] for row in results]
+    assert len(ids) == 20
+    assert ids == sorted(ids, reverse=True)
+
+
+def test_order_by_another_column_is_kept_across_pages(db, monkeypatch):
+    results = read_all("SELECT id, created_at FROM tasks ORDER BY created_at DESC", monkeypatch=monkeypatch)
+    created = [row["created_at"] for row in results]
+    assert len(created) == 60
+    assert created == sorted(created, reverse=True)
+
+
+def test_keyset_pages_have_no_extra_id_column(db, monkeypatch):
+    results = read_all("SELECT id, title FROM tasks", monkeypatch=monkeypatch)
+    assert [row["id"] for row in results] == list(range(1, 61))
+    assert all(list(row) == ["id", "title"] for row in results)
+
+
+def test_trailing_comment_does_not_swallow_the_wrapper(db, monkeypatch):
+    results = read_all("SELECT id, title FROM tasks -- every task", monkeypatch=monkeypatch)
+    assert [row["id"] for row in results] == list(range(1, 61))
+    results = read_all("SELECT id FROM tasks ORDER BY id DESC -- newest first", monkeypatch=monkeypatch)
+    assert [row["id"] for row in results] == list(range(60, 0, -1))
+
+
+def test_fetch_first_is_kept_when_paging(db, monkeypatch):
+    results = read_all("SELECT id FROM tasks ORDER BY id DESC FETCH FIRST 20 ROWS ONLY", page_size=7,
+                       monkeypatch=monkeypatch)
+    assert [row["id"] for row in results] == list(range(60, 40, -1))
@@ -0,0 +1,42 @@
+import random
+
+import pytest
+
+from pdf_extraction import split_pages
+
+
+def split_text(text, chunk_size, overlap):
+    """The original whole-document splitter, the reference for chunk text."""
+    chunks, start = [], 0
+    while start < len(text):
+        chunks.append((start, text[start:start + chunk_size]))
+        start += chunk_size - overlap
+    return chunks
+
+
+def page_at(pages, offset):
+    position = 0
+    for page_number, text in pages:
+        position += len(text)
+        if offset < position:
+            return page_number
+
+
+def test_chunk_starting_on_a_page_boundary_belongs_to_that_page():
+    pages = [(1, "a" * 500), (2, "b" * 300)]
+    chunks = list(split_pages(pages, chunk_size=500, overlap=0))
+    assert chunks == [("a" * 500, 1, 1), ("b" * 300, 2, 2)]
+
+
+@pytest.mark.parametrize("overlap", [0, 50])
+def test_pages_match_chunk_offsets(overlap):
+    rng = random.Random(overlap)
+    for _ in range(200):
+        pages = [(number, "x" * rng.choice([1, 50, 450, 500, 550, 1000]))
+                 for number in range(1, rng.randint(1, 8))]
+        text = "".join(page_text for _, page_text in pages)
+        chunks = list(split_pages(pages, chunk_size=500, overlap=overlap))
+        expected = split_text(text, 500, overlap)
+        assert [chunk for chunk, _, _ in chunks] == [chunk for _, chunk in expected]
+        for (_, first, last), (start, chunk) in zip(chunks, expected):
+            assert (first, last) == (page_at(pages, start), page_at(pages, start + len(chunk) - 1))
@@ -0,0 +1,39 @@
+import importlib
+
+from app.services.llm.fakes import fake_embedding
+from conftest import connect
+
+
+def test_binary_copy_follows_the_table_types(db):
+    import pdf_ingestion
+
+    # A pdf_documents table whose column types differ from the model's
+    with connect(autocommit=True) as connection:
+        connection.execute("""
+            CREATE TABLE pdf_documents (
+                id BIGSERIAL PRIMARY KEY, filename TEXT, page_number BIGINT, page_end SMALLINT,
+                content TEXT, embedding vector(1536)
+            )
+        """)
+
+    pdf_ingestion.engine.dispose()
+    pdf_ingestion.insert_rows([
+        ("guide.pdf", 1, 2, "First chunk", fake_embedding("First chunk")),
+        ("guide.pdf", 2, 2, "Second chunk", fake_embedding("Second chunk")),
+    ])
+
+    with connect() as connection:
+        rows = connection.execute(
+            "SELECT filename, page_number, page_end, content FROM pdf_documents ORDER BY id"
+        ).fetchall()
+    assert rows == [("guide.pdf", 1, 2, "First chunk"), ("guide.pdf", 2, 2, "Second chunk")]
+
+
+def test_querying_does_not_create_the_table(db, monkeypatch):
+    import pdf_query
+
+    # Run its module code with only the test schema visible (no public.pdf_documents)
+    monkeypatch.setenv("PGOPTIONS", f"-c search_path={db}")
+    importlib.reload(pdf_query)
+    with connect() as connection:
+        assert connection.execute("SELECT to_regclass(%s)", [f"{db}.pdf_documents"]).fetchone()[0] is None
@@ -0,0 +1,69 @@
+from app.services.llm import embeddings
+from app.services.llm.fakes import FakeAsyncEmbeddingsClient
+from conftest import connect, run
+
+
+def test_binary_copy_follows_the_table_types(db, fake_embeddings):
+    import populate_task_embeddings
+
+    # A schema that drifted from the original column types
+    with connect(autocommit=True) as connection:
+        connection.execute("""
+            ALTER TABLE tasks ALTER COLUMN id TYPE BIGINT, ALTER COLUMN created_at TYPE TIMESTAMPTZ;
+            ALTER TABLE task_embeddings ALTER COLUMN task_id TYPE BIGINT,
+                ALTER COLUMN created_at TYPE TIMESTAMPTZ,
+                ADD COLUMN reviewed BOOLEAN DEFAULT false;
+        """)
+
+    populate_task_embeddings.engine.dispose()
+    populate_task_embeddings.populate_task_embeddings(full=True)
+
+    with connect() as connection:
+        count, matching = connection.execute("""
+            SELECT count(*), count(*) FILTER (WHERE te.created_at = t.created_at AND te.content_hash = md5(t.description))
+            FROM task_embeddings te JOIN tasks t ON t.id = te.task_id
+        """).fetchone()
+    assert count == matching == 60
+
+
+def test_change_tracking_is_set_up_on_an_existing_table(db, fake_embeddings, monkeypatch):
+    import populate_task_embeddings
+
+    # A table from before change tracking: no content_hash, no unique task_id, a duplicate row
+    with connect(autocommit=True) as connection:
+        connection.execute("""
+            DROP TABLE task_embeddings;
+            CREATE TABLE task_embeddings (
+                task_id INTEGER, title TEXT, description TEXT, priority VARCHAR,
+                category TEXT, created_at TIMESTAMP, embedding vector(1536)
+            );
+            INSERT INTO task_embeddings (task_id, title, description, priority, category, created_at, embedding)
+            SELECT id, title, description, priority, category, created_at, array_fill(0.1, ARRAY[1536])::vector
+            FROM tasks;
+            INSERT INTO task_embeddings (task_id, description, embedding)
+            SELECT 1, description, array_fill(0.2, ARRAY[1536])::vector FROM tasks WHERE id = 1;
+            UPDATE tasks SET description = 'Changed description' WHERE id = 2;
+        """)
+
+    populate_task_embeddings.engine.dispose()
+    populate_task_embeddings.populate_task_embeddings()
+
+    # Only the changed task was re-embedded
+    assert fake_embeddings.embeddings.inputs == 1
+    with connect() as connection:
+        count, tasks, hashed = connection.execute("""
+            SELECT count(*), count(DISTINCT task_id), count(*) FILTER (WHERE content_hash IS NOT NULL)
+            FROM task_embeddings
+        """).fetchone()
+    assert count == tasks == hashed == 60
+
+    # The API's embedding queue can now upsert
+    from app.services.embedding_queue import EmbeddingQueue
+    monkeypatch.setattr(embeddings, "_async_client", FakeAsyncEmbeddingsClient())
+    with connect(autocommit=True) as connection:
+        connection.execute("UPDATE tasks SET description = 'Edited again' WHERE id = 3")
+    run(EmbeddingQueue.embed_tasks([3]))
+    with connect() as connection:
+        assert connection.execute(
+            "SELECT count(*) FROM task_embeddings WHERE task_id = 3 AND content_hash = md5('Edited again')"
+        ).fetchone()[0] == 1
@@ -0,0 +1,66 @@
+import pytest
+
+from app.database import Database
+from app.database.utils import execute_query
+from app.services import sql_shape
+from app.services.task_service import TaskService
+from conftest import run
+
+# Prepared statements of the current session; generic_plans + custom_plans
+# counts the executions of each
+PREPARED = """
+    SELECT statement, generic_plans + custom_plans
+    FROM pg_prepared_statements
+    WHERE NOT from_sql AND statement LIKE %s
+"""
+
+
+@pytest.fixture
+def one_connection(db, monkeypatch):
+    """A single pooled connection, so every query sees the same session's prepared statements."""
+    monkeypatch.setattr(Database, "MIN_SIZE", 1)
+    monkeypatch.setattr(Database, "MAX_SIZE", 1)
+
+
+async def executions(pattern):
+    return await execute_query(PREPARED, [pattern])
+
+
+def test_prepared_statement_is_reused(one_connection):
+    query = "SELECT count(*) FROM tasks WHERE priority = %s"
+
+    async def main():
+        for priority in ("high", "low", "medium"):
+            await execute_query(query, [priority], prepare=True)
+        return await executions("%FROM tasks WHERE priority = $1")
+
+    assert run(main()) == [("SELECT count(*) FROM tasks WHERE priority = $1", 3)]
+
+
+def test_unprepared_statement_is_never_prepared(one_connection):
+    async def main():
+        for _ in range(6):  # past psycopg's own prepare_threshold of 5
+            await execute_query("SELECT count(*) FROM tasks WHERE category = %s", ["bug"], prepare=False)
+        return await executions("%FROM tasks WHERE category = $1")
+
+    assert run(main()) == []
+
+
+def test_generated_sql_is_prepared_once_its_shape_recurs(one_connection, monkeypatch):
+    monkeypatch.setattr(sql_shape, "SQL_PREPARE_THRESHOLD", 2)
+
+    async def main():
+        shapes = set()
+        for title in ("Task 1", "Task 2", "Task 3"):
+            columns, rows, shape = await TaskService._execute_generated(
+                f"SELECT id, priority FROM tasks WHERE title = '{title}' AND id < 50"
+            )
+            assert len(rows) == 1
+            shapes.add(shape)
+        return shapes, await executions("%FROM tasks WHERE title = $1 AND id < $2%")
+
+    shapes, prepared = run(main())
+    assert len(shapes) == 1
+    # The first run is not prepared; the next two share one statement
+    assert [count for _, count in prepared] == [2]
+    assert shapes.pop() in prepared[0][0]
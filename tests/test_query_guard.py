@@ -0,0 +1,41 @@
+from collections import Counter, OrderedDict
+
+import pytest
+
+from app.services.query_guard import QueryGuard, QueryRejected
+from app.services.task_service import TaskService
+from conftest import connect, run
+
+
+@pytest.fixture
+def guard(db, monkeypatch):
+    """Fresh counters and verdicts."""
+    monkeypatch.setattr(QueryGuard, "_counts", Counter())
+    monkeypatch.setattr(QueryGuard, "_verdicts", OrderedDict())
+
+
+def test_shape_is_explained_once(guard):
+    for priority in ("high", "low", "medium", "high"):
+        run(TaskService._execute_generated(f"SELECT id FROM tasks WHERE priority = '{priority}'"))
+    stats = QueryGuard.stats()
+    assert (stats["checked"], stats["cached"], stats["passed"]) == (1, 3, 4)
+
+
+def test_cached_verdict_still_rewrites_and_rejects(guard, monkeypatch):
+    with connect(autocommit=True) as connection:
+        connection.execute("ANALYZE tasks")  # 20 rows per category
+    monkeypatch.setattr(QueryGuard, "MAX_ROWS", 5)
+    for category in ("bug", "feature"):
+        columns, rows, _ = run(TaskService._execute_generated(f"SELECT id FROM tasks WHERE category = '{category}'"))
+        assert len(rows) == 5
+
+    monkeypatch.setattr(QueryGuard, "MAX_COST", 0)
+    for category in ("bug", "feature"):
+        with pytest.raises(Exception) as caught:
+            run(TaskService._execute_generated(f"SELECT title FROM tasks WHERE category = '{category}'"))
+        assert QueryGuard.rejection(caught.value).reason == "cost"
+
+    stats = QueryGuard.stats()
+    assert (stats["checked"], stats["cached"]) == (2, 2)
+    assert (stats["rewritten"], stats["rejected_cost"]) == (2, 2)
+
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from app.services import concurrency
+from app.services.concurrency import SingleFlight
+from app.services.query_builder import QueryBuilder
+from app.services.sql_cache import SQLQueryCache
+
+GREATER = ["tasks with id > 100", "Tasks with id > 100?", "tasks  with ID > 100"]
+LESS = ["tasks with id < 100", "Tasks with id < 100!"]
+
+
+class SlowChain:
+    """SQL chain stand-in: answers after a delay with SQL naming the question, counting calls."""
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.calls = 0
+
+    async def ainvoke(self, inputs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        operator = ">" if ">" in inputs["question"] else "<"
+        return f"SELECT * FROM tasks WHERE id {operator} 100"
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    chain = SlowChain()
+
+    async def get_chain():
+        return chain
+
+    monkeypatch.setattr(QueryBuilder, "get_chain", staticmethod(get_chain))
+    monkeypatch.setattr(QueryBuilder, "sql_cache", SQLQueryCache())
+    monkeypatch.setattr(QueryBuilder, "in_flight", SingleFlight())
+    return chain
+
+
+def build_concurrently(questions):
+    async def main():
+        return await asyncio.gather(*(QueryBuilder.build_query(question) for question in questions))
+
+    return [sql for sql, _, _ in asyncio.run(main())]
+
+
+def test_concurrent_requests_share_one_build_per_question(chain):
+    questions = [(GREATER + LESS)[i % 5] for i in range(55)]
+
+    results = build_concurrently(questions)
+
+    assert chain.calls == 2
+    assert QueryBuilder.in_flight.stats() == {"runs": 2, "coalesced": 53, "in_flight": 0}
+    for question, sql in zip(questions, results):
+        assert sql == f"SELECT * FROM tasks WHERE id {'>' if '>' in question else '<'} 100"
+
+
+def test_questions_with_different_operators_are_not_merged(chain):
+    results = build_concurrently(["tasks with id > 100", "tasks with id < 100", "tasks with id >= 100"])
+    assert chain.calls == 3
+    assert results[1] == "SELECT * FROM tasks WHERE id < 100"
+
+
+def test_single_flight_can_be_turned_off(chain, monkeypatch):
+    monkeypatch.setattr(concurrency, "SINGLE_FLIGHT", False)
+    build_concurrently(GREATER * 5)
+    assert chain.calls == 15
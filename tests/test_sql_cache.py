@@ -0,0 +1,65 @@
+import asyncio
+
+import numpy as np
+
+from app.services import query_builder
+from app.services.query_builder import QueryBuilder
+from app.services.sql_cache import SQLQueryCache
+
+
+def near(vector, scale=0.05, seed=1):
+    """A unit vector very close to ``vector`` (cosine similarity > 0.99)."""
+    noise = np.random.default_rng(seed).standard_normal(len(vector)) * scale / np.sqrt(len(vector))
+    other = vector + noise
+    return other / np.linalg.norm(other)
+
+
+def test_exact_tier_ignores_case_whitespace_and_trailing_punctuation():
+    cache = SQLQueryCache()
+    cache.put("High priority tasks?", "SELECT 1")
+    assert cache.get("high priority   TASKS") == "SELECT 1"
+    assert cache.get("High priority tasks!.") == "SELECT 1"
+
+
+def test_operators_signs_and_symbols_are_part_of_the_key():
+    questions = [
+        "tasks with id > 100", "tasks with id < 100", "tasks with id >= 100", "tasks with id 100",
+        "tasks costing -5", "tasks costing 5", "C++ tasks", "C tasks",
+    ]
+    assert len({SQLQueryCache.normalize_question(question) for question in questions}) == len(questions)
+
+    cache = SQLQueryCache()
+    cache.put("Tasks with id > 100", "SELECT * FROM tasks WHERE id > 100")
+    assert cache.get("tasks with id < 100") is None
+    assert cache.get("tasks with id 100") is None
+
+
+def test_questions_differing_in_a_value_miss_by_default(monkeypatch):
+    monkeypatch.delenv("SQL_CACHE_SIMILARITY_THRESHOLD", raising=False)
+    cache = SQLQueryCache.from_env()
+    high = np.random.default_rng(0).standard_normal(1536)
+    high /= np.linalg.norm(high)
+    low = near(high)
+    assert float(high @ low) > 0.99  # as similar as the two questions are to ada-002
+
+    cache.put("high priority tasks", "SELECT * FROM tasks WHERE priority = 'high'", high)
+    assert not cache.semantic_enabled
+    assert cache.get("low priority tasks") is None
+    assert cache.get_similar(low) is None
+
+    # The API's cache is configured the same way: no embedding is even requested
+    async def fail(question):
+        raise AssertionError("semantic tier used")
+
+    monkeypatch.setattr(QueryBuilder, "sql_cache", cache)
+    monkeypatch.setattr(query_builder, "acreate_embedding", fail)
+    assert asyncio.run(QueryBuilder._lookup_cached_sql("low priority tasks")) == (None, None)
+
+
+def test_semantic_tier_when_a_threshold_is_set(monkeypatch):
+    monkeypatch.setenv("SQL_CACHE_SIMILARITY_THRESHOLD", "0.98")
+    cache = SQLQueryCache.from_env()
+    vector = np.random.default_rng(0).standard_normal(1536)
+    vector /= np.linalg.norm(vector)
+    cache.put("list bugs", "SELECT 1", vector)
+    assert cache.get_similar(near(vector)) == "SELECT 1"
@@ -0,0 +1,38 @@
+from app.services.sql_shape import SQLShapes
+from app.services.task_service import TaskService
+from conftest import run
+
+GROUPED_SQL = """
+    SELECT date_trunc('month', created_at) AS month, count(*)
+    FROM tasks
+    WHERE category = 'bug'
+    GROUP BY date_trunc('month', created_at)
+    ORDER BY 1
+"""
+
+
+def test_literals_become_parameters():
+    shape = SQLShapes.normalize("SELECT * FROM tasks WHERE priority = 'high' AND id > 10 LIMIT 5")
+    assert shape.params == ["high", 10, 5]
+    assert "'high'" not in shape.sql
+
+
+def test_literals_of_grouping_expressions_stay_inline():
+    shape = SQLShapes.normalize(GROUPED_SQL)
+    assert shape.sql.count("date_trunc('month', created_at)") == 2
+    assert shape.params == ["bug"]
+
+
+def test_grouping_expression_with_literal_runs(db):
+    for _ in range(3):  # unprepared, then prepared
+        columns, rows, _ = run(TaskService._execute_generated(GROUPED_SQL))
+        assert columns == ["month", "count"]
+        assert sum(count for _, count in rows) == 20
+
+
+def test_trailing_line_comment_does_not_hide_the_shape_tag(db):
+    sql = "SELECT id FROM tasks WHERE category = 'bug' -- bugs only"
+    shape = SQLShapes.normalize(sql)
+    assert shape.sql.splitlines()[-1] == f"/* shape:{shape.fingerprint} */"
+    columns, rows, _ = run(TaskService._execute_generated(sql))
+    assert len(rows) == 20
@@ -0,0 +1,76 @@
+"""
+Recall@k of the quantized nearest-neighbour search (halfvec and binary
+candidates, re-ranked at full precision) against an exact scan, on
+clustered fixture vectors stored as task_embeddings.
+"""
+
+import pytest
+from pgvector.psycopg import register_vector
+from sqlalchemy import text
+
+from app.services.database.connection import create_vector_engine
+from app.services.database.vector import nearest_sql, rerank_candidates
+from benchmarks.bench_quantization import TOP_K, emulated_search, recall, search
+from app.services.llm.fakes import clustered_embeddings
+from conftest import connect
+
+ROWS = 500
+QUERIES = 50
+MIN_RECALL = 0.9
+VECTORS = clustered_embeddings(ROWS)
+
+
+@pytest.fixture
+def quantized_indexes(db):
+    """Fixture vectors in task_embeddings (task_id = row + 1) with a halfvec and a binary HNSW index."""
+    from manage_vector_indexes import index_ddl, index_name
+
+    with connect(autocommit=True) as connection:
+        version = connection.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'").fetchone()[0]
+        if tuple(int(part) for part in version.split(".")[:2]) < (0, 7):
+            pytest.skip(f"halfvec and binary_quantize need pgvector >= 0.7 (installed: {version})")
+        register_vector(connection)
+        connection.execute(
+            "INSERT INTO tasks (title, priority) SELECT 'Task ' || i, 'low' FROM generate_series(61, %s) i",
+            (ROWS,),
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany("INSERT INTO task_embeddings (task_id, embedding) VALUES (%s, %s)",
+                               [(row + 1, vector) for row, vector in enumerate(VECTORS)])
+        for quantization in ("halfvec", "binary"):
+            connection.execute(index_ddl("task_embeddings", "hnsw", index_name("task_embeddings", "hnsw", quantization),
+                                         16, 64, None, quantization))
+        connection.execute("ANALYZE task_embeddings")
+
+
+@pytest.mark.parametrize("quantization", ["halfvec", "binary"])
+def test_quantized_index_recall(quantized_indexes, quantization):
+    from manage_vector_indexes import index_name
+
+    engine = create_vector_engine()
+    try:
+        with engine.connect() as connection:
+            # No float32 index on the table, so this is an exact scan
+            with connection.begin():
+                exact = [search(connection, query, "none") for query in VECTORS[:QUERIES]]
+
+            with connection.begin():
+                connection.execute(text("SET LOCAL enable_seqscan = off"))
+                sql = nearest_sql("task_embeddings", ["task_id"], ":embedding", ":top_k", quantization=quantization)
+                plan = connection.execute(text(f"EXPLAIN {sql}"), {
+                    "embedding": VECTORS[0], "top_k": TOP_K, "candidates": rerank_candidates(TOP_K, quantization),
+                }).scalars().all()
+                assert any(index_name("task_embeddings", "hnsw", quantization) in line for line in plan)
+
+                results = [search(connection, query, quantization) for query in VECTORS[:QUERIES]]
+    finally:
+        engine.dispose()
+
+    assert recall(results, exact) >= MIN_RECALL
+
+
+@pytest.mark.parametrize("quantization", ["halfvec", "binary"])
+def test_emulated_quantized_search_recall(quantization):
+    exact = [emulated_search(VECTORS, query, "none") for query in VECTORS[:QUERIES]]
+    results = [emulated_search(VECTORS, query, quantization) for query in VECTORS[:QUERIES]]
+    assert recall(results, exact) >= MIN_RECALL